@@ -1,28 +1,71 @@
 import json
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
 import os
+import time
 from werkzeug.utils import secure_filename
 import jwt  # 添加JWT库
 from functools import wraps  # 添加装饰器支持
 
-import bcrypt
+import click
 from flask import Flask, jsonify, request, session
 from flask_sqlalchemy import SQLAlchemy
 from flask_cors import CORS
 import redis  # 导入Redis库
+from sqlalchemy import event, inspect as sa_inspect, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, object_session
 
 # 导入MinIO工具模块
 from minio_service.minio_utils import (
     upload_file_data_to_minio, 
     get_file_url, 
+    get_file_urls,
     get_public_file_url,
     delete_file_from_minio,
     migrate_local_images_to_minio,
     create_bucket_if_not_exists
 )
 
+# 车辆变更增量同步队列
+from car_sync_queue import CarSyncQueue
+# 进程内车辆 n-gram 搜索索引
+from car_search_index import NgramSearchIndex
+# 车辆搜索结果缓存
+from search_cache import SearchResultCache
+# 按内容哈希版本化的响应快照
+from snapshot_cache import VersionedSnapshot
+# 省/市/区县/门店参考数据
+from reference_data import ReferenceData
+# 车辆可用性（订单区间）索引
+from availability import AvailabilityIndex, ACTIVE_ORDER_STATUSES
+# 下单前的车辆短时占用
+from car_holds import CarHoldService
+# 服务端批量报价
+from pricing import QuoteEngine
+# 车队利用率分析
+from utilization import UtilizationAnalytics
+# 注册标识占用预筛
+from user_identifiers import TakenIdentifierFilter, IDENTIFIER_FIELDS, normalize as normalize_identifier
+# bcrypt 密码服务（有界线程池）
+from password_service import PasswordService, PasswordServiceBusy
+# 用户资料两级缓存
+from profile_cache import UserProfileCache
+# 写请求的 Idempotency-Key 支持
+from idempotency import IdempotencyStore
+# 已验证 JWT 的进程内缓存（带 Redis 撤销列表）
+from jwt_cache import VerifiedTokenCache
+# 服务端 Redis session
+from redis_session import RedisSessionInterface
+# 写操作副作用的事务性发件箱
+from event_outbox import OutboxDispatcher, outbox_values
+# 首页看板的租赁统计
+from rental_stats import (
+    RentalStats, RENTED_ORDER_STATUSES, VEHICLE_RENTALS_KEY, CITY_RENTALS_KEY, CITY_BRANCHES_KEY,
+    vehicle_label
+)
+
 # 导入WebService中间件
-from webservice_middleware.webservice_middleware import webservice_support, soap_webservice_support
+from webservice_middleware.webservice_middleware import webservice_support, soap_webservice_support, wants_ndjson_stream, ndjson_response
 
 # 创建 Flask 应用
 app = Flask(__name__)
@@ -61,10 +104,27 @@ else:
     redis_db = 0
 
 redis_client = redis.Redis(host=redis_host, port=redis_port, db=redis_db, decode_responses=True)
+# 不解码响应的连接，用于存取预序列化的 JSON 字节
+redis_binary_client = redis.Redis(host=redis_host, port=redis_port, db=redis_db)
+
+# session 数据存放在 Redis 中（Cookie 只保存 session ID），空闲超时后自动过期
+app.session_interface = RedisSessionInterface(
+    redis_binary_client,
+    idle_timeout=int(os.environ.get('SESSION_IDLE_TIMEOUT', 7200))
+)
+
+# 车辆搜索结果缓存（按车队版本号整体失效）
+search_result_cache = SearchResultCache(redis_binary_client)
+
+# 下单、注册等写请求的幂等响应存储
+idempotency_store = IdempotencyStore(redis_binary_client)
+
+# 已验证 token 的 claims 缓存到 exp，注销的 token 记入 Redis 拒绝列表
+jwt_token_cache = VerifiedTokenCache(JWT_SECRET, redis_client=redis_client)
 
 # 导入 Elasticsearch 工具模块
 try:
-    from elasticsearch_utils import search_cars as es_search_cars, create_index_if_not_exists, bulk_index_cars, format_car_data_for_db, generate_insert_sql
+    from elasticsearch_utils import search_cars as es_search_cars, search_cars_page as es_search_cars_page, create_index_if_not_exists, bulk_index_cars, bulk_update_cars, reindex_cars_with_alias, count_documents, format_car_data_for_db, generate_insert_sql
 except ImportError as e:
     print(f"Warning: Elasticsearch utils import failed: {e}")
     # 定义空函数作为fallback
@@ -73,8 +133,16 @@ except ImportError as e:
         pass
     def es_search_cars(*args, **kwargs):
         return []
+    def es_search_cars_page(*args, **kwargs):
+        return {'hits': [], 'total': 0, 'search_after': None, 'facets': {}}
     def bulk_index_cars(*args, **kwargs):
         pass
+    def bulk_update_cars(*args, **kwargs):
+        return 0, []
+    def reindex_cars_with_alias(*args, **kwargs):
+        return None
+    def count_documents(*args, **kwargs):
+        return None
 
 # JWT 认证装饰器
 def jwt_required(f):
@@ -94,8 +162,8 @@ def jwt_required(f):
             return jsonify({'message': '缺少认证 token', 'status': 'error'}), 401
         
         try:
-            # 验证 token
-            data = jwt.decode(token, JWT_SECRET, algorithms=['HS256'])
+            # 验证 token（同一 token 验证通过后直接使用缓存的 claims）
+            data = jwt_token_cache.decode(token)
             current_user_id = data['userId']  # 修改：使用 'userId' 而不是 'id'
             
             # 将用户ID添加到请求上下文中
@@ -168,6 +236,109 @@ class UserInfo(db.Model):
     emergency_phone = db.Column(db.String(20), nullable=True)
     credit_score = db.Column(db.Integer, nullable=True)
 
+    __table_args__ = (
+        # 注册标识唯一（NULL 不受限制），并发注册时由数据库兜底
+        db.Index('uk_user_username', 'username', unique=True),
+        db.Index('uk_user_phone', 'phone', unique=True),
+        db.Index('uk_user_email', 'email', unique=True),
+        db.Index('uk_user_id_number', 'id_number', unique=True),
+    )
+
+
+def load_user_profile(user_id):
+    """读取 /api/get_user_info 返回的用户资料，用户不存在时返回 None"""
+    user = db.session.query(
+        UserInfo.user_id, UserInfo.username, UserInfo.email, UserInfo.phone, UserInfo.real_name,
+        UserInfo.id_number, UserInfo.id_type, UserInfo.register_time
+    ).filter(UserInfo.user_id == user_id).first()
+    if user is None:
+        return None
+    return {
+        "user_id": user.user_id,
+        "username": user.username,
+        "email": user.email,
+        "phone": user.phone,
+        "real_name": user.real_name,
+        "id_number": user.id_number,
+        "id_type": user.id_type,
+        "register_time": user.register_time.strftime('%Y-%m-%d %H:%M:%S') if user.register_time else None
+    }
+
+# 密码哈希与校验在线程池中执行，成本因子和线程数可通过环境变量调整
+password_service = PasswordService(
+    rounds=int(os.environ.get('BCRYPT_ROUNDS', 12)),
+    max_workers=int(os.environ.get('PASSWORD_POOL_SIZE', 0)) or None
+)
+
+# 用户资料缓存，资料修改提交后失效，更新/注册接口随后写入新资料
+user_profile_cache = UserProfileCache(redis_binary_client, load_user_profile)
+
+# 已占用的用户名/手机号/邮箱/身份证号，注册表单实时校验先查这里
+taken_identifier_filter = TakenIdentifierFilter(redis_client)
+
+def _track_user_change(mapper, connection, target):
+    session = object_session(target)
+    if session is not None and target.user_id is not None:
+        session.info.setdefault('changed_user_ids', set()).add(target.user_id)
+
+def _track_user_identifiers(mapper, connection, target):
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault('taken_identifiers', []).extend(
+            (field, getattr(target, field)) for field in IDENTIFIER_FIELDS
+        )
+
+event.listen(UserInfo, 'after_insert', _track_user_identifiers)
+event.listen(UserInfo, 'after_update', _track_user_identifiers)
+event.listen(UserInfo, 'after_update', _track_user_change)
+event.listen(UserInfo, 'after_delete', _track_user_change)
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_changed_users(session):
+    user_ids = session.info.pop('changed_user_ids', None)
+    if user_ids:
+        user_profile_cache.invalidate(*user_ids)
+    taken = session.info.pop('taken_identifiers', None)
+    if taken:
+        taken_identifier_filter.add(taken)
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_changed_users(session):
+    session.info.pop('changed_user_ids', None)
+    session.info.pop('taken_identifiers', None)
+
+def find_user_conflicts(values, exclude_user_id=None):
+    """返回 values（字段 -> 值）中已被其他用户占用的字段，按 IDENTIFIER_FIELDS 顺序
+
+    Redis 预筛判定为可用的字段不再查询数据库；其余字段合并为一次 OR 查询。
+    """
+    candidates = taken_identifier_filter.possibly_taken(values)
+    if not candidates:
+        return []
+    fields = [field for field in IDENTIFIER_FIELDS if field in candidates]
+    users_query = db.session.query(*[getattr(UserInfo, field) for field in fields]).filter(
+        db.or_(*[getattr(UserInfo, field) == values[field] for field in fields])
+    )
+    if exclude_user_id is not None:
+        users_query = users_query.filter(UserInfo.user_id != exclude_user_id)
+    conflicts = set()
+    for row in users_query.limit(len(fields) * 2):
+        for field, value in zip(fields, row):
+            if value is not None and normalize_identifier(value) == normalize_identifier(values[field]):
+                conflicts.add(field)
+    return [field for field in fields if field in conflicts]
+
+def rebuild_taken_identifiers():
+    """用服务端游标流式读取 user_info，重建注册标识预筛集合"""
+    rows = db.session.query(UserInfo.username, UserInfo.phone, UserInfo.email, UserInfo.id_number).yield_per(1000)
+    return taken_identifier_filter.rebuild(rows)
+
+@app.cli.command('rebuild-user-identifiers')
+def rebuild_user_identifiers_command():
+    """重建注册标识预筛集合：flask --app app rebuild-user-identifiers"""
+    with app.app_context():
+        count = rebuild_taken_identifiers()
+    click.echo(f"{count} users indexed")
 
 # 门店表模型
 class Store(db.Model):
@@ -185,64 +356,88 @@ class Store(db.Model):
 
 # 创建数据库表（确保应用上下文中执行）
 
-def sync_cars_to_db_and_es():
-    """将数据库中的车辆数据同步到Elasticsearch。"""
+# 将数字代码转换为文本描述
+FUEL_TYPE_MAP = {0: '汽油', 1: '柴油', 2: '电动', 3: '混合动力', 4: '混动'}
+TRANSMISSION_MAP = {0: '自动', 1: '手动', 2: '自动'}
+
+def car_to_es_doc(db_car, car_type=None):
+    """将 CarInfo 记录（及其车型）转换为 Elasticsearch 文档（字段名称与数据库表结构一致）"""
+    daily_rent = None
+    if car_type is not None:
+        daily_rent = car_type.daily_rent if car_type.daily_rent is not None else car_type.price_per_day
+    fuel_type_text = FUEL_TYPE_MAP.get(db_car.fuel_type, '未知')
+    transmission_text = TRANSMISSION_MAP.get(db_car.transmission_type, '未知')
+    
+    return {
+        'id': db_car.car_id, # 使用数据库的 car_id 作为 ES 的 id
+        'name': f"{db_car.brand} {db_car.model}", # 组合品牌和型号作为车辆名称
+        'brand': db_car.brand,
+        'model': db_car.model,
+        'seats': car_type.seat_num if car_type is not None else None,  # 座位数取自车型
+        'fuel_type': fuel_type_text,
+        'transmission': transmission_text,
+        'price_per_day': float(daily_rent) if daily_rent is not None else None,  # 与报价引擎相同的日租金
+        'image_url': db_car.car_images, # 直接使用数据库中的 car_images 字段
+        'description': f"{db_car.brand} {db_car.model} 是一款{fuel_type_text}车，配备{transmission_text}变速箱。",
+        'availability': db_car.rental_status == 0,  # rental_status 0 表示可用
+        'color': db_car.color,
+        'mileage': db_car.mileage,
+        'car_number': db_car.car_number, # 车牌号
+        'engine_capacity': db_car.engine_capacity, # 排量
+        'gps_device': db_car.gps_device, # GPS设备
+        'last_maintain_time': db_car.last_maintain_time.isoformat() if db_car.last_maintain_time else None,
+        'next_maintain_mileage': db_car.next_maintain_mileage,
+        'buy_time': db_car.buy_time.isoformat() if db_car.buy_time else None,
+        'car_condition': db_car.car_condition,
+    }
+
+def _cars_with_types_query():
+    """车辆及其车型（座位数、日租金），未配置车型的车辆车型为 None"""
+    return db.session.query(CarInfo, CarTypeInfo).outerjoin(CarTypeInfo, CarInfo.type_id == CarTypeInfo.type_id)
+
+def sync_cars_by_ids(car_ids, index_name='cars'):
+    """只将指定车辆的最新数据增量同步到Elasticsearch（由 car_sync_queue 调用）"""
     with app.app_context():
-        cars_for_es_indexing = []
-        # 1. 创建 Elasticsearch 索引 (如果不存在)
-        create_index_if_not_exists('cars')
+        rows = _cars_with_types_query().filter(CarInfo.car_id.in_(car_ids)).all()
+        found_ids = {car.car_id for car, _ in rows}
+        deleted_ids = [car_id for car_id in car_ids if car_id not in found_ids]
+        successes, errors = bulk_update_cars(
+            index_name,
+            [car_to_es_doc(car, car_type) for car, car_type in rows],
+            deleted_ids=deleted_ids
+        )
+        if errors:
+            raise RuntimeError(f"{len(errors)} cars failed to sync")
+        print(f"Incrementally synced {successes} cars to Elasticsearch.")
+        # ES 数据更新后再次使搜索缓存失效，避免缓存同步前的旧结果
+        search_result_cache.bump_version()
+
+def sync_cars_to_db_and_es(chunk_size=500):
+    """将数据库中的车辆数据全量同步到Elasticsearch（仅用于修复，日常写操作走增量同步）。
+
+    使用服务端游标逐批读取 car_info，流式写入新的版本化索引后原子切换 cars 别名，
+    内存占用与车队规模无关，重建期间搜索仍使用旧索引。
+    """
+    with app.app_context():
+        # 重建期间暂停增量同步，变更留在队列中，切换别名后再写入新索引
+        car_sync_queue.pause()
+        try:
+            # 服务端游标：yield_per 会启用 stream_results，逐批从 MySQL 读取
+            cars_query = _cars_with_types_query().order_by(CarInfo.car_id).yield_per(chunk_size)
+            stats = reindex_cars_with_alias(
+                (car_to_es_doc(db_car, car_type) for db_car, car_type in cars_query),
+                alias='cars',
+                chunk_size=chunk_size
+            )
+        finally:
+            car_sync_queue.resume()
+        search_result_cache.bump_version()
 
-        # 2. 从数据库查询所有车辆信息
-        all_cars_from_db = CarInfo.query.all()
-        if not all_cars_from_db:
+        if stats is None:
+            print("Elasticsearch not available, full sync skipped.")
+        elif stats['docs'] == 0:
             print("No cars found in the database to sync.")
-            # 如果数据库没有数据，需要先通过其他方式添加车辆数据到数据库
-            # 这里我们假设数据库应该有数据，如果没有则不进行同步
-            return
-
-        print(f"Found {len(all_cars_from_db)} cars in the database to sync to Elasticsearch.")
-
-        for db_car in all_cars_from_db:
-            # 3. 准备用于 Elasticsearch 的数据
-            # 确保字段名称与数据库表结构一致
-            
-            # 将数字代码转换为文本描述
-            fuel_type_map = {0: '汽油', 1: '柴油', 2: '电动', 3: '混合动力', 4: '混动'}
-            transmission_map = {0: '自动', 1: '手动', 2: '自动'}
-            
-            fuel_type_text = fuel_type_map.get(db_car.fuel_type, '未知')
-            transmission_text = transmission_map.get(db_car.transmission_type, '未知')
-            
-            es_car_data = {
-                'id': db_car.car_id, # 使用数据库的 car_id 作为 ES 的 id
-                'name': f"{db_car.brand} {db_car.model}", # 组合品牌和型号作为车辆名称
-                'brand': db_car.brand,
-                'model': db_car.model,
-                'seats': 5, # 默认5座，如果有car_type关联可以从那里获取
-                'fuel_type': fuel_type_text,
-                'transmission': transmission_text,
-                'price_per_day': 300, # 默认价格，如果有car_type关联可以从那里获取
-                'image_url': db_car.car_images, # 直接使用数据库中的 car_images 字段
-                'description': f"{db_car.brand} {db_car.model} 是一款{fuel_type_text}车，配备{transmission_text}变速箱。",
-                'availability': db_car.rental_status == 0,  # rental_status 0 表示可用
-                'color': db_car.color,
-                'mileage': db_car.mileage,
-                'car_number': db_car.car_number, # 车牌号
-                'engine_capacity': db_car.engine_capacity, # 排量
-                'gps_device': db_car.gps_device, # GPS设备
-                'last_maintain_time': db_car.last_maintain_time.isoformat() if db_car.last_maintain_time else None,
-                'next_maintain_mileage': db_car.next_maintain_mileage,
-                'buy_time': db_car.buy_time.isoformat() if db_car.buy_time else None,
-                'car_condition': db_car.car_condition,
-            }
-            cars_for_es_indexing.append(es_car_data)
-
-        # 4. 批量索引到 Elasticsearch
-        if cars_for_es_indexing:
-            bulk_index_cars('cars', cars_for_es_indexing)
-            print(f"Successfully indexed {len(cars_for_es_indexing)} cars to Elasticsearch.")
-        else:
-            print("No cars to index to Elasticsearch based on current DB content.")
+        return stats
 
 # 车辆信息表模型 (需要确保在 sync_cars_to_db_and_es 之前定义)
 class CarInfo(db.Model):
@@ -269,6 +464,12 @@ class CarInfo(db.Model):
     # 如果有 car_type_info 表，可以建立关系
     # car_type = db.relationship('CarTypeInfo', backref=db.backref('cars', lazy=True))
 
+    __table_args__ = (
+        # ngram 全文索引，供 /search_cars?backend=fulltext 使用
+        db.Index('ft_car_info_search', 'brand', 'model', 'color',
+                 mysql_prefix='FULLTEXT', mysql_with_parser='ngram'),
+    )
+
 # 车辆类型信息表模型 (如果需要关联)
 class CarTypeInfo(db.Model):
     __tablename__ = 'car_type_info'
@@ -279,82 +480,495 @@ class CarTypeInfo(db.Model):
     deposit = db.Column(db.Numeric(10, 2))  # 押金
     price_per_day = db.Column(db.Numeric(10, 2)) # 使用 Numeric 对应 decimal
 
+    __table_args__ = (
+        db.Index('ft_car_type_name', 'type_name', mysql_prefix='FULLTEXT', mysql_with_parser='ngram'),
+    )
+
+def load_car_search_docs(car_ids=None):
+    """为 n-gram 索引加载车辆的可搜索字段（car_ids 为 None 表示全部车辆）"""
+    rows_query = db.session.query(
+        CarInfo.car_id, CarInfo.rental_status, CarInfo.brand, CarInfo.model,
+        CarInfo.color, CarTypeInfo.type_name
+    ).join(CarTypeInfo, CarInfo.type_id == CarTypeInfo.type_id)
+    if car_ids is not None:
+        rows_query = rows_query.filter(CarInfo.car_id.in_(car_ids))
+    for row in rows_query:
+        yield row.car_id, row.rental_status == 0, {
+            'brand': row.brand,
+            'model': row.model,
+            'type_name': row.type_name,
+            'color': row.color
+        }
+
+# 进程内车辆搜索索引，首次查询时构建
+car_search_index = NgramSearchIndex(load_car_search_docs)
+
+def load_car_prices():
+    """为报价引擎加载每辆车的日租金和押金（车型未配置 daily_rent 时使用 price_per_day）"""
+    return db.session.query(
+        CarInfo.car_id,
+        db.func.coalesce(CarTypeInfo.daily_rent, CarTypeInfo.price_per_day),
+        CarTypeInfo.deposit
+    ).outerjoin(CarTypeInfo, CarInfo.type_id == CarTypeInfo.type_id).all()
+
+# 报价引擎，价格数据缓存5分钟，车辆或车型变更提交后失效
+quote_engine = QuoteEngine(load_car_prices)
+
+# --- 事务性发件箱 ---
+# 写操作的跨进程副作用作为事件与业务数据在同一事务中写入 event_outbox，
+# 由 outbox_dispatcher 后台线程批量投递（见 event_outbox.py）。
+# 只有业务表同为 InnoDB 时事件与业务写入才是原子的：order_info、car_info
+# 需按 db_indexes.sql 转为 InnoDB，MyISAM 表回滚时业务写入不会撤销，
+# 提交失败可能留下没有事件的写入。
+class EventOutbox(db.Model):
+    __tablename__ = 'event_outbox'
+    __table_args__ = (
+        db.Index('idx_outbox_pending', 'processed_at', 'next_attempt_at'),
+        {'mysql_engine': 'InnoDB'},
+    )
+
+    id = db.Column(db.BigInteger, primary_key=True, autoincrement=True)
+    event_type = db.Column(db.String(50), nullable=False)
+    aggregate_id = db.Column(db.String(50))
+    payload = db.Column(db.Text, nullable=False)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    last_error = db.Column(db.String(500))
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    next_attempt_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    processed_at = db.Column(db.DateTime)
+
+def write_outbox_event(connection, session, event_type, aggregate_id, payload):
+    """在 flush 事件中通过同一连接写入发件箱（与触发它的写操作同一事务）"""
+    connection.execute(EventOutbox.__table__.insert().values(**outbox_values(event_type, aggregate_id, payload)))
+    session.info['outbox_written'] = True
+
+def add_outbox_event(event_type, aggregate_id, payload):
+    """在请求中登记发件箱事件，随下一次 db.session.commit() 一起提交"""
+    db.session.add(EventOutbox(**outbox_values(event_type, aggregate_id, payload)))
+    db.session.info['outbox_written'] = True
+
+# --- 车辆变更传播 ---
+# CarInfo 的增删改在同一事务中写入 car.changed 事件，由发件箱分发线程合并后增量更新ES；
+# 提交后标记 n-gram 索引中对应的车辆需要刷新。全量重建期间事件暂存于 car_sync_queue
+car_sync_queue = CarSyncQueue(redis_client, sync_cars_by_ids)
+
+def _track_car_change(mapper, connection, target):
+    session = object_session(target)
+    if session is not None and target.car_id is not None:
+        session.info.setdefault('changed_car_ids', set()).add(target.car_id)
+        write_outbox_event(connection, session, 'car.changed', target.car_id, {'car_id': target.car_id})
+
+def _track_car_type_change(mapper, connection, target):
+    session = object_session(target)
+    if session is not None:
+        session.info['car_types_changed'] = True
+        if target.type_id is not None:
+            # 座位数和日租金存放在 ES 文档中，该车型的车辆需要重新同步
+            write_outbox_event(connection, session, 'car_type.changed', target.type_id, {'type_id': target.type_id})
+
+def _track_reference_change(mapper, connection, target):
+    session = object_session(target)
+    if session is not None:
+        session.info['reference_data_changed'] = True
+
+for _event_name in ('after_insert', 'after_update', 'after_delete'):
+    event.listen(CarInfo, _event_name, _track_car_change)
+    event.listen(CarTypeInfo, _event_name, _track_car_type_change)
+    for _reference_model in (Province, City, Country, Store):
+        event.listen(_reference_model, _event_name, _track_reference_change)
+
+@event.listens_for(Session, 'after_commit')
+def _enqueue_changed_cars(session):
+    car_ids = session.info.pop('changed_car_ids', None)
+    car_types_changed = session.info.pop('car_types_changed', False)
+    if car_ids:
+        car_search_index.invalidate(car_ids)
+    if car_types_changed:
+        # 车型名称变化会影响大量车辆，直接全量重建
+        car_search_index.invalidate()
+    if car_ids or car_types_changed:
+        search_result_cache.bump_version()
+        quote_engine.invalidate()
+    if session.info.pop('reference_data_changed', False):
+        # 省市区或门店变化：重新加载参考数据并让城市树快照失效
+        reference_data.invalidate()
+        city_tree_snapshot.invalidate()
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_changed_cars(session):
+    session.info.pop('changed_car_ids', None)
+    session.info.pop('car_types_changed', None)
+    session.info.pop('reference_data_changed', None)
+
+@app.cli.command('sync-es')
+@click.option('--chunk-size', default=500, show_default=True, help='每个 bulk 请求的文档数')
+def sync_es_command(chunk_size):
+    """全量重建车辆索引并切换别名（修复命令）：flask --app app sync-es"""
+    stats = sync_cars_to_db_and_es(chunk_size=chunk_size)
+    if stats:
+        click.echo(f"{stats['docs']} docs -> {stats['index']} in {stats['seconds']}s ({stats['docs_per_sec']} docs/sec)")
+
 # 数据库和服务初始化将在主程序启动时执行
 
+def _resolve_image_urls(items, field):
+    """将 items 中 field 字段里的MinIO对象名称批量替换为访问URL（已是URL或本地路径的保持不变）"""
+    object_names = [
+        item[field] for item in items
+        if item.get(field) and not item[field].startswith(('http', '/'))
+    ]
+    if not object_names:
+        return
+    urls = get_file_urls(object_names)
+    for item in items:
+        if item.get(field) in urls:
+            item[field] = urls[item[field]]
+
+# 结构化搜索支持的查询参数，出现任意一个即返回带分页信息的结果
+SEARCH_STRUCTURED_PARAMS = (
+    'brand', 'fuel_type', 'transmission', 'seats', 'min_price', 'max_price', 'available',
+    'from', 'size', 'search_after', 'fields', 'sort', 'facets'
+)
+
+def _split_arg(name):
+    """读取逗号分隔的查询参数，单个值返回字符串，多个值返回列表"""
+    raw = request.args.get(name, '').strip()
+    if not raw:
+        return None
+    values = [v.strip() for v in raw.split(',') if v.strip()]
+    return values if len(values) > 1 else values[0]
+
+def _parse_search_args():
+    """将 /api/search_cars 的查询参数解析为 search_cars_page 的关键字参数"""
+    filters = {
+        'brand': _split_arg('brand'),
+        'fuel_type': _split_arg('fuel_type'),
+        'transmission': _split_arg('transmission'),
+    }
+    seats = _split_arg('seats')
+    if seats is not None:
+        filters['seats'] = [int(v) for v in seats] if isinstance(seats, list) else int(seats)
+    if request.args.get('min_price'):
+        filters['min_price'] = float(request.args['min_price'])
+    if request.args.get('max_price'):
+        filters['max_price'] = float(request.args['max_price'])
+    available = request.args.get('available')
+    if available is not None and available != '':
+        filters['availability'] = available.lower() in ('1', 'true', 'yes')
+
+    search_after = request.args.get('search_after')
+    if search_after:
+        search_after = json.loads(search_after)
+        if not isinstance(search_after, list):
+            raise ValueError('search_after 必须是 JSON 数组')
+
+    fields = request.args.get('fields')
+    return {
+        'filters': filters,
+        'from_': request.args.get('from', 0, type=int),
+        'size': request.args.get('size', type=int),
+        'search_after': search_after or None,
+        'source_fields': [f.strip() for f in fields.split(',') if f.strip()] if fields else None,
+        'sort': request.args.get('sort'),
+        'facets': request.args.get('facets', '').lower() in ('1', 'true', 'yes'),
+    }
+
 # 新的WebService支持路由
 @app.route('/api/search_cars', methods=['GET'])
 @webservice_support
+@search_result_cache.cached('api_search_cars')
 def api_search_cars():
     query = request.args.get('q', '')
+    structured = any(name in request.args for name in SEARCH_STRUCTURED_PARAMS)
     
+    if structured:
+        try:
+            search_kwargs = _parse_search_args()
+        except ValueError as e:
+            return jsonify({'status': 'error', 'message': f'搜索参数错误: {str(e)}'}), 400
+        page = es_search_cars_page(query_string=query.strip() or '*', index_name='cars', **search_kwargs)
+        results = page['hits']
     # 如果查询为空，返回所有车辆；否则进行搜索
-    if not query.strip():
+    elif not query.strip():
         # 返回所有车辆 - 使用通配符查询
         results = es_search_cars(query_string='*', index_name='cars')
     else:
         results = es_search_cars(query_string=query, index_name='cars')
     
-    # 为每个结果生成MinIO图片URL
-    for car in results:
-        if car.get('image_url'):
-            # 如果image_url是MinIO对象名称，生成访问URL
-            if not car['image_url'].startswith('http'):
-                car['image_url'] = get_public_file_url(car['image_url'])
+    # 为结果中的MinIO对象名称批量生成图片URL（每页一次）
+    _resolve_image_urls(results, 'image_url')
     
+    if structured:
+        return jsonify({
+            'status': 'success',
+            'data': results,
+            'total': page['total'],
+            'search_after': page['search_after'],
+            'facets': page['facets']
+        })
     return jsonify(results)
 
+def _format_search_row(car_info, car_type):
+    """格式化 /search_cars 返回的单条车辆数据"""
+    return {
+        'car_id': car_info.car_id,
+        'brand': car_info.brand,
+        'model': car_info.model,
+        'color': car_info.color,
+        'type_name': car_type.type_name,
+        'daily_rent': float(car_type.daily_rent),
+        'deposit': float(car_type.deposit),
+        'image': car_info.car_images or '/src/assets/images/c1.png',
+        'transmission_type': car_info.transmission_type,
+        'fuel_type': car_info.fuel_type,
+        'engine_capacity': car_info.engine_capacity
+    }
+
+def _complete_search_rows(items, window_start=None, window_end=None):
+    """为一批搜索结果生成图片URL；指定租期时一次性报价（同店取还、不含保险）"""
+    _resolve_image_urls(items, 'image')
+    if window_start and items:
+        quotes = quote_engine.quote(
+            [item['car_id'] for item in items],
+            [window_start] * len(items), [window_end] * len(items),
+            [0] * len(items), [0] * len(items)
+        )
+        for item, rental_days, total in zip(items, quotes['rental_days'].tolist(), quotes['total'].tolist()):
+            item['rental_days'] = rental_days
+            item['quote_total'] = total
+    return items
+
+def _search_row_stream(cars_query, limit, window_start, window_end, batch_size):
+    """流式模式下按 car_id keyset 分批读取，每批补充图片URL与报价，返回与 JSON 模式相同结构的数据
+
+    每批都是完整读取的 .all() 结果：补充数据时的查询（图片、报价引擎重新加载价格）
+    不会与仍在读取的服务端游标共用连接。
+    """
+    last_car_id = None
+    remaining = limit
+    while remaining is None or remaining > 0:
+        size = batch_size if remaining is None else min(batch_size, remaining)
+        batch_query = cars_query if last_car_id is None else cars_query.filter(CarInfo.car_id > last_car_id)
+        rows = batch_query.order_by(CarInfo.car_id).limit(size).all()
+        if not rows:
+            break
+        yield from _complete_search_rows([_format_search_row(*row) for row in rows], window_start, window_end)
+        last_car_id = rows[-1][0].car_id
+        if remaining is not None:
+            remaining -= len(rows)
+        if len(rows) < size:
+            break
+
+def _available_cars_query():
+    """可租赁车辆与车型的联表查询"""
+    return db.session.query(CarInfo, CarTypeInfo).join(
+        CarTypeInfo, CarInfo.type_id == CarTypeInfo.type_id
+    ).filter(CarInfo.rental_status == 0)  # 只返回可租赁的车辆
+
+def _like_search_query(query):
+    """使用MySQL LIKE查询进行搜索（无法使用索引，作为兜底方案）"""
+    cars_query = _available_cars_query()
+    if query:
+        cars_query = cars_query.filter(
+            db.or_(
+                CarInfo.brand.like(f'%{query}%'),
+                CarInfo.model.like(f'%{query}%'),
+                CarTypeInfo.type_name.like(f'%{query}%'),
+                CarInfo.color.like(f'%{query}%')
+            )
+        )
+    return cars_query
+
+def _ngram_search_query(query):
+    """先在进程内 n-gram 索引中检索车辆ID，再按ID回表取详情"""
+    if not query.strip():
+        # 空关键字即全部可租车辆，直接查表，避免把整个车队的ID放进 IN 列表
+        return _available_cars_query()
+    car_ids = car_search_index.search(query)
+    if not car_ids:
+        return None
+    # 回表时仍校验 rental_status，索引短暂滞后不会返回不可租车辆
+    return _available_cars_query().filter(CarInfo.car_id.in_(car_ids))
+
+# MySQL 全文检索中有特殊含义的字符
+FULLTEXT_OPERATORS = '+-><()~*"@'
+
+def _fulltext_term_car_ids(term, index):
+    """单个词命中的车辆ID子查询：car_info 与 car_type_info 的 FULLTEXT 索引分别检索后 UNION"""
+    against = f'"{term}"'
+    by_car = select(CarInfo.car_id).where(
+        db.text(f'MATCH (car_info.brand, car_info.model, car_info.color) AGAINST (:car_against_{index} IN BOOLEAN MODE)')
+        .bindparams(**{f'car_against_{index}': against})
+    )
+    matched_types = select(CarTypeInfo.type_id).where(
+        db.text(f'MATCH (car_type_info.type_name) AGAINST (:type_against_{index} IN BOOLEAN MODE)')
+        .bindparams(**{f'type_against_{index}': against})
+    )
+    by_type = select(CarInfo.car_id).where(CarInfo.type_id.in_(matched_types))
+    return db.union(by_car, by_type)
+
+def _fulltext_search_query(query):
+    """使用 ngram 解析器的 FULLTEXT 索引检索（MATCH ... AGAINST）
+
+    每个词在品牌/型号/颜色或车型名称任一字段中出现即算命中，多个词之间要求
+    全部命中（与 like、ngram 后端一致，如"丰田 SUV"）。两张表的 MATCH 分开
+    执行，各自使用自己的 FULLTEXT 索引；每个词一个 IN 子查询，交集和分页都
+    在数据库中完成。
+    """
+    cars_query = _available_cars_query()
+    terms = [
+        ''.join(char for char in term if char not in FULLTEXT_OPERATORS)
+        for term in query.split()
+    ]
+    for index, term in enumerate(term for term in terms if term):
+        cars_query = cars_query.filter(CarInfo.car_id.in_(_fulltext_term_car_ids(term, index)))
+    return cars_query
+
+def _es_search_query(query, after=None, limit=None, busy_car_ids=()):
+    """在 Elasticsearch 中按 car_id 顺序检索可租车辆ID，再回表取详情
+
+    租期内已占用的车辆在 ES 中排除；回表时 rental_status 可能与 ES 不一致
+    （同步滞后），被过滤掉的车辆由后续的 ES 页补足，直到凑够 limit + 1 条
+    （用于判断是否还有下一页）或 ES 中没有更多结果。
+    """
+    wanted = (limit or SEARCH_PAGE_DEFAULT_LIMIT) + 1
+    search_after = [after] if after else None
+    car_ids = []
+    while len(car_ids) < wanted:
+        page = es_search_cars_page(
+            query_string=query or '*',
+            index_name='cars',
+            filters={'availability': True, 'exclude_ids': sorted(busy_car_ids)},
+            size=SEARCH_PAGE_MAX_LIMIT,
+            search_after=search_after,
+            source_fields=['id'],
+            sort='id_asc'
+        )
+        hit_ids = [hit['id'] for hit in page['hits'] if hit.get('id') is not None]
+        if hit_ids:
+            available = {car_id for (car_id,) in db.session.query(CarInfo.car_id).filter(
+                CarInfo.car_id.in_(hit_ids), CarInfo.rental_status == 0
+            )}
+            car_ids.extend(car_id for car_id in hit_ids if car_id in available)
+        search_after = page['search_after']
+        if not search_after:
+            break
+    if not car_ids:
+        return None
+    return _available_cars_query().filter(CarInfo.car_id.in_(car_ids[:wanted]))
+
+# /search_cars 可选的检索后端，便于在生产环境对比延迟
+SEARCH_BACKENDS = {
+    'ngram': _ngram_search_query,
+    'fulltext': _fulltext_search_query,
+    'like': _like_search_query,
+    'es': _es_search_query,
+}
+SEARCH_PAGE_DEFAULT_LIMIT = 20
+SEARCH_PAGE_MAX_LIMIT = 100
+# 流式响应时每批从数据库读取的行数
+STREAM_BATCH_SIZE = 200
+
 # 新增MySQL搜索车辆的API
 @app.route('/search_cars', methods=['GET'])
 @webservice_support
+@search_result_cache.cached('search_cars', skip_params=('start_time', 'end_time'))
 def search_cars_mysql():
-    """使用MySQL替代Elasticsearch的车辆搜索"""
+    """使用MySQL替代Elasticsearch的车辆搜索
+
+    查询参数：
+        q: 关键字
+        backend: 检索后端 ngram（默认）| fulltext | like | es
+        after: 上一页最后一条的 car_id（keyset 分页）
+        limit: 每页条数；fulltext/es 默认 20，ngram/like 未指定时返回全部
+        stream: 1 时（或 Accept: application/x-ndjson）以NDJSON逐行流式返回
+        start_time/end_time: 只返回该租期内没有有效订单的车辆
+    """
     query = request.args.get('q', '').strip()
+    backend = request.args.get('backend', 'ngram')
+    if backend not in SEARCH_BACKENDS:
+        return jsonify({
+            'status': 'error',
+            'message': f'不支持的检索后端: {backend}',
+            'data': []
+        }), 400
+    
+    after = request.args.get('after', type=int)
+    limit = request.args.get('limit', type=int)
+    window_start = window_end = None
+    if request.args.get('start_time') or request.args.get('end_time'):
+        try:
+            window_start = parse_client_datetime(request.args.get('start_time'))
+            window_end = parse_client_datetime(request.args.get('end_time'))
+        except (TypeError, ValueError, AttributeError):
+            return jsonify({
+                'status': 'error',
+                'message': 'start_time 和 end_time 需同时提供且为 ISO 时间',
+                'data': []
+            }), 400
+        if window_end <= window_start:
+            return jsonify({
+                'status': 'error',
+                'message': '结束时间必须晚于开始时间',
+                'data': []
+            }), 400
+    if limit is None and backend in ('fulltext', 'es'):
+        limit = SEARCH_PAGE_DEFAULT_LIMIT
+    if limit is not None:
+        limit = max(1, min(limit, SEARCH_PAGE_MAX_LIMIT))
     
     try:
-        if not query:
-            # 返回所有可用车辆
-            cars_query = db.session.query(CarInfo, CarTypeInfo).join(
-                CarTypeInfo, CarInfo.type_id == CarTypeInfo.type_id
-            ).filter(CarInfo.rental_status == 0)  # 只返回可租赁的车辆
-        else:
-            # 使用MySQL LIKE查询进行搜索
-            cars_query = db.session.query(CarInfo, CarTypeInfo).join(
-                CarTypeInfo, CarInfo.type_id == CarTypeInfo.type_id
-            ).filter(
-                db.and_(
-                    CarInfo.rental_status == 0,  # 只返回可租赁的车辆
-                    db.or_(
-                        CarInfo.brand.like(f'%{query}%'),
-                        CarInfo.model.like(f'%{query}%'),
-                        CarTypeInfo.type_name.like(f'%{query}%'),
-                        CarInfo.color.like(f'%{query}%')
-                    )
-                )
-            )
+        started = time.perf_counter()
+        # 按租期过滤：排除在 [start_time, end_time) 内已有有效订单的车辆
+        busy_car_ids = availability_index.busy_cars(window_start, window_end) if window_start else set()
+        try:
+            if backend == 'es':
+                # ES 分页在检索阶段完成，需要提前知道游标、页大小和要排除的车辆
+                cars_query = _es_search_query(query, after=after, limit=limit, busy_car_ids=busy_car_ids)
+            else:
+                cars_query = SEARCH_BACKENDS[backend](query)
+        except Exception as e:
+            if backend != 'ngram':
+                raise
+            print(f"n-gram 索引检索失败，回退到 LIKE 查询: {e}")
+            cars_query = _like_search_query(query)
         
-        cars = cars_query.all()
+        stream = wants_ndjson_stream()
+        cars = []
+        if cars_query is not None and busy_car_ids:
+            cars_query = cars_query.filter(CarInfo.car_id.notin_(busy_car_ids))
+        if cars_query is not None:
+            # keyset 分页：car_id > after，多取一条用于判断是否还有下一页
+            if after:
+                cars_query = cars_query.filter(CarInfo.car_id > after)
+            if stream:
+                # 流式模式：按 car_id 分批读取，每批补充图片URL与报价后逐行输出
+                return ndjson_response(_search_row_stream(
+                    cars_query, limit, window_start, window_end, STREAM_BATCH_SIZE
+                ))
+            cars_query = cars_query.order_by(CarInfo.car_id)
+            if limit is not None:
+                cars_query = cars_query.limit(limit + 1)
+            cars = cars_query.all()
+        elif stream:
+            return ndjson_response([])
+        
+        has_more = limit is not None and len(cars) > limit
+        if has_more:
+            cars = cars[:limit]
         
         # 格式化返回数据
-        result = []
-        for car_info, car_type in cars:
-            result.append({
-                'car_id': car_info.car_id,
-                'brand': car_info.brand,
-                'model': car_info.model,
-                'color': car_info.color,
-                'type_name': car_type.type_name,
-                'daily_rent': float(car_type.daily_rent),
-                'deposit': float(car_type.deposit),
-                'image': car_info.car_images or '/src/assets/images/c1.png',
-                'transmission_type': car_info.transmission_type,
-                'fuel_type': car_info.fuel_type,
-                'engine_capacity': car_info.engine_capacity
-            })
+        result = _complete_search_rows(
+            [_format_search_row(car_info, car_type) for car_info, car_type in cars],
+            window_start, window_end
+        )
         
         return jsonify({
             'status': 'success',
             'data': result,
-            'total': len(result)
+            'total': len(result),
+            'backend': backend,
+            'next_after': result[-1]['car_id'] if has_more else None,
+            'took_ms': round((time.perf_counter() - started) * 1000, 2)
         })
         
     except Exception as e:
@@ -366,6 +980,42 @@ def search_cars_mysql():
         }), 500
 
 
+@app.route('/api/password_service/stats', methods=['GET'])
+def get_password_service_stats():
+    return jsonify({
+        'status': 'success',
+        'data': password_service.stats()
+    })
+
+@app.route('/api/user_profile_cache/stats', methods=['GET'])
+def get_user_profile_cache_stats():
+    return jsonify({
+        'status': 'success',
+        'data': user_profile_cache.stats()
+    })
+
+@app.route('/api/jwt_cache/stats', methods=['GET'])
+def get_jwt_cache_stats():
+    return jsonify({
+        'status': 'success',
+        'data': jwt_token_cache.stats()
+    })
+
+# 搜索缓存命中统计
+@app.route('/api/search_cache/stats', methods=['GET'])
+def get_search_cache_stats():
+    try:
+        return jsonify({
+            'status': 'success',
+            'data': search_result_cache.stats()
+        })
+    except Exception as e:
+        return jsonify({
+            'status': 'error',
+            'message': str(e)
+        }), 500
+
+
 # 新的WebService支持路由
 @app.route('/api/upload_car_image', methods=['POST'])
 @webservice_support
@@ -406,7 +1056,7 @@ def upload_car_image():
 def get_image_url(object_name):
     """获取MinIO中图片的访问URL"""
     try:
-        # 获取预签名URL（1小时有效期）
+        # 获取预签名URL（1小时有效期，有效期内复用缓存的签名）
         url = get_file_url(object_name)
         if url:
             return jsonify({'url': url})
@@ -434,18 +1084,15 @@ def update_car_image():
         if not car:
             return jsonify({'error': 'Car not found'}), 404
         
-        # 删除旧图片（如果存在且是MinIO对象）
+        # 旧图片（如果存在且是MinIO对象）在提交成功后由发件箱删除
         old_image = car.car_images
         if old_image and not old_image.startswith('http') and old_image.startswith('cars/'):
-            delete_file_from_minio(old_image)
+            add_outbox_event('minio.delete', car_id, {'object_name': old_image})
         
-        # 更新车辆图片字段
+        # 更新车辆图片字段（同一事务写入 car.changed 事件，由发件箱同步到ES）
         car.car_images = new_image_object_name
         db.session.commit()
         
-        # 重新同步到Elasticsearch
-        sync_cars_to_db_and_es()
-        
         return jsonify({
             'success': True,
             'message': 'Car image updated successfully',
@@ -455,29 +1102,23 @@ def update_car_image():
         db.session.rollback()
         return jsonify({'error': f'Failed to update car image: {str(e)}'}), 500
 
+# 注册时各标识冲突的提示
+REGISTER_CONFLICT_MESSAGES = {
+    'username': '用户名已存在',
+    'phone': '该手机号码已注册',
+    'email': '该邮箱已注册',
+    'id_number': '该身份证号码已注册'
+}
+
 @app.route('/api/check_user', methods=['POST'])
 def check_user():
     data = request.json
-    username = data.get('username')
-    phone = data.get('phone')
-    email = data.get('email')
-    id_number = data.get('id_number')
-
-    # 检查用户名是否已存在
-    if UserInfo.query.filter_by(username=username).first():
-        return jsonify({'message': '用户名已存在'}), 400
-
-    # 检查手机号是否已注册
-    if UserInfo.query.filter_by(phone=phone).first():
-        return jsonify({'message': '该手机号码已注册'}), 400
+    values = {field: data.get(field) for field in IDENTIFIER_FIELDS}
 
-    # 检查邮箱是否已注册
-    if UserInfo.query.filter_by(email=email).first():
-        return jsonify({'message': '该邮箱已注册'}), 400
-
-    # 检查身份证号码是否已注册
-    if UserInfo.query.filter_by(id_number=id_number).first():
-        return jsonify({'message': '该身份证号码已注册'}), 400
+    # 一次检查全部标识，返回所有冲突字段，提示信息按 用户名/手机号/邮箱/身份证号 的优先级
+    conflicts = find_user_conflicts(values)
+    if conflicts:
+        return jsonify({'message': REGISTER_CONFLICT_MESSAGES[conflicts[0]], 'conflicts': conflicts}), 400
 
     return jsonify({'message': '验证通过'}), 200
 
@@ -485,33 +1126,36 @@ def check_user():
 # 新的WebService支持路由
 @app.route('/api/auth/register_user', methods=['POST'])
 @webservice_support
+@idempotency_store.idempotent('register_user')
 def register_user():
     data = request.json
     username = data['username']
     email = data['email']
-    password = data['password']  # 密码不加密
+    password = data['password']
     real_name = data['real_name']
     phone = data['phone']
     id_number = data['id_number']
 
     # 检查用户是否已经存在
-    if UserInfo.query.filter_by(username=username).first():
-        return jsonify({'message': '用户名已存在'}), 400
-    if UserInfo.query.filter_by(phone=phone).first():
-        return jsonify({'message': '该手机号码已注册'}), 400
-    if UserInfo.query.filter_by(email=email).first():
-        return jsonify({'message': '该邮箱已注册'}), 400
-    if UserInfo.query.filter_by(id_number=id_number).first():
-        return jsonify({'message': '该身份证号码已注册'}), 400
+    conflicts = find_user_conflicts({'username': username, 'phone': phone, 'email': email, 'id_number': id_number})
+    if conflicts:
+        return jsonify({'message': REGISTER_CONFLICT_MESSAGES[conflicts[0]], 'conflicts': conflicts}), 400
 
     # 获取当前时间作为注册时间
     register_time = datetime.now()
 
+    try:
+        password_hash = password_service.hash(password)
+    except PasswordServiceBusy:
+        return jsonify({'message': '注册人数过多，请稍后重试'}), 503
+    except ValueError:
+        return jsonify({'message': '密码格式不正确'}), 400
+
     # 插入新用户到 user_info 表
     new_user = UserInfo(
         username=username,
         email=email,
-        password=password,  # 直接存储密码
+        password=password_hash,  # bcrypt 哈希
         real_name=real_name,
         phone=phone,
         id_number=id_number,
@@ -519,7 +1163,16 @@ def register_user():
     )
 
     db.session.add(new_user)
-    db.session.commit()
+    try:
+        db.session.commit()
+    except IntegrityError:
+        # 并发注册抢先占用了某个标识
+        db.session.rollback()
+        conflicts = find_user_conflicts({'username': username, 'phone': phone, 'email': email, 'id_number': id_number})
+        message = REGISTER_CONFLICT_MESSAGES[conflicts[0]] if conflicts else '注册信息已被占用'
+        return jsonify({'message': message, 'conflicts': conflicts}), 400
+    # 预热资料缓存，注册后跳转的第一个页面即可命中
+    user_profile_cache.refresh(new_user.user_id)
 
     return jsonify({'success': True}), 201
 
@@ -536,9 +1189,23 @@ def login_user():
     user = UserInfo.query.filter_by(username=username).first()
 
     if user:
-        # 直接比较密码（明文密码对比）
-        if password == user.password:
-            # 密码正确，设置 session
+        try:
+            matched, needs_rehash = password_service.verify(password, user.password)
+        except PasswordServiceBusy:
+            return jsonify({"message": "登录人数过多，请稍后重试", "status": "error"}), 503
+        except ValueError:
+            return jsonify({"message": "密码格式不正确", "status": "error"}), 400
+        if matched:
+            if needs_rehash:
+                # 历史明文密码或低成本哈希：用当前成本因子重新哈希
+                try:
+                    user.password = password_service.hash(password)
+                    db.session.commit()
+                except Exception as e:
+                    db.session.rollback()
+                    print(f"升级用户 {user.user_id} 的密码哈希失败: {e}")
+            # 密码正确，设置 session（更换 session ID，旧 ID 随之失效）
+            session.regenerate()
             session['user_id'] = user.user_id
             session['username'] = user.username
             session['email'] = user.email
@@ -575,27 +1242,26 @@ def get_user_info():
     user_id = request.current_user_id  # 从 JWT token 中获取用户ID
     
     try:
-        user = UserInfo.query.filter_by(user_id=user_id).first()
-        if user:
-            return jsonify({
-                "status": "success",
-                "user_info": {
-                    "user_id": user.user_id,
-                    "username": user.username,
-                    "email": user.email,
-                    "phone": user.phone,
-                    "real_name": user.real_name,
-                    "id_number": user.id_number,
-                    "id_type": user.id_type,
-                    "register_time": user.register_time.strftime('%Y-%m-%d %H:%M:%S') if user.register_time else None
-                }
-            })
-        else:
+        # 依次查询进程内缓存、Redis，都未命中时才读取数据库
+        profile = user_profile_cache.get(user_id)
+        if profile is None:
             return jsonify({"message": "用户不存在", "status": "error"}), 404
+        return app.response_class(
+            b'{"status": "success", "user_info": ' + profile + b'}',
+            mimetype='application/json'
+        )
     except Exception as e:
         return jsonify({"message": f"获取用户信息失败: {str(e)}", "status": "error"}), 500
 
 
+# 修改资料时各标识冲突的提示
+UPDATE_CONFLICT_MESSAGES = {
+    'username': '用户名已存在',
+    'phone': '手机号已被使用',
+    'email': '邮箱已被使用',
+    'id_number': '身份证号已被使用'
+}
+
 # 新的WebService支持路由
 @app.route('/api/update_user_info', methods=['PUT', 'POST'])  # 同时支持 PUT 和 POST
 @webservice_support
@@ -610,29 +1276,14 @@ def update_user_info():
         if not user:
             return jsonify({"message": "用户不存在", "status": "error"}), 404
         
-        # 检查用户名是否已存在（如果要更新用户名）
-        if 'username' in data and data['username'] != user.username:
-            existing_user = UserInfo.query.filter_by(username=data['username']).first()
-            if existing_user:
-                return jsonify({"message": "用户名已存在", "status": "error"}), 400
-        
-        # 检查邮箱是否已存在（如果要更新邮箱）
-        if 'email' in data and data['email'] != user.email:
-            existing_email = UserInfo.query.filter_by(email=data['email']).first()
-            if existing_email:
-                return jsonify({"message": "邮箱已被使用", "status": "error"}), 400
-        
-        # 检查手机号是否已存在（如果要更新手机号）
-        if 'phone' in data and data['phone'] != user.phone:
-            existing_phone = UserInfo.query.filter_by(phone=data['phone']).first()
-            if existing_phone:
-                return jsonify({"message": "手机号已被使用", "status": "error"}), 400
-        
-        # 检查身份证号是否已存在（如果要更新身份证号）
-        if 'id_number' in data and data['id_number'] != user.id_number:
-            existing_id = UserInfo.query.filter_by(id_number=data['id_number']).first()
-            if existing_id:
-                return jsonify({"message": "身份证号已被使用", "status": "error"}), 400
+        # 只检查实际修改的标识，合并为一次查询
+        changed = {
+            field: data[field] for field in IDENTIFIER_FIELDS
+            if field in data and data[field] != getattr(user, field)
+        }
+        conflicts = find_user_conflicts(changed, exclude_user_id=user_id)
+        if conflicts:
+            return jsonify({"message": UPDATE_CONFLICT_MESSAGES[conflicts[0]], "status": "error"}), 400
         
         # 更新用户信息
         if 'username' in data:
@@ -646,7 +1297,15 @@ def update_user_info():
         if 'id_number' in data:
             user.id_number = data['id_number']
         
-        db.session.commit()
+        try:
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()
+            conflicts = find_user_conflicts(changed, exclude_user_id=user_id)
+            message = UPDATE_CONFLICT_MESSAGES[conflicts[0]] if conflicts else '资料已被其他用户使用'
+            return jsonify({"message": message, "status": "error"}), 400
+        # 写入新资料，后续读取直接命中缓存
+        user_profile_cache.refresh(user_id)
         
         return jsonify({
             "status": "success",
@@ -666,20 +1325,40 @@ def update_user_info():
 @webservice_support
 def logout():
     session.clear()
+    # 同时撤销请求携带的 JWT，其他进程缓存命中时也会拒绝
+    auth_header = request.headers.get('Authorization', '')
+    if auth_header.startswith('Bearer '):
+        try:
+            jwt_token_cache.revoke(auth_header[len('Bearer '):].strip())
+        except Exception as e:
+            print(f"撤销 token 失败: {e}")
     return jsonify({
         "status": "success",
         "message": "已成功退出登录"
     })
 
 
+def load_reference_rows():
+    """读取省、市、区县、门店四张表（只取接口需要的列）"""
+    return {
+        'provinces': db.session.query(Province.name, Province.province_id).order_by(Province._id).all(),
+        'cities': db.session.query(City.name, City.city_id, City.province_id).order_by(City._id).all(),
+        'countries': db.session.query(Country.name, Country.country_id, Country.city_id).order_by(Country._id).all(),
+        'stores': db.session.query(
+            Store.store_id, Store.store_name, Store.address, Store.business_hours, Store.phone, Store.country_id
+        ).order_by(Store.store_id).all(),
+    }
+
+# 级联下拉框使用的参考数据，首次访问时加载，1小时后或相关表写入后重新加载
+reference_data = ReferenceData(load_reference_rows, ttl=3600)
+
+def _reference_response(body):
+    return app.response_class(body, mimetype='application/json', headers={'Content-Type': 'application/json; charset=utf-8'})
+
 # 省份接口
 @app.route('/api/provinces', methods=['GET'])
 def get_provinces():
-    provinces = Province.query.all()
-    province_list = [{"label": province.name, "value": province.province_id} for province in provinces]
-    response = jsonify({"provinces": province_list})
-    response.set_data(json.dumps(response.get_json(), ensure_ascii=False))
-    return response
+    return _reference_response(reference_data.provinces())
 
 # 获取某省所有城市
 @app.route('/api/cities', methods=['GET'])
@@ -688,12 +1367,7 @@ def get_cities():
     if not province_id:
         return jsonify({"error": "省份 ID 参数不能为空"}), 400
 
-    cities = City.query.filter_by(province_id=province_id).all()
-    city_list = [{"label": city.name, "value": city.city_id} for city in cities]
-
-    response = jsonify({"cities": city_list})
-    response.set_data(json.dumps(response.get_json(), ensure_ascii=False))
-    return response
+    return _reference_response(reference_data.children('cities', province_id))
 
 # 获取某城市所有区域（国家或区）
 @app.route('/api/countries', methods=['GET'])
@@ -702,12 +1376,7 @@ def get_countries():
     if not city_id:
         return jsonify({"error": "城市 ID 参数不能为空"}), 400
 
-    countries = Country.query.filter_by(city_id=city_id).all()
-    country_list = [{"label": country.name, "value": country.country_id} for country in countries]
-
-    response = jsonify({"countries": country_list})
-    response.set_data(json.dumps(response.get_json(), ensure_ascii=False))
-    return response
+    return _reference_response(reference_data.children('countries', city_id))
 
 # 获取某城市所有门店
 @app.route('/api/stores', methods=['GET'])
@@ -716,54 +1385,72 @@ def get_stores():
     if not country_id:
         return jsonify({"error": "区县 ID 参数不能为空"}), 400
 
-    stores = Store.query.filter_by(country_id=country_id).all()
-    store_list = [{"store_id": store.store_id,
-                   "store_name": store.store_name,
-                   "address": store.address,
-                   "business_hours": store.business_hours,
-                   "phone": store.phone} for store in stores]
+    return _reference_response(reference_data.children('stores', country_id))
 
-    return jsonify({"stores": store_list})
+@app.cli.command('reload-reference-data')
+def reload_reference_data_command():
+    """重新生成参考数据和城市树快照：flask --app app reload-reference-data"""
+    with app.app_context():
+        city_tree_snapshot.invalidate()
+        reference_data.reload()
+    click.echo("reference data reloaded")
+
+def build_city_tree():
+    """用三次批量查询构建 省 -> 市 -> 区县 树（避免逐省、逐市查询的 N+1）"""
+    provinces = db.session.query(Province._id, Province.name, Province.province_id).order_by(Province._id).all()
+    cities = db.session.query(City._id, City.name, City.city_id, City.province_id).order_by(City._id).all()
+    countries = db.session.query(Country._id, Country.name, Country.country_id, Country.city_id).order_by(Country._id).all()
+    
+    # 按上级ID分组
+    districts_by_city = {}
+    for country in countries:
+        districts_by_city.setdefault(country.city_id, []).append({
+            'id': country._id,
+            'name': country.name,
+            'code': country.country_id
+        })
+    
+    cities_by_province = {}
+    for city in cities:
+        cities_by_province.setdefault(city.province_id, []).append({
+            'id': city._id,
+            'name': city.name,
+            'code': city.city_id,
+            'districts': districts_by_city.get(city.city_id, [])
+        })
+    
+    return [{
+        'id': province._id,
+        'name': province.name,
+        'code': province.province_id,
+        'cities': cities_by_province.get(province.province_id, [])
+    } for province in provinces]
+
+# 城市树快照：按内容哈希作为 ETag，Redis 中共享，数据变更后执行 `flask refresh-city-tree`
+city_tree_snapshot = VersionedSnapshot(redis_binary_client, 'city_tree', build_city_tree)
+
+@app.cli.command('refresh-city-tree')
+def refresh_city_tree_command():
+    """重新生成城市树快照：flask --app app refresh-city-tree"""
+    with app.app_context():
+        etag, body = city_tree_snapshot.rebuild()
+    click.echo(f"city tree snapshot {etag} ({len(body)} bytes)")
 
 @app.route('/api/city-tree', methods=['GET'])
 def get_city_tree():
     try:
-        # 获取所有省份及其关联数据
-        provinces = Province.query.all()
-        
-        # 构建树状结构数据
-        tree_data = []
-        for province in provinces:
-            province_data = {
-                'id': province._id,
-                'name': province.name,
-                'code': province.province_id,
-                'cities': []
-            }
-            
-            # 获取该省份的所有城市
-            cities = City.query.filter_by(province_id=province.province_id).all()
-            for city in cities:
-                city_data = {
-                    'id': city._id,
-                    'name': city.name,
-                    'code': city.city_id,
-                    'districts': []
-                }
-                
-                # 获取该城市的所有区县
-                countries = Country.query.filter_by(city_id=city.city_id).all()
-                city_data['districts'] = [{
-                    'id': country._id,
-                    'name': country.name,
-                    'code': country.country_id
-                } for country in countries]
-                
-                province_data['cities'].append(city_data)
-            
-            tree_data.append(province_data)
+        etag = city_tree_snapshot.current_etag()
+        # 客户端已持有当前版本时直接返回 304，无需读取快照内容
+        if etag is not None and etag in request.if_none_match:
+            response = app.response_class(status=304)
+            response.set_etag(etag)
+            return response
         
-        return jsonify(tree_data)
+        etag, body = city_tree_snapshot.get(etag)
+        response = app.response_class(body, mimetype='application/json')
+        response.set_etag(etag)
+        response.cache_control.no_cache = True  # 允许缓存，但每次使用前需要用 ETag 校验
+        return response.make_conditional(request)
     
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -817,41 +1504,558 @@ class OrderInfo(db.Model):
     update_time = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     status = db.Column(db.SmallInteger, default=0)  # 0-待支付/1-已支付/2-已取车/3-已还车/4-已取消
     
+    __table_args__ = (
+        # 用户订单列表按 user_id 定位，(create_time, order_id) 倒序做 keyset 分页
+        db.Index('idx_order_user_create', 'user_id', 'create_time'),
+    )
+    
     # 关联用户表
     user = db.relationship('UserInfo', backref=db.backref('orders', lazy=True))
 
+# 优惠券定义
+class CouponInfo(db.Model):
+    __tablename__ = 'coupon_info'
+
+    coupon_id = db.Column(db.Integer, primary_key=True)
+    coupon_name = db.Column(db.String(100))
+    coupon_type = db.Column(db.SmallInteger)
+    amount = db.Column(db.Numeric(10, 2))      # 优惠金额
+    threshold = db.Column(db.Numeric(10, 2))   # 使用门槛（租金）
+    start_time = db.Column(db.DateTime)
+    end_time = db.Column(db.DateTime)
+    status = db.Column(db.SmallInteger)        # 0-已停用
+
+# 用户领取的优惠券
+class UserCoupon(db.Model):
+    __tablename__ = 'user_coupon'
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer)
+    coupon_id = db.Column(db.Integer)
+    get_time = db.Column(db.DateTime)
+    use_time = db.Column(db.DateTime)          # 为空表示未使用
+    status = db.Column(db.SmallInteger)        # 0-未使用/1-已使用
+
+def resolve_coupon_discount(user_id, coupon_id, rental_amount):
+    """校验用户持有且未使用的优惠券，返回 (优惠金额, user_coupon.id)
+
+    优惠金额为券面金额，不超过租金（押金不参与优惠）。优惠券不可用时抛出
+    ValueError，消息可直接返回给客户端。
+    """
+    row = db.session.query(UserCoupon.id, CouponInfo).join(
+        CouponInfo, CouponInfo.coupon_id == UserCoupon.coupon_id
+    ).filter(
+        UserCoupon.user_id == user_id,
+        UserCoupon.coupon_id == coupon_id,
+        UserCoupon.use_time.is_(None)
+    ).first()
+    if row is None:
+        raise ValueError('优惠券不存在或已使用')
+    user_coupon_id, coupon = row
+    now = datetime.utcnow()
+    if coupon.status == 0 or (coupon.start_time and now < coupon.start_time) or (coupon.end_time and now > coupon.end_time):
+        raise ValueError('优惠券不在有效期内')
+    if coupon.threshold is not None and rental_amount < float(coupon.threshold):
+        raise ValueError(f'租金未达到优惠券使用门槛 ¥{float(coupon.threshold):.2f}')
+    discount = max(0.0, min(float(coupon.amount or 0), rental_amount))
+    return round(discount, 2), user_coupon_id
+
+def parse_client_datetime(value):
+    """解析前端传入的 ISO 时间，带时区的统一转换为 UTC 的 naive datetime（与数据库一致）"""
+    parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+def find_conflicting_order(car_id, start_time, end_time):
+    """在数据库中查找与 [start_time, end_time) 重叠的有效订单ID"""
+    return db.session.query(OrderInfo.order_id).filter(
+        OrderInfo.car_id == car_id,
+        OrderInfo.status.in_(ACTIVE_ORDER_STATUSES),
+        OrderInfo.start_time < end_time,
+        OrderInfo.end_time > start_time
+    ).limit(1).scalar()
+
+def load_orders_for_availability():
+    """为可用性索引读取所有未取消的订单（按结束时间排序，服务端游标逐批读取）"""
+    return db.session.query(
+        OrderInfo.order_id, OrderInfo.car_id, OrderInfo.start_time, OrderInfo.end_time,
+        OrderInfo.status, OrderInfo.return_store_id
+    ).filter(OrderInfo.status != 4).order_by(OrderInfo.end_time).yield_per(1000)
+
+# 车辆可用性索引，启动时加载，订单提交后增量更新
+availability_index = AvailabilityIndex(load_orders_for_availability, context=app.app_context)
+
+def load_orders_for_utilization(start, end):
+    """为利用率分析流式读取与 [start, end) 重叠的未取消订单"""
+    return db.session.query(
+        OrderInfo.car_id, OrderInfo.start_time, OrderInfo.end_time, OrderInfo.pickup_store_id
+    ).filter(
+        OrderInfo.status != 4, OrderInfo.start_time < end, OrderInfo.end_time > start
+    ).yield_per(1000)
+
+def load_fleet_for_utilization():
+    """当前车队：(car_id, type_id, 所在门店)，门店按最近一次还车门店推断"""
+    car_stores = availability_index.car_stores()
+    return [
+        (car_id, type_id, car_stores.get(car_id))
+        for car_id, type_id in db.session.query(CarInfo.car_id, CarInfo.type_id)
+    ]
+
+# 利用率分析，已结束日期的结果缓存在进程内，订单提交后按区间失效
+utilization_analytics = UtilizationAnalytics(load_orders_for_utilization, load_fleet_for_utilization)
+
+# 用户订单列表首页缓存（订单写入提交后失效）
+USER_ORDERS_CACHE_TTL = 300
+
+def _user_orders_cache_key(user_id):
+    return f"user_orders:first_page:{user_id}"
+
+def invalidate_user_orders_cache(*user_ids):
+    try:
+        redis_client.delete(*[_user_orders_cache_key(user_id) for user_id in user_ids])
+    except Exception as e:
+        print(f"清除用户订单缓存失败: {e}")
+
+# 租赁统计，订单提交后增量更新
+rental_stats = RentalStats(redis_client)
+
+def _rental_stat_labels(connection, car_id, store_id):
+    """在 flush 所用的连接上查询订单对应的 (车型, 取车城市) 统计名称"""
+    car = connection.execute(
+        select(CarInfo.brand, CarInfo.model).where(CarInfo.car_id == car_id)
+    ).first()
+    city = connection.execute(
+        select(City.name).select_from(Store)
+        .join(Country, Store.country_id == Country.country_id)
+        .join(City, Country.city_id == City.city_id)
+        .where(Store.store_id == store_id)
+    ).scalar()
+    return vehicle_label(car.brand, car.model) if car else None, city
+
+def _track_rental_stat(session, connection, target, was_rented, is_rented):
+    if was_rented != is_rented:
+        vehicle, city = _rental_stat_labels(connection, target.car_id, target.pickup_store_id)
+        write_outbox_event(connection, session, 'rental_stats.delta', target.order_id, {
+            'vehicle': vehicle, 'city': city, 'delta': 1 if is_rented else -1
+        })
+
+def _publish_order_event(session, connection, target, action):
+    """订单变更通知（Redis order_events 频道，供 WebSocket 服务推送）"""
+    write_outbox_event(connection, session, 'order.changed', target.order_id, {
+        'action': action,
+        'order_id': target.order_id,
+        'user_id': target.user_id,
+        'car_id': target.car_id,
+        'status': target.status,
+        'start_time': target.start_time.isoformat() if target.start_time else None,
+        'end_time': target.end_time.isoformat() if target.end_time else None
+    })
+
+def _track_order_change(mapper, connection, target):
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault('changed_order_users', set()).add(target.user_id)
+        session.info.setdefault('changed_orders', []).append((
+            target.order_id, target.car_id, target.start_time, target.end_time,
+            target.status, target.return_store_id
+        ))
+        # 状态进入/离开成交状态时调整统计（新增订单的原状态视为未成交）
+        status_history = sa_inspect(target).attrs.status.history
+        old_status = status_history.deleted[0] if status_history.deleted else (
+            None if status_history.added else target.status
+        )
+        _track_rental_stat(
+            session, connection, target,
+            old_status in RENTED_ORDER_STATUSES, target.status in RENTED_ORDER_STATUSES
+        )
+        _publish_order_event(session, connection, target, 'created' if old_status is None else 'updated')
+
+def _track_order_delete(mapper, connection, target):
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault('changed_order_users', set()).add(target.user_id)
+        session.info.setdefault('changed_orders', []).append((
+            target.order_id, target.car_id, None, None, None, None
+        ))
+        _track_rental_stat(session, connection, target, target.status in RENTED_ORDER_STATUSES, False)
+        _publish_order_event(session, connection, target, 'deleted')
+
+event.listen(OrderInfo, 'after_insert', _track_order_change)
+event.listen(OrderInfo, 'after_update', _track_order_change)
+event.listen(OrderInfo, 'after_delete', _track_order_delete)
+
+@event.listens_for(Session, 'after_commit')
+def _apply_changed_orders(session):
+    for change in session.info.pop('changed_orders', ()):
+        availability_index.apply(*change)
+        utilization_analytics.invalidate(change[2], change[3])
+    changed_users = session.info.pop('changed_order_users', None)
+    if changed_users:
+        invalidate_user_orders_cache(*changed_users)
+    if session.info.pop('outbox_written', False):
+        outbox_dispatcher.notify()
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_changed_orders(session):
+    session.info.pop('changed_orders', None)
+    session.info.pop('changed_order_users', None)
+    session.info.pop('outbox_written', None)
+
+def rebuild_rental_stats():
+    """用服务端游标流式读取成交订单，重新计算租赁统计"""
+    order_rows = db.session.query(CarInfo.brand, CarInfo.model, City.name).select_from(OrderInfo).outerjoin(
+        CarInfo, OrderInfo.car_id == CarInfo.car_id
+    ).outerjoin(
+        Store, OrderInfo.pickup_store_id == Store.store_id
+    ).outerjoin(
+        Country, Store.country_id == Country.country_id
+    ).outerjoin(
+        City, Country.city_id == City.city_id
+    ).filter(OrderInfo.status.in_(RENTED_ORDER_STATUSES)).yield_per(1000)
+    
+    branch_rows = db.session.query(City.name, db.func.count(Store.store_id)).select_from(Store).join(
+        Country, Store.country_id == Country.country_id
+    ).join(
+        City, Country.city_id == City.city_id
+    ).group_by(City.name).all()
+    
+    return rental_stats.rebuild(
+        ((vehicle_label(brand, model) if brand or model else None, city) for brand, model, city in order_rows),
+        branch_rows
+    )
+
+@app.cli.command('rebuild-rental-stats')
+def rebuild_rental_stats_command():
+    """从 order_info 重新计算首页租赁统计：flask --app app rebuild-rental-stats"""
+    with app.app_context():
+        stats = rebuild_rental_stats()
+    click.echo(
+        f"{stats['orders']} orders -> {stats['vehicles']} vehicles, {stats['cities']} cities; "
+        f"{stats['branch_cities']} cities with branches"
+    )
+
+# 车辆可用性查询
+@app.route('/api/availability', methods=['GET'])
+def get_availability():
+    """查询车辆在 [start_time, end_time) 内是否可租
+
+    参数：start_time、end_time，以及 car_id（单车）或 store_id（门店内空闲车辆）
+    """
+    try:
+        start_time = parse_client_datetime(request.args.get('start_time'))
+        end_time = parse_client_datetime(request.args.get('end_time'))
+    except (TypeError, ValueError, AttributeError):
+        return jsonify({"status": "error", "message": "start_time 和 end_time 为必填的 ISO 时间"}), 400
+    if end_time <= start_time:
+        return jsonify({"status": "error", "message": "end_time 必须晚于 start_time"}), 400
+    
+    car_id = request.args.get('car_id', type=int)
+    store_id = request.args.get('store_id', type=int)
+    if car_id is not None:
+        return jsonify({
+            "status": "success",
+            "car_id": car_id,
+            "available": availability_index.is_free(car_id, start_time, end_time)
+        })
+    if store_id is not None:
+        return jsonify({
+            "status": "success",
+            "store_id": store_id,
+            "car_ids": availability_index.free_cars_at_store(store_id, start_time, end_time)
+        })
+    return jsonify({"status": "error", "message": "需要提供 car_id 或 store_id"}), 400
+
+# 单次报价请求最多包含的组合数
+QUOTE_MAX_ITEMS = 1000
+
+def _parse_quote_item(item):
+    """校验并解析一条报价请求，格式不正确时抛出 ValueError"""
+    start_time = parse_client_datetime(item['start_time'])
+    end_time = parse_client_datetime(item['end_time'])
+    if end_time <= start_time:
+        raise ValueError('还车时间必须晚于取车时间')
+    pickup_store_id = int(item.get('pickup_store_id') or 0)
+    return {
+        'car_id': int(item['car_id']),
+        'start_time': start_time,
+        'end_time': end_time,
+        'pickup_store_id': pickup_store_id,
+        'return_store_id': int(item.get('return_store_id') or pickup_store_id),
+        'insurance_type': item.get('insurance_type')
+    }
+
+# 批量报价
+@app.route('/api/quote', methods=['POST'])
+@webservice_support
+def quote_prices():
+    """为多个 (car_id, start_time, end_time, pickup_store_id, return_store_id) 组合报价
+
+    请求体：{"items": [{"car_id": 1, "start_time": "...", "end_time": "...",
+             "pickup_store_id": 301, "return_store_id": 302, "insurance_type": "full"}]}
+    """
+    items = (request.get_json() or {}).get('items')
+    if not isinstance(items, list) or not items:
+        return jsonify({"status": "error", "message": "items 必须为非空数组"}), 400
+    if len(items) > QUOTE_MAX_ITEMS:
+        return jsonify({"status": "error", "message": f"单次最多报价 {QUOTE_MAX_ITEMS} 条"}), 400
+    
+    parsed = []
+    for index, item in enumerate(items):
+        try:
+            parsed.append(_parse_quote_item(item))
+        except (KeyError, TypeError, ValueError, AttributeError) as e:
+            return jsonify({"status": "error", "message": f"第 {index + 1} 条报价参数不正确: {e}"}), 400
+    
+    try:
+        return jsonify({"status": "success", "quotes": quote_engine.quote_rows(parsed)})
+    except Exception as e:
+        return jsonify({"status": "error", "message": f"报价失败: {str(e)}"}), 500
+
+# 利用率查询最多覆盖的天数
+UTILIZATION_MAX_DAYS = 366
+
+# 车队利用率
+@app.route('/api/analytics/utilization', methods=['GET'])
+def get_utilization():
+    """按天的车队利用率
+
+    参数：from、to（YYYY-MM-DD，含两端，默认最近30天），group_by（all | store | type）
+    """
+    try:
+        last_day = datetime.strptime(request.args['to'], '%Y-%m-%d').date() if request.args.get('to') \
+            else utilization_analytics.today()
+        first_day = datetime.strptime(request.args['from'], '%Y-%m-%d').date() if request.args.get('from') \
+            else last_day - timedelta(days=29)
+    except ValueError:
+        return jsonify({"status": "error", "message": "from/to 需为 YYYY-MM-DD 格式"}), 400
+    if first_day > last_day or (last_day - first_day).days >= UTILIZATION_MAX_DAYS:
+        return jsonify({"status": "error", "message": f"日期范围需在 1-{UTILIZATION_MAX_DAYS} 天之间"}), 400
+    
+    try:
+        data = utilization_analytics.series(first_day, last_day, request.args.get('group_by', 'all'))
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+    except Exception as e:
+        return jsonify({"status": "error", "message": f"统计失败: {str(e)}"}), 500
+    return jsonify(dict(data, status="success", group_by=request.args.get('group_by', 'all')))
+
+# 车辆短时占用，默认10分钟内完成下单，过期自动释放
+car_hold_service = CarHoldService(redis_client, ttl=600)
+
+# 占用车辆时间窗口（选车后、下单前调用）
+@app.route('/api/car_holds', methods=['POST'])
+@webservice_support
+@jwt_required
+def create_car_hold():
+    user_id = request.current_user_id
+    data = request.get_json() or {}
+    try:
+        car_id = int(data.get('car_id'))
+        start_time = parse_client_datetime(data.get('start_time'))
+        end_time = parse_client_datetime(data.get('end_time'))
+    except (TypeError, ValueError, AttributeError):
+        return jsonify({"status": "error", "message": "car_id 或取还车时间格式不正确"}), 400
+    if end_time <= start_time:
+        return jsonify({"status": "error", "message": "还车时间必须晚于取车时间"}), 400
+    
+    if not availability_index.is_free(car_id, start_time, end_time):
+        return jsonify({"status": "error", "message": "该车辆在所选时间段已被预订"}), 409
+    
+    try:
+        ok, hold_id, expires_at = car_hold_service.acquire(car_id, user_id, start_time, end_time)
+    except Exception as e:
+        return jsonify({"status": "error", "message": f"占用车辆失败: {str(e)}"}), 503
+    if not ok:
+        return jsonify({"status": "error", "message": "该车辆正被其他用户预订，请稍后再试"}), 409
+    
+    return jsonify({
+        "status": "success",
+        "hold_id": hold_id,
+        "car_id": car_id,
+        "expires_at": datetime.utcfromtimestamp(expires_at).isoformat() + 'Z'
+    }), 201
+
+# 主动释放占用
+@app.route('/api/car_holds/<hold_id>', methods=['DELETE'])
+@webservice_support
+@jwt_required
+def release_car_hold(hold_id):
+    car_id = request.args.get('car_id', type=int)
+    if car_id is None:
+        return jsonify({"status": "error", "message": "car_id 参数不能为空"}), 400
+    hold = car_hold_service.get(car_id, hold_id)
+    if hold is None:
+        return jsonify({"status": "error", "message": "占用不存在或已过期"}), 404
+    if hold['user_id'] != str(request.current_user_id):
+        return jsonify({"status": "error", "message": "无权释放该占用"}), 403
+    car_hold_service.release(car_id, hold_id)
+    return jsonify({"status": "success", "message": "占用已释放"})
+
+# 当前用户可用的优惠券（下单页选择，coupon_id 随订单提交）
+@app.route('/api/user_coupons', methods=['GET'])
+@webservice_support
+@jwt_required
+def get_user_coupons():
+    user_id = request.current_user_id
+    now = datetime.utcnow()
+    try:
+        rows = db.session.query(UserCoupon.id, CouponInfo).join(
+            CouponInfo, CouponInfo.coupon_id == UserCoupon.coupon_id
+        ).filter(
+            UserCoupon.user_id == user_id,
+            UserCoupon.use_time.is_(None),
+            db.or_(CouponInfo.status.is_(None), CouponInfo.status != 0),
+            db.or_(CouponInfo.start_time.is_(None), CouponInfo.start_time <= now),
+            db.or_(CouponInfo.end_time.is_(None), CouponInfo.end_time >= now)
+        ).order_by(CouponInfo.end_time, UserCoupon.id).all()
+    except Exception as e:
+        return jsonify({"status": "error", "message": f"获取优惠券失败: {str(e)}"}), 500
+    
+    coupons = [
+        {
+            'user_coupon_id': user_coupon_id,
+            'coupon_id': coupon.coupon_id,
+            'coupon_name': coupon.coupon_name,
+            'amount': float(coupon.amount or 0),
+            'threshold': float(coupon.threshold) if coupon.threshold is not None else None,
+            'end_time': coupon.end_time.isoformat() if coupon.end_time else None
+        }
+        for user_coupon_id, coupon in rows
+    ]
+    return jsonify({"status": "success", "coupons": coupons})
+
 # 添加创建订单的API
 @app.route('/api/create_order', methods=['POST'])
 @webservice_support
 @jwt_required
+@idempotency_store.idempotent('create_order', user_scoped=True)
 def create_order():
     user_id = request.current_user_id
     data = request.get_json()
     
     try:
-        # 手动生成订单ID（临时解决方案）
-        max_order = db.session.query(db.func.max(OrderInfo.order_id)).scalar()
-        next_order_id = (max_order or 0) + 1
+        car_id = int(data.get('car_id'))
+        start_time = parse_client_datetime(data.get('start_time'))
+        end_time = parse_client_datetime(data.get('end_time'))
+    except (TypeError, ValueError, AttributeError):
+        return jsonify({"status": "error", "message": "car_id 或取还车时间格式不正确"}), 400
+    if end_time <= start_time:
+        return jsonify({"status": "error", "message": "还车时间必须晚于取车时间"}), 400
+    
+    # 服务端报价：租赁天数、押金和应付总额以报价为准，客户端金额不一致时拒绝下单
+    try:
+        pickup_store_id = int(data.get('pickup_store_id') or 301)
+        return_store_id = int(data.get('return_store_id') or 302)
+    except (TypeError, ValueError):
+        return jsonify({"status": "error", "message": "门店ID格式不正确"}), 400
+    try:
+        coupon_id = int(data['coupon_id']) if data.get('coupon_id') else None
+        client_total = float(data['total_amount']) if data.get('total_amount') is not None else None
+        client_discount = float(data.get('discount_amount') or 0)
+    except (TypeError, ValueError):
+        return jsonify({"status": "error", "message": "金额或优惠券ID格式不正确"}), 400
+    try:
+        quote = quote_engine.quote_rows([{
+            'car_id': car_id,
+            'start_time': start_time,
+            'end_time': end_time,
+            'pickup_store_id': pickup_store_id,
+            'return_store_id': return_store_id,
+            'insurance_type': data.get('insurance_type')
+        }])[0]
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"status": "error", "message": f"订单报价失败: {str(e)}"}), 500
+    if not quote['found']:
+        return jsonify({"status": "error", "message": "车辆不存在"}), 404
+    # 优惠金额只由服务端根据优惠券计算，客户端传入的 discount_amount 仅用于核对
+    discount_amount, user_coupon_id = 0.0, None
+    if coupon_id is not None:
+        try:
+            discount_amount, user_coupon_id = resolve_coupon_discount(
+                user_id, coupon_id, quote['total'] - quote['deposit']
+            )
+        except ValueError as e:
+            return jsonify({"status": "error", "message": str(e)}), 400
+        except Exception as e:
+            db.session.rollback()
+            return jsonify({"status": "error", "message": f"优惠券校验失败: {str(e)}"}), 500
+    payable = round(quote['total'] - discount_amount, 2)
+    if abs(client_discount - discount_amount) > 0.01 or (
+            client_total is not None and abs(client_total - payable) > 0.01):
+        return jsonify({
+            "status": "error",
+            "message": "订单金额与报价不一致，请刷新后重试",
+            "quote": dict(quote, discount_amount=discount_amount, payable=payable)
+        }), 409
+    
+    # 内存索引快速预检查，明显冲突时无需访问数据库
+    try:
+        already_booked = not availability_index.is_free(car_id, start_time, end_time)
+    except Exception as e:
+        print(f"可用性索引不可用，跳过预检查: {e}")
+        already_booked = False
+    if already_booked:
+        return jsonify({"status": "error", "message": "该车辆在所选时间段已被预订"}), 409
+    
+    # 车辆占用：携带 hold_id 时必须是本人且覆盖所选租期；否则不能与他人的占用重叠
+    hold_id = data.get('hold_id')
+    try:
+        if hold_id:
+            if not car_hold_service.covers(car_id, hold_id, user_id, start_time, end_time):
+                return jsonify({"status": "error", "message": "车辆占用已过期或与订单不符，请重新选择"}), 409
+        elif car_hold_service.held_by_other(car_id, user_id, start_time, end_time):
+            return jsonify({"status": "error", "message": "该车辆正被其他用户预订，请稍后再试"}), 409
+    except redis.RedisError as e:
+        # Redis 不可用时仍以数据库检查为准
+        print(f"车辆占用检查失败，跳过: {e}")
+    
+    try:
+        # 数据库重叠检查（最终依据）：先锁定车辆行，同一车辆的并发下单在此排队
+        car = CarInfo.query.filter_by(car_id=car_id).with_for_update().first()
+        if not car:
+            db.session.rollback()
+            return jsonify({"status": "error", "message": "车辆不存在"}), 404
+        if find_conflicting_order(car_id, start_time, end_time) is not None:
+            db.session.rollback()
+            return jsonify({"status": "error", "message": "该车辆在所选时间段已被预订"}), 409
         
-        # 创建新订单
+        # 创建新订单（order_id 由 AUTO_INCREMENT 分配，无需聚合查询，并发下单也不会冲突）
         new_order = OrderInfo(
-            order_id=next_order_id,  # 手动设置订单ID
             user_id=user_id,
-            car_id=data.get('car_id'),
-            pickup_store_id=data.get('pickup_store_id', 301),
-            return_store_id=data.get('return_store_id', 302),
-            start_time=datetime.fromisoformat(data.get('start_time').replace('Z', '+00:00')),
-            end_time=datetime.fromisoformat(data.get('end_time').replace('Z', '+00:00')),
-            rental_days=data.get('rental_days'),
-            total_amount=data.get('total_amount'),
-            deposit=data.get('deposit', 150.00),
-            coupon_id=data.get('coupon_id'),
-            discount_amount=data.get('discount_amount', 0.00),
+            car_id=car_id,
+            pickup_store_id=pickup_store_id,
+            return_store_id=return_store_id,
+            start_time=start_time,
+            end_time=end_time,
+            rental_days=quote['rental_days'],
+            total_amount=payable,
+            deposit=quote['deposit'],
+            coupon_id=coupon_id,
+            discount_amount=discount_amount,
             status=1
         )
         
+        if user_coupon_id is not None:
+            # 条件更新核销优惠券，并发下单时同一张券只有一个请求能成功
+            used = UserCoupon.query.filter(
+                UserCoupon.id == user_coupon_id, UserCoupon.use_time.is_(None)
+            ).update({'use_time': datetime.utcnow(), 'status': 1}, synchronize_session=False)
+            if not used:
+                db.session.rollback()
+                return jsonify({"status": "error", "message": "优惠券已被使用"}), 409
+        
         db.session.add(new_order)
         db.session.commit()
+        # 订单列表首页缓存已由提交钩子清除（invalidate_user_orders_cache）
+        
+        # 占用已转换为订单
+        if hold_id:
+            try:
+                car_hold_service.release(car_id, hold_id)
+            except redis.RedisError as e:
+                print(f"释放车辆占用失败（将随TTL过期）: {e}")
         
         return jsonify({
             "status": "success",
@@ -866,54 +2070,230 @@ def create_order():
             "message": f"订单创建失败: {str(e)}"
         }), 500
 
+# 订单状态映射
+ORDER_STATUS_MAP = {
+    0: '待支付',
+    1: '已支付',
+    2: '已取车',
+    3: '已还车',
+    4: '已取消'
+}
+
+# 订单列表只查询展示所需的列，返回轻量的 Row 而不是完整的 ORM 对象
+ORDER_LIST_COLUMNS = (
+    OrderInfo.order_id, OrderInfo.user_id, OrderInfo.car_id,
+    OrderInfo.pickup_store_id, OrderInfo.return_store_id,
+    OrderInfo.order_time, OrderInfo.start_time, OrderInfo.end_time,
+    OrderInfo.actual_start_time, OrderInfo.actual_end_time,
+    OrderInfo.rental_days, OrderInfo.total_amount, OrderInfo.deposit,
+    OrderInfo.coupon_id, OrderInfo.discount_amount,
+    OrderInfo.create_time, OrderInfo.update_time, OrderInfo.status
+)
+ORDER_PAGE_DEFAULT_LIMIT = 20
+ORDER_PAGE_MAX_LIMIT = 100
+
+def _isoformat(value):
+    return value.isoformat() if value else None
+
+def _format_order(order):
+    """格式化单个订单（ORM 对象或 ORDER_LIST_COLUMNS 的 Row）"""
+    return {
+        'order_id': order.order_id,
+        'user_id': order.user_id,
+        'car_id': order.car_id,
+        'pickup_store_id': order.pickup_store_id,
+        'return_store_id': order.return_store_id,
+        'order_time': _isoformat(order.order_time),
+        'start_time': _isoformat(order.start_time),
+        'end_time': _isoformat(order.end_time),
+        'actual_start_time': _isoformat(order.actual_start_time),
+        'actual_end_time': _isoformat(order.actual_end_time),
+        'rental_days': order.rental_days,
+        'total_amount': float(order.total_amount),
+        'deposit': float(order.deposit),
+        'coupon_id': order.coupon_id,
+        'discount_amount': float(order.discount_amount or 0),
+        'create_time': _isoformat(order.create_time),
+        'update_time': _isoformat(order.update_time),
+        'status': order.status,
+        'status_description': ORDER_STATUS_MAP.get(order.status, '未知状态'),
+        'name': f'订单 {order.order_id:03d}',
+        'image': '/assets/images/c1.png'
+    }
+
+# expand 参数支持的关联数据
+ORDER_EXPAND_OPTIONS = ('car', 'store')
+
+def _parse_order_expand():
+    """解析 expand=car,store 参数，返回按固定顺序排列的元组"""
+    requested = {v.strip() for v in request.args.get('expand', '').split(',') if v.strip()}
+    unknown = requested - set(ORDER_EXPAND_OPTIONS)
+    if unknown:
+        raise ValueError(f"不支持的 expand 值: {','.join(sorted(unknown))}")
+    return tuple(option for option in ORDER_EXPAND_OPTIONS if option in requested)
+
+def _expand_orders(order_list, expand):
+    """为一批已格式化的订单补充车辆/门店信息
+
+    每种关联数据只执行一次 IN (...) 查询，车辆图片URL也一次性批量解析，
+    查询次数与订单数量无关。
+    """
+    if not order_list or not expand:
+        return order_list
+    
+    if 'car' in expand:
+        car_ids = {order['car_id'] for order in order_list}
+        car_rows = db.session.query(
+            CarInfo.car_id, CarInfo.brand, CarInfo.model, CarInfo.color, CarInfo.car_number,
+            CarInfo.car_images, CarInfo.transmission_type, CarInfo.fuel_type,
+            CarTypeInfo.type_name, CarTypeInfo.daily_rent
+        ).outerjoin(
+            CarTypeInfo, CarInfo.type_id == CarTypeInfo.type_id
+        ).filter(CarInfo.car_id.in_(car_ids)).all()
+        cars = {
+            row.car_id: {
+                'car_id': row.car_id,
+                'brand': row.brand,
+                'model': row.model,
+                'color': row.color,
+                'car_number': row.car_number,
+                'type_name': row.type_name,
+                'daily_rent': float(row.daily_rent) if row.daily_rent is not None else None,
+                'transmission_type': row.transmission_type,
+                'fuel_type': row.fuel_type,
+                'image': row.car_images
+            }
+            for row in car_rows
+        }
+        _resolve_image_urls(list(cars.values()), 'image')
+        for order in order_list:
+            car = cars.get(order['car_id'])
+            order['car'] = car
+            if car is not None:
+                order['name'] = f"{car['brand'] or ''} {car['model'] or ''}".strip() or order['name']
+                order['image'] = car['image'] or order['image']
+    
+    if 'store' in expand:
+        store_ids = set()
+        for order in order_list:
+            store_ids.update((order['pickup_store_id'], order['return_store_id']))
+        store_rows = db.session.query(
+            Store.store_id, Store.store_name, Store.address, Store.business_hours, Store.phone
+        ).filter(Store.store_id.in_(store_ids)).all()
+        stores = {row.store_id: dict(row._mapping) for row in store_rows}
+        for order in order_list:
+            order['pickup_store'] = stores.get(order['pickup_store_id'])
+            order['return_store'] = stores.get(order['return_store_id'])
+    
+    return order_list
+
+# create_time 可为空（历史数据），排序和游标比较时空值按该时间处理，排在最后
+ORDER_NULL_CREATE_TIME = datetime(1970, 1, 1)
+ORDER_SORT_TIME = db.func.coalesce(OrderInfo.create_time, ORDER_NULL_CREATE_TIME)
+
+def _order_cursor(order):
+    """订单分页游标：'<create_time ISO>_<order_id>'"""
+    return f"{(order.create_time or ORDER_NULL_CREATE_TIME).isoformat()}_{order.order_id}"
+
+def _before_order_cursor(after_time, after_id):
+    """排在游标 (create_time, order_id) 之后（倒序中更早）的订单；create_time 为空的按 ORDER_NULL_CREATE_TIME 比较"""
+    return db.or_(
+        ORDER_SORT_TIME < after_time,
+        db.and_(ORDER_SORT_TIME == after_time, OrderInfo.order_id < after_id)
+    )
+
+def _parse_order_cursor(value):
+    create_time, order_id = value.rsplit('_', 1)
+    return datetime.fromisoformat(create_time), int(order_id)
+
+def _order_row_stream(orders_query, limit, expand, batch_size):
+    """流式模式下按 (create_time, order_id) keyset 分批读取订单，每批补充关联数据后逐条输出
+
+    每批都是完整读取的 .all() 结果：补充车辆/门店的查询不会与仍在读取的
+    服务端游标共用连接，每批只额外执行常数次查询。
+    """
+    cursor = None
+    remaining = limit
+    while remaining is None or remaining > 0:
+        size = batch_size if remaining is None else min(batch_size, remaining)
+        batch_query = orders_query if cursor is None else orders_query.filter(_before_order_cursor(*cursor))
+        rows = batch_query.order_by(ORDER_SORT_TIME.desc(), OrderInfo.order_id.desc()).limit(size).all()
+        if not rows:
+            break
+        yield from _expand_orders([_format_order(row) for row in rows], expand)
+        cursor = (rows[-1].create_time or ORDER_NULL_CREATE_TIME, rows[-1].order_id)
+        if remaining is not None:
+            remaining -= len(rows)
+        if len(rows) < size:
+            break
+
 # 添加获取用户订单的API
 @app.route('/api/user_orders', methods=['GET'])
 @webservice_support
 @jwt_required  # 添加JWT认证装饰器
 def get_user_orders():
+    """获取当前用户的订单，按创建时间倒序
+
+    参数：
+        limit: 每页条数（默认20，最大100）
+        after: 上一页返回的 next_after 游标
+        expand: 逗号分隔的关联数据，car（车辆与车型）、store（取还车门店）
+    limit 和 after 都未指定时不分页，返回全部订单（兼容现有前端），该结果
+    缓存在 Redis 中（按 expand 分字段），订单写入提交后失效。
+    """
     user_id = request.current_user_id  # 从JWT token中获取用户ID
     
     try:
-        orders = OrderInfo.query.filter_by(user_id=user_id).order_by(OrderInfo.create_time.desc()).all()
+        after = _parse_order_cursor(request.args['after']) if request.args.get('after') else None
+    except ValueError:
+        return jsonify({"status": "error", "message": "after 游标格式不正确"}), 400
+    try:
+        expand = _parse_order_expand()
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+    cache_field = ','.join(expand) or '-'
+    paginate = bool(request.args.get('limit') or request.args.get('after'))
+    limit = request.args.get('limit', type=int)
+    stream = wants_ndjson_stream()
+    use_cache = not paginate and not stream
+    limit = max(1, min(limit or ORDER_PAGE_DEFAULT_LIMIT, ORDER_PAGE_MAX_LIMIT))
+    
+    if use_cache:
+        try:
+            cached = redis_client.hget(_user_orders_cache_key(user_id), cache_field)
+        except Exception as e:
+            print(f"读取用户订单缓存失败: {e}")
+            cached = None
+        if cached is not None:
+            return app.response_class(cached, mimetype='application/json')
+    
+    try:
+        orders_query = OrderInfo.query.with_entities(*ORDER_LIST_COLUMNS).filter(
+            OrderInfo.user_id == user_id
+        )
+        if after is not None:
+            # keyset 分页：(create_time, order_id) 严格小于游标
+            orders_query = orders_query.filter(_before_order_cursor(*after))
         
-        order_list = []
-        for order in orders:
-            # 状态映射
-            status_map = {
-                0: '待支付',
-                1: '已支付',
-                2: '已取车',
-                3: '已还车',
-                4: '已取消'
-            }
-            
-            order_data = {
-                'order_id': order.order_id,
-                'user_id': order.user_id,
-                'car_id': order.car_id,
-                'pickup_store_id': order.pickup_store_id,
-                'return_store_id': order.return_store_id,
-                'order_time': order.order_time.isoformat() if order.order_time else None,
-                'start_time': order.start_time.isoformat() if order.start_time else None,
-                'end_time': order.end_time.isoformat() if order.end_time else None,
-                'actual_start_time': order.actual_start_time.isoformat() if order.actual_start_time else None,
-                'actual_end_time': order.actual_end_time.isoformat() if order.actual_end_time else None,
-                'rental_days': order.rental_days,
-                'total_amount': float(order.total_amount),
-                'deposit': float(order.deposit),
-                'coupon_id': order.coupon_id,
-                'discount_amount': float(order.discount_amount),
-                'create_time': order.create_time.isoformat() if order.create_time else None,
-                'update_time': order.update_time.isoformat() if order.update_time else None,
-                'status': order.status,
-                'status_description': status_map.get(order.status, '未知状态'),
-                'name': f'订单 {order.order_id:03d}',
-                'image': '/assets/images/c1.png'
-            }
-            order_list.append(order_data)
+        if stream:
+            # 流式模式：逐批读取订单并逐行输出，不构建完整列表
+            stream_limit = limit if request.args.get('limit') else None
+            return ndjson_response(_order_row_stream(orders_query, stream_limit, expand, STREAM_BATCH_SIZE))
+        
+        orders_query = orders_query.order_by(ORDER_SORT_TIME.desc(), OrderInfo.order_id.desc())
+        
+        if paginate:
+            # 多取一条用于判断是否还有下一页
+            rows = orders_query.limit(limit + 1).all()
+            has_more = len(rows) > limit
+            rows = rows[:limit]
+        else:
+            rows = orders_query.all()
+            has_more = False
+        order_list = _expand_orders([_format_order(row) for row in rows], expand)
         
         # 如果没有真实订单数据，添加一些静态示例订单（展示不同状态）
-        if not order_list:
+        if not order_list and after is None:
             sample_orders = [
                 {
                     'order_id': 1,
@@ -969,10 +2349,21 @@ def get_user_orders():
             ]
             order_list.extend(sample_orders)
         
-        return jsonify({
+        body = json.dumps({
             "status": "success",
-            "orders": order_list
-        })
+            "orders": order_list,
+            "next_after": _order_cursor(rows[-1]) if has_more else None
+        }, ensure_ascii=False)
+        if use_cache:
+            try:
+                cache_key = _user_orders_cache_key(user_id)
+                pipe = redis_client.pipeline()
+                pipe.hset(cache_key, cache_field, body)
+                pipe.expire(cache_key, USER_ORDERS_CACHE_TTL)
+                pipe.execute()
+            except Exception as e:
+                print(f"写入用户订单缓存失败: {e}")
+        return app.response_class(body, mimetype='application/json')
         
     except Exception as e:
         return jsonify({
@@ -980,31 +2371,11 @@ def get_user_orders():
             "message": f"获取订单失败: {str(e)}"
         }), 500
 
-# 获取城市网点数据的API端点
-@app.route('/api/redis/city-branches', methods=['GET'])
-def get_city_branches():
+def _rental_stats_response(key):
     try:
-        # 从Redis获取城市网点数据
-        city_data = redis_client.hgetall('city_branches')
-        
-        # 如果Redis中没有数据，初始化默认数据
-        if not city_data:
-            default_data = {
-                '上海': '10',
-                '浙江': '15', 
-                '北京': '8',
-                '广州': '12',
-                '深圳': '9'
-            }
-            redis_client.hmset('city_branches', default_data)
-            city_data = default_data
-        
-        # 转换数据类型
-        result = {city: int(count) for city, count in city_data.items()}
-        
         return jsonify({
             'status': 'success',
-            'data': result
+            'data': rental_stats.read(key)
         })
     except Exception as e:
         return jsonify({
@@ -1012,37 +2383,61 @@ def get_city_branches():
             'message': str(e)
         }), 500
 
+# --- 发件箱事件处理（均需幂等或可容忍重复，参数为 (事件id, payload) 列表） ---
+ORDER_EVENTS_CHANNEL = 'order_events'
+
+def _dispatch_car_changes(events):
+    car_ids = sorted({payload['car_id'] for _, payload in events})
+    if car_sync_queue.is_paused():
+        # 全量重建期间交给同步队列，切换别名后再写入新索引
+        car_sync_queue.enqueue(car_ids)
+    else:
+        sync_cars_by_ids(car_ids)
+
+def _dispatch_car_type_changes(events):
+    type_ids = {payload['type_id'] for _, payload in events}
+    with app.app_context():
+        car_ids = [car_id for (car_id,) in db.session.query(CarInfo.car_id).filter(CarInfo.type_id.in_(type_ids))]
+    if car_ids:
+        _dispatch_car_changes([(None, {'car_id': car_id}) for car_id in car_ids])
+
+def _dispatch_rental_stat_deltas(events):
+    # 计数增量不幂等：按事件 id 去重，重复投递的事件不会重复计数
+    rental_stats.apply([(event_id, p['vehicle'], p['city'], p['delta']) for event_id, p in events])
+
+def _dispatch_order_events(events):
+    pipe = redis_client.pipeline(transaction=False)
+    for _, payload in events:
+        pipe.publish(ORDER_EVENTS_CHANNEL, json.dumps(payload, ensure_ascii=False))
+    pipe.execute()
+
+def _dispatch_minio_deletes(events):
+    failed = [p['object_name'] for _, p in events if not delete_file_from_minio(p['object_name'])]
+    if failed:
+        raise RuntimeError(f"failed to delete {len(failed)} objects from MinIO")
+
+outbox_dispatcher = OutboxDispatcher(app, db, EventOutbox, {
+    'car.changed': _dispatch_car_changes,
+    'car_type.changed': _dispatch_car_type_changes,
+    'rental_stats.delta': _dispatch_rental_stat_deltas,
+    'order.changed': _dispatch_order_events,
+    'minio.delete': _dispatch_minio_deletes,
+})
+
+# 获取城市网点数据的API端点
+@app.route('/api/redis/city-branches', methods=['GET'])
+def get_city_branches():
+    return _rental_stats_response(CITY_BRANCHES_KEY)
+
 # 获取车辆租赁数据的API端点
 @app.route('/api/redis/vehicle-rentals', methods=['GET'])
 def get_vehicle_rentals():
-    try:
-        # 从Redis获取车辆租赁数据
-        rental_data = redis_client.hgetall('vehicle_rentals')
-        
-        # 如果Redis中没有数据，初始化默认数据
-        if not rental_data:
-            default_data = {
-                '本田雅阁': '20',
-                '本田思域': '18',
-                '丰田凯美瑞': '22',
-                '大众帕萨特': '8',
-                '现代索纳塔': '6'
-            }
-            redis_client.hmset('vehicle_rentals', default_data)
-            rental_data = default_data
-        
-        # 转换数据类型
-        result = {vehicle: int(count) for vehicle, count in rental_data.items()}
-        
-        return jsonify({
-            'status': 'success',
-            'data': result
-        })
-    except Exception as e:
-        return jsonify({
-            'status': 'error',
-            'message': str(e)
-        }), 500
+    return _rental_stats_response(VEHICLE_RENTALS_KEY)
+
+# 获取各城市租赁次数的API端点
+@app.route('/api/redis/city-rentals', methods=['GET'])
+def get_city_rentals():
+    return _rental_stats_response(CITY_RENTALS_KEY)
 
 if __name__ == '__main__':
     with app.app_context():
@@ -1079,17 +2474,40 @@ if __name__ == '__main__':
             print(f"Error with Elasticsearch: {e}")
         
         try:
-            # 在应用启动时执行一次数据同步
-            # 注意：这仅为演示目的，实际生产环境中，数据同步策略会更复杂
-            # 例如，通过管理命令、定时任务或在数据发生变更时触发同步
-            if not CarInfo.query.first(): # 简单判断，如果car_info表为空，则执行同步
-                print("Car_info table is empty. Attempting to sync data...")
-                print("Attempting to sync data from DB to ES during startup...")
-                sync_cars_to_db_and_es() # 总是尝试在启动时同步，以确保ES最新
-            else:
-                print("Car_info table already contains data. Forcing sync for development.")
+            # 仅在索引为空时执行一次全量同步作为初始化，
+            # 之后的数据变更通过增量同步队列传播，需要修复时执行 `flask --app app sync-es`
+            if count_documents('cars') == 0:
+                print("Elasticsearch index is empty. Running initial full sync...")
                 sync_cars_to_db_and_es()
+            else:
+                print("Elasticsearch index already populated. Skipping full sync.")
         except Exception as e:
             print(f"Error syncing data: {e}")
+        
+        try:
+            # 加载车辆可用性索引
+            availability_index.load()
+            print("Availability index loaded.")
+        except Exception as e:
+            print(f"Error loading availability index: {e}")
+        
+        try:
+            # 首次启动时生成注册标识预筛集合，之后随用户写入增量更新
+            if not redis_client.exists(taken_identifier_filter.ready_key):
+                print(f"Identifier prefilter rebuilt from {rebuild_taken_identifiers()} users.")
+        except Exception as e:
+            print(f"Error rebuilding identifier prefilter: {e}")
+        
+        try:
+            # 首次启动时从订单表初始化租赁统计，之后由订单提交增量维护
+            if not rental_stats.is_initialized():
+                stats = rebuild_rental_stats()
+                print(f"Rental stats rebuilt from {stats['orders']} orders.")
+        except Exception as e:
+            print(f"Error rebuilding rental stats: {e}")
+    
+    # 启动增量同步和发件箱分发后台线程
+    car_sync_queue.start()
+    outbox_dispatcher.start()
     
     app.run(host='0.0.0.0', port=5000, debug=True)
@@ -0,0 +1,230 @@
+# availability.py
+"""车辆可用性索引
+
+为每辆车维护按开始时间排序的有效订单区间（状态 0-待支付 / 1-已支付 /
+2-已取车），用于快速回答：
+    - 车辆 X 在 [s, e) 内是否空闲（O(log n) 二分查找）
+    - 门店 S 的哪些车辆在 [s, e) 内空闲
+索引从 order_info 加载，并在订单写入提交后增量更新；定期的全量重新加载
+在后台线程中进行，完成后整体替换，期间查询继续使用旧数据。它只是一个
+快速预检查，数据库中的重叠检查仍然是最终依据。
+"""
+import bisect
+import threading
+import time
+
+# 占用车辆的订单状态
+ACTIVE_ORDER_STATUSES = (0, 1, 2)
+# 已取消订单不影响车辆位置
+CANCELLED_ORDER_STATUS = 4
+
+
+class _CarIntervals:
+    """单辆车的订单区间，按开始时间排序
+
+    max_ends[i] 为前 i+1 个区间结束时间的最大值，历史数据中即使存在
+    相互重叠的区间，也能用一次二分查找判断冲突。
+    """
+
+    __slots__ = ('starts', 'ends', 'order_ids', 'max_ends')
+
+    def __init__(self):
+        self.starts = []
+        self.ends = []
+        self.order_ids = []
+        self.max_ends = []
+
+    def _rebuild_max_ends(self, from_index):
+        running = self.max_ends[from_index - 1] if from_index > 0 else None
+        del self.max_ends[from_index:]
+        for end in self.ends[from_index:]:
+            running = end if running is None or end > running else running
+            self.max_ends.append(running)
+
+    def add(self, start, end, order_id):
+        index = bisect.bisect_right(self.starts, start)
+        self.starts.insert(index, start)
+        self.ends.insert(index, end)
+        self.order_ids.insert(index, order_id)
+        self._rebuild_max_ends(index)
+
+    def remove(self, order_id):
+        index = self.order_ids.index(order_id)
+        del self.starts[index], self.ends[index], self.order_ids[index]
+        self._rebuild_max_ends(index)
+
+    def overlaps(self, start, end):
+        """[start, end) 是否与任一区间重叠"""
+        # 开始时间早于 end 的区间中，只要有一个结束时间晚于 start 即冲突
+        index = bisect.bisect_left(self.starts, end) - 1
+        return index >= 0 and self.max_ends[index] > start
+
+    def __len__(self):
+        return len(self.starts)
+
+
+class AvailabilityIndex:
+    """全车队的可用性索引
+
+    loader() 返回订单行的可迭代对象，每行包含 order_id / car_id / start_time /
+    end_time / status / return_store_id 属性，应包含除已取消外的所有订单，
+    按 end_time 升序排列（用于推断车辆当前所在门店）。
+    """
+
+    def __init__(self, loader, max_age=600, context=None):
+        """
+        Args:
+            loader (callable): 订单加载函数
+            max_age (float): 全量重新加载的间隔（秒），用于感知其他进程的写入
+            context (callable): 返回上下文管理器（如 app.app_context），后台重新加载时在其中调用 loader
+        """
+        self.loader = loader
+        self.max_age = max_age
+        self.context = context
+        self._cars = {}        # car_id -> _CarIntervals
+        self._orders = {}      # order_id -> car_id（仅有效订单）
+        self._car_store = {}   # car_id -> 最近一次还车门店
+        self._loaded_at = None
+        self._pending = None   # 加载期间提交的订单变更，切换到新数据后重放
+        self._lock = threading.RLock()
+        self._load_lock = threading.Lock()  # 同一时间只进行一次全量加载
+
+    # --- 维护 ---
+
+    def load(self):
+        """从 order_info 全量加载"""
+        with self._load_lock:
+            self._record_changes()
+            self._load()
+
+    def _record_changes(self):
+        # 从此刻起提交的增量变更记录下来，切换到新数据后重放（须在读取订单之前开始）
+        with self._lock:
+            self._pending = []
+
+    def _load(self):
+        # 加载期间不持有 _lock，查询继续使用旧数据
+        cars, orders, car_store = {}, {}, {}
+        try:
+            for row in self.loader():
+                if row.return_store_id is not None:
+                    car_store[row.car_id] = row.return_store_id
+                if row.status in ACTIVE_ORDER_STATUSES and row.start_time and row.end_time:
+                    cars.setdefault(row.car_id, _CarIntervals()).add(row.start_time, row.end_time, row.order_id)
+                    orders[row.order_id] = row.car_id
+        except Exception:
+            with self._lock:
+                self._pending = None
+            raise
+        with self._lock:
+            self._cars, self._orders, self._car_store = cars, orders, car_store
+            for change in self._pending:
+                self._apply(*change)
+            self._pending = None
+            self._loaded_at = time.monotonic()
+
+    def _reload_in_background(self):
+        if not self._load_lock.acquire(blocking=False):
+            # 已有加载在进行
+            return
+
+        def run():
+            try:
+                if self.context is not None:
+                    with self.context():
+                        self._load()
+                else:
+                    self._load()
+            except Exception as e:
+                print(f"Error reloading availability index: {e}")
+                with self._lock:
+                    # 下一个周期再重试，期间继续使用旧数据
+                    self._loaded_at = time.monotonic()
+            finally:
+                self._load_lock.release()
+
+        try:
+            self._record_changes()
+            threading.Thread(target=run, name='availability-reload', daemon=True).start()
+        except Exception:
+            with self._lock:
+                self._pending = None
+            self._load_lock.release()
+            raise
+
+    def _ensure_loaded(self):
+        """首次使用时同步加载；数据过期时在后台重新加载，不阻塞查询"""
+        if self._loaded_at is None:
+            with self._load_lock:
+                if self._loaded_at is None:
+                    self._record_changes()
+                    self._load()
+        elif self.max_age is not None and time.monotonic() - self._loaded_at > self.max_age:
+            self._reload_in_background()
+
+    def apply(self, order_id, car_id, start_time, end_time, status, return_store_id=None):
+        """订单新增、修改或删除（status=None）后更新索引"""
+        with self._lock:
+            if self._pending is not None:
+                self._pending.append((order_id, car_id, start_time, end_time, status, return_store_id))
+            if self._loaded_at is None:
+                # 尚未加载，加载完成后会包含此变更
+                return
+            self._apply(order_id, car_id, start_time, end_time, status, return_store_id)
+
+    def _apply(self, order_id, car_id, start_time, end_time, status, return_store_id):
+        old_car_id = self._orders.pop(order_id, None)
+        if old_car_id is not None:
+            intervals = self._cars.get(old_car_id)
+            if intervals is not None:
+                intervals.remove(order_id)
+                if not intervals:
+                    del self._cars[old_car_id]
+        if status in ACTIVE_ORDER_STATUSES and start_time and end_time:
+            self._cars.setdefault(car_id, _CarIntervals()).add(start_time, end_time, order_id)
+            self._orders[order_id] = car_id
+        if status is not None and status != CANCELLED_ORDER_STATUS and return_store_id is not None:
+            self._car_store[car_id] = return_store_id
+
+    # --- 查询 ---
+
+    def is_free(self, car_id, start_time, end_time):
+        """车辆在 [start_time, end_time) 内是否没有有效订单"""
+        self._ensure_loaded()
+        with self._lock:
+            intervals = self._cars.get(car_id)
+            return intervals is None or not intervals.overlaps(start_time, end_time)
+
+    def busy_cars(self, start_time, end_time):
+        """[start_time, end_time) 内已被占用的车辆ID集合"""
+        self._ensure_loaded()
+        with self._lock:
+            return {
+                car_id for car_id, intervals in self._cars.items()
+                if intervals.overlaps(start_time, end_time)
+            }
+
+    def free_cars(self, car_ids, start_time, end_time):
+        """从给定车辆中筛选出在 [start_time, end_time) 内空闲的车辆"""
+        self._ensure_loaded()
+        with self._lock:
+            return [
+                car_id for car_id in car_ids
+                if car_id not in self._cars or not self._cars[car_id].overlaps(start_time, end_time)
+            ]
+
+    def cars_at_store(self, store_id):
+        """最近一次还车到该门店的车辆ID"""
+        self._ensure_loaded()
+        with self._lock:
+            return sorted(car_id for car_id, store in self._car_store.items() if store == store_id)
+
+    def car_stores(self):
+        """car_id -> 最近一次还车门店"""
+        self._ensure_loaded()
+        with self._lock:
+            return dict(self._car_store)
+
+    def free_cars_at_store(self, store_id, start_time, end_time):
+        """门店中在 [start_time, end_time) 内空闲的车辆ID"""
+        return self.free_cars(self.cars_at_store(store_id), start_time, end_time)
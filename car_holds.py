@@ -0,0 +1,139 @@
+# car_holds.py
+"""下单前的车辆短时占用（hold）
+
+用户选定车辆和租期后先在 Redis 中占用该时间窗口，占用带有 TTL，过期
+自动释放。占用的检查与写入在一个 Lua 脚本中原子完成，同一车辆重叠
+时间窗口的竞争者在毫秒级即可失败，而不是等到 MySQL 提交时才冲突。
+
+每辆车使用两个键：
+    car_hold:{car_id}          有序集合，成员为 hold_id，分值为过期时间戳
+    car_hold:{car_id}:windows  哈希，hold_id -> "开始时间戳|结束时间戳|user_id"
+"""
+import time
+import uuid
+from datetime import timezone
+
+# 占用：清理过期成员 -> 检查与其他用户的重叠 -> 写入
+ACQUIRE_SCRIPT = """
+local now = tonumber(ARGV[1])
+local start_ts = tonumber(ARGV[3])
+local end_ts = tonumber(ARGV[4])
+local expires_at = tonumber(ARGV[5])
+local user_id = ARGV[6]
+
+local expired = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', now)
+for _, id in ipairs(expired) do
+    redis.call('HDEL', KEYS[2], id)
+end
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', now)
+
+local ids = redis.call('ZRANGE', KEYS[1], 0, -1)
+for _, id in ipairs(ids) do
+    local window = redis.call('HGET', KEYS[2], id)
+    if window then
+        local s, e, owner = string.match(window, '^([^|]+)|([^|]+)|(.*)$')
+        if owner ~= user_id and tonumber(s) < end_ts and tonumber(e) > start_ts then
+            return {0, id}
+        end
+    end
+end
+
+redis.call('ZADD', KEYS[1], expires_at, ARGV[2])
+redis.call('HSET', KEYS[2], ARGV[2], ARGV[3] .. '|' .. ARGV[4] .. '|' .. user_id)
+local last = redis.call('ZRANGE', KEYS[1], -1, -1, 'WITHSCORES')
+local ttl_ms = math.ceil((tonumber(last[2]) - now) * 1000)
+redis.call('PEXPIRE', KEYS[1], ttl_ms)
+redis.call('PEXPIRE', KEYS[2], ttl_ms)
+return {1, ARGV[2]}
+"""
+
+
+def _timestamp(value):
+    """datetime（naive 视为 UTC）-> 时间戳"""
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
+
+
+class CarHoldService:
+    """车辆短时占用服务"""
+
+    def __init__(self, redis_client, ttl=600):
+        """
+        Args:
+            redis_client: Redis 客户端（decode_responses=True）
+            ttl (int): 占用有效期（秒）
+        """
+        self.redis_client = redis_client
+        self.ttl = ttl
+        self._acquire = redis_client.register_script(ACQUIRE_SCRIPT)
+
+    @staticmethod
+    def _keys(car_id):
+        return [f"car_hold:{car_id}", f"car_hold:{car_id}:windows"]
+
+    def acquire(self, car_id, user_id, start_time, end_time):
+        """占用车辆的时间窗口
+
+        Returns:
+            tuple: (是否成功, hold_id 或冲突的 hold_id, 过期时间戳)
+        """
+        now = time.time()
+        hold_id = uuid.uuid4().hex
+        expires_at = now + self.ttl
+        ok, result_id = self._acquire(
+            keys=self._keys(car_id),
+            args=[now, hold_id, _timestamp(start_time), _timestamp(end_time), expires_at, user_id]
+        )
+        return bool(ok), result_id, expires_at
+
+    def get(self, car_id, hold_id):
+        """返回未过期的占用 {'start', 'end', 'user_id', 'expires_at'}，不存在时返回 None"""
+        zset_key, hash_key = self._keys(car_id)
+        pipe = self.redis_client.pipeline(transaction=False)
+        pipe.zscore(zset_key, hold_id)
+        pipe.hget(hash_key, hold_id)
+        expires_at, window = pipe.execute()
+        if expires_at is None or window is None or float(expires_at) <= time.time():
+            return None
+        start_ts, end_ts, user_id = window.split('|', 2)
+        return {
+            'start': float(start_ts),
+            'end': float(end_ts),
+            'user_id': user_id,
+            'expires_at': float(expires_at)
+        }
+
+    def covers(self, car_id, hold_id, user_id, start_time, end_time):
+        """占用是否属于该用户且覆盖 [start_time, end_time)"""
+        hold = self.get(car_id, hold_id)
+        return (
+            hold is not None
+            and hold['user_id'] == str(user_id)
+            and hold['start'] <= _timestamp(start_time)
+            and hold['end'] >= _timestamp(end_time)
+        )
+
+    def held_by_other(self, car_id, user_id, start_time, end_time):
+        """是否有其他用户占用了与 [start_time, end_time) 重叠的窗口"""
+        zset_key, hash_key = self._keys(car_id)
+        now = time.time()
+        live_ids = self.redis_client.zrangebyscore(zset_key, now, '+inf')
+        if not live_ids:
+            return False
+        start_ts, end_ts = _timestamp(start_time), _timestamp(end_time)
+        for window in self.redis_client.hmget(hash_key, live_ids):
+            if window is None:
+                continue
+            s, e, owner = window.split('|', 2)
+            if owner != str(user_id) and float(s) < end_ts and float(e) > start_ts:
+                return True
+        return False
+
+    def release(self, car_id, hold_id):
+        """释放占用（下单成功或用户放弃时调用）"""
+        zset_key, hash_key = self._keys(car_id)
+        pipe = self.redis_client.pipeline(transaction=False)
+        pipe.zrem(zset_key, hold_id)
+        pipe.hdel(hash_key, hold_id)
+        pipe.execute()
@@ -42,6 +42,7 @@ CREATE TABLE `car_info`  (
   PRIMARY KEY (`car_id`) USING BTREE,
   UNIQUE KEY `car_number` (`car_number`) USING BTREE,
   INDEX `type_id`(`type_id`) USING BTREE,
+  FULLTEXT INDEX `ft_car_info_search`(`brand`, `model`, `color`) WITH PARSER `ngram`,
   CONSTRAINT `fk_car_info_type_id` FOREIGN KEY (`type_id`) REFERENCES `car_type_info` (`type_id`) ON DELETE SET NULL ON UPDATE CASCADE
 ) ENGINE = InnoDB CHARACTER SET = utf8 COLLATE = utf8_general_ci ROW_FORMAT = Dynamic;
 
@@ -65,7 +66,8 @@ CREATE TABLE `car_type_info`  (
   `seat_num` int(11) NULL DEFAULT NULL,
   `price_per_day` decimal(10, 2) NULL DEFAULT NULL,
 
-  PRIMARY KEY (`type_id`) USING BTREE
+  PRIMARY KEY (`type_id`) USING BTREE,
+  FULLTEXT INDEX `ft_car_type_name`(`type_name`) WITH PARSER `ngram`
 ) ENGINE = InnoDB CHARACTER SET = utf8 COLLATE = utf8_general_ci ROW_FORMAT = Dynamic;
 
 -- ----------------------------
@@ -3489,6 +3491,24 @@ CREATE TABLE `coupon_info`  (
 -- Records of coupon_info
 -- ----------------------------
 
+-- ----------------------------
+-- Table structure for event_outbox
+-- ----------------------------
+DROP TABLE IF EXISTS `event_outbox`;
+CREATE TABLE `event_outbox`  (
+  `id` bigint(20) NOT NULL AUTO_INCREMENT,
+  `event_type` varchar(50) CHARACTER SET utf8 COLLATE utf8_general_ci NOT NULL,
+  `aggregate_id` varchar(50) CHARACTER SET utf8 COLLATE utf8_general_ci NULL DEFAULT NULL,
+  `payload` text CHARACTER SET utf8 COLLATE utf8_general_ci NOT NULL,
+  `attempts` int(11) NOT NULL DEFAULT 0,
+  `last_error` varchar(500) CHARACTER SET utf8 COLLATE utf8_general_ci NULL DEFAULT NULL,
+  `created_at` datetime NOT NULL,
+  `next_attempt_at` datetime NOT NULL,
+  `processed_at` datetime NULL DEFAULT NULL,
+  PRIMARY KEY (`id`) USING BTREE,
+  INDEX `idx_outbox_pending`(`processed_at`, `next_attempt_at`) USING BTREE
+) ENGINE = InnoDB CHARACTER SET = utf8 COLLATE = utf8_general_ci ROW_FORMAT = Dynamic;
+
 -- ----------------------------
 -- Table structure for id_type_info
 -- ----------------------------
@@ -3637,11 +3657,12 @@ CREATE TABLE `order_info`  (
   `status` tinyint(4) NULL DEFAULT NULL,
   PRIMARY KEY (`order_id`) USING BTREE,
   INDEX `user_id`(`user_id`) USING BTREE,
+  INDEX `idx_order_user_create`(`user_id`, `create_time`) USING BTREE,
   INDEX `car_id`(`car_id`) USING BTREE,
   INDEX `pickup_store_id`(`pickup_store_id`) USING BTREE,
   INDEX `return_store_id`(`return_store_id`) USING BTREE,
   INDEX `coupon_id`(`coupon_id`) USING BTREE
-) ENGINE = MyISAM CHARACTER SET = utf8 COLLATE = utf8_general_ci ROW_FORMAT = Fixed;
+) ENGINE = InnoDB CHARACTER SET = utf8 COLLATE = utf8_general_ci ROW_FORMAT = Dynamic;
 
 -- ----------------------------
 -- Records of order_info
@@ -3802,7 +3823,7 @@ CREATE TABLE `user_coupon`  (
   PRIMARY KEY (`id`) USING BTREE,
   INDEX `user_id`(`user_id`) USING BTREE,
   INDEX `coupon_id`(`coupon_id`) USING BTREE
-) ENGINE = MyISAM CHARACTER SET = utf8 COLLATE = utf8_general_ci ROW_FORMAT = Fixed;
+) ENGINE = InnoDB CHARACTER SET = utf8 COLLATE = utf8_general_ci ROW_FORMAT = Dynamic;
 
 -- ----------------------------
 -- Records of user_coupon
@@ -3828,6 +3849,10 @@ CREATE TABLE `user_info`  (
   `emergency_phone` varchar(20) CHARACTER SET utf8 COLLATE utf8_general_ci NULL DEFAULT NULL,
   `credit_score` int(11) NULL DEFAULT NULL,
   PRIMARY KEY (`user_id`) USING BTREE,
+  UNIQUE INDEX `uk_user_username`(`username`) USING BTREE,
+  UNIQUE INDEX `uk_user_phone`(`phone`) USING BTREE,
+  UNIQUE INDEX `uk_user_email`(`email`) USING BTREE,
+  UNIQUE INDEX `uk_user_id_number`(`id_number`) USING BTREE,
   INDEX `id_type`(`id_type`) USING BTREE
 ) ENGINE = MyISAM AUTO_INCREMENT = 9 CHARACTER SET = utf8 COLLATE = utf8_general_ci ROW_FORMAT = Dynamic;
 
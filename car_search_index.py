@@ -0,0 +1,173 @@
+# car_search_index.py
+"""进程内车辆 n-gram 搜索索引
+
+对 brand / model / type_name / color（以及品牌型号连写）建立字符 unigram + bigram 倒排表，
+适合“本田雅阁”这类没有空格分词的中文名称。查询时对各个 gram 的
+倒排集合求交集，再用子串校验去掉 bigram 不连续造成的误命中，
+最后只需用结果ID回表取详情，MySQL 不再执行 LIKE '%q%' 全表扫描。
+"""
+import threading
+import time
+
+# 参与索引的字段
+INDEXED_FIELDS = ('brand', 'model', 'type_name', 'color')
+
+# 字段之间的分隔符，避免跨字段拼出 bigram
+FIELD_SEPARATOR = '\x00'
+
+
+def normalize(text):
+    """统一大小写并去掉首尾空白"""
+    return (text or '').strip().lower()
+
+
+def ngrams(text):
+    """返回文本的 unigram 和 bigram 集合（跳过包含分隔符或空白的 gram）"""
+    grams = set()
+    for i, char in enumerate(text):
+        if char.isspace() or char == FIELD_SEPARATOR:
+            continue
+        grams.add(char)
+        if i + 1 < len(text):
+            pair = text[i:i + 2]
+            if not (pair[1].isspace() or pair[1] == FIELD_SEPARATOR):
+                grams.add(pair)
+    return grams
+
+
+def query_grams(term):
+    """查询词使用的 gram：单字用 unigram，多字只用 bigram（倒排更短）"""
+    if len(term) == 1:
+        return {term}
+    return {term[i:i + 2] for i in range(len(term) - 1)}
+
+
+class NgramSearchIndex:
+    """车辆 n-gram 倒排索引
+
+    loader(car_ids) 负责从数据库读取车辆，car_ids 为 None 表示全部，
+    返回 (car_id, available, {字段: 值}) 的可迭代对象。
+    """
+
+    def __init__(self, loader, max_age=300):
+        """
+        Args:
+            loader (callable): 车辆数据加载函数
+            max_age (float): 全量重建间隔（秒），用于感知其他进程的写入，None 表示不过期
+        """
+        self.loader = loader
+        self.max_age = max_age
+        self._postings = {}      # gram -> set(car_id)
+        self._docs = {}          # car_id -> 规范化后的拼接文本
+        self._available = set()  # 可租赁车辆ID
+        self._dirty = set()      # 待刷新的车辆ID
+        self._built_at = None
+        self._lock = threading.RLock()
+
+    # --- 维护 ---
+
+    def _remove(self, car_id):
+        text = self._docs.pop(car_id, None)
+        if text is None:
+            return
+        for gram in ngrams(text):
+            posting = self._postings.get(gram)
+            if posting is not None:
+                posting.discard(car_id)
+                if not posting:
+                    del self._postings[gram]
+        self._available.discard(car_id)
+
+    def _add(self, car_id, available, fields):
+        values = [normalize(fields.get(name)) for name in INDEXED_FIELDS]
+        # 额外索引“品牌+型号”的连写形式，使“本田雅阁”这类查询能够命中
+        values.append(normalize(fields.get('brand')) + normalize(fields.get('model')))
+        text = FIELD_SEPARATOR.join(values)
+        self._docs[car_id] = text
+        for gram in ngrams(text):
+            self._postings.setdefault(gram, set()).add(car_id)
+        if available:
+            self._available.add(car_id)
+
+    def rebuild(self):
+        """从数据库全量重建索引"""
+        with self._lock:
+            self._postings.clear()
+            self._docs.clear()
+            self._available.clear()
+            self._dirty.clear()
+            for car_id, available, fields in self.loader(None):
+                self._add(car_id, available, fields)
+            self._built_at = time.monotonic()
+
+    def invalidate(self, car_ids=None):
+        """标记车辆需要刷新，car_ids 为 None 时下次查询前全量重建"""
+        with self._lock:
+            if car_ids is None:
+                self._built_at = None
+            else:
+                self._dirty.update(car_ids)
+
+    def _refresh(self):
+        """按需重建或只刷新脏车辆"""
+        if self._built_at is None or (
+                self.max_age is not None and time.monotonic() - self._built_at > self.max_age):
+            self.rebuild()
+            return
+        if not self._dirty:
+            return
+        car_ids = sorted(self._dirty)
+        self._dirty.clear()
+        for car_id in car_ids:
+            self._remove(car_id)
+        for car_id, available, fields in self.loader(car_ids):
+            self._add(car_id, available, fields)
+
+    # --- 查询 ---
+
+    def search(self, query, available_only=True):
+        """返回匹配的车辆ID（升序）
+
+        查询按空白拆分为多个词，所有词都需命中（AND）；空查询返回全部车辆。
+        """
+        with self._lock:
+            self._refresh()
+            scope = self._available if available_only else self._docs.keys()
+            terms = normalize(query).split()
+            if not terms:
+                return sorted(scope)
+
+            postings = []
+            for term in terms:
+                for gram in query_grams(term):
+                    posting = self._postings.get(gram)
+                    if posting is None:
+                        return []
+                    postings.append(posting)
+
+            # 从最短的倒排表开始求交集
+            postings.sort(key=len)
+            candidates = set(postings[0])
+            for posting in postings[1:]:
+                candidates &= posting
+                if not candidates:
+                    return []
+            candidates = {car_id for car_id in candidates if car_id in scope}
+
+            # bigram 全部出现不代表连续出现，用子串校验去掉误命中
+            long_terms = [term for term in terms if len(term) > 2]
+            if long_terms:
+                candidates = {
+                    car_id for car_id in candidates
+                    if all(term in self._docs[car_id] for term in long_terms)
+                }
+            return sorted(candidates)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'docs': len(self._docs),
+                'grams': len(self._postings),
+                'dirty': len(self._dirty),
+                'age_seconds': None if self._built_at is None else round(time.monotonic() - self._built_at, 1)
+            }
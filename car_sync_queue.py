@@ -0,0 +1,124 @@
+# car_sync_queue.py
+"""车辆变更传播队列
+
+CarInfo 的写操作只把受影响的 car_id 放入 Redis 集合，后台线程定期取出
+待同步的 ID（集合天然去重合并），批量调用同步函数，避免每次写操作都
+全量重建 Elasticsearch 索引。
+"""
+import threading
+
+# Redis 中待同步车辆ID集合的键名
+PENDING_CARS_KEY = 'es_sync:pending_car_ids'
+# 全量重建期间暂停增量同步的标记键（跨进程生效）
+PAUSE_KEY = 'es_sync:paused'
+
+
+class CarSyncQueue:
+    """基于 Redis 集合的车辆变更队列，附带后台合并刷新线程。
+
+    Redis 不可用时退化为进程内集合，保证变更不会丢失。
+    """
+
+    def __init__(self, redis_client, sync_func, key=PENDING_CARS_KEY, interval=1.0, batch_size=500):
+        """
+        Args:
+            redis_client: Redis 客户端
+            sync_func (callable): 接收 car_id 列表并完成同步的函数
+            key (str): Redis 集合键名
+            interval (float): 后台线程刷新间隔（秒）
+            batch_size (int): 单次最多同步的车辆数
+        """
+        self.redis_client = redis_client
+        self.sync_func = sync_func
+        self.key = key
+        self.interval = interval
+        self.batch_size = batch_size
+        self._local_pending = set()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def enqueue(self, car_ids):
+        """登记需要同步的车辆ID"""
+        car_ids = [int(car_id) for car_id in car_ids if car_id is not None]
+        if not car_ids:
+            return
+        try:
+            self.redis_client.sadd(self.key, *car_ids)
+        except Exception as e:
+            print(f"Redis unavailable, keeping {len(car_ids)} pending car ids in process: {e}")
+            with self._lock:
+                self._local_pending.update(car_ids)
+
+    def _pop_pending(self):
+        """取出一批待同步的车辆ID"""
+        with self._lock:
+            car_ids = set(self._local_pending)
+            self._local_pending.clear()
+        try:
+            popped = self.redis_client.spop(self.key, self.batch_size) or []
+            car_ids.update(int(car_id) for car_id in popped)
+        except Exception as e:
+            print(f"Error popping pending car ids: {e}")
+        return sorted(car_ids)
+
+    def pause(self, ttl=3600):
+        """暂停增量同步，期间的变更保留在队列中（TTL 防止重建进程崩溃后永久暂停）"""
+        try:
+            self.redis_client.set(PAUSE_KEY, 1, ex=ttl)
+        except Exception as e:
+            print(f"Error pausing car sync queue: {e}")
+
+    def resume(self):
+        """恢复增量同步，暂停期间积累的变更会在下一轮刷新时写入"""
+        try:
+            self.redis_client.delete(PAUSE_KEY)
+        except Exception as e:
+            print(f"Error resuming car sync queue: {e}")
+
+    def is_paused(self):
+        try:
+            return bool(self.redis_client.exists(PAUSE_KEY))
+        except Exception:
+            return False
+
+    def flush(self):
+        """同步当前所有待处理的车辆，返回处理的车辆数"""
+        if self.is_paused():
+            return 0
+        total = 0
+        while True:
+            car_ids = self._pop_pending()
+            if not car_ids:
+                return total
+            try:
+                self.sync_func(car_ids)
+                total += len(car_ids)
+            except Exception as e:
+                # 同步失败时放回队列，等待下一轮重试
+                print(f"Error syncing cars {car_ids}: {e}")
+                self.enqueue(car_ids)
+                return total
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._wakeup.wait(self.interval)
+            self._wakeup.clear()
+            self.flush()
+
+    def start(self):
+        """启动后台刷新线程（重复调用无副作用）"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, name='car-sync-queue', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """停止后台线程并同步剩余的变更"""
+        self._stopped.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+        self.flush()
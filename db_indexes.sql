@@ -0,0 +1,50 @@
+-- 为已有数据库补充索引和约束（新建库直接导入 car_rent.sql 即可，无需执行本文件）
+-- 用法：mysql -u root -p car_rental < db_indexes.sql
+
+-- 订单、车辆的写入与 event_outbox 事件在同一事务中提交，业务表也必须是 InnoDB
+-- （car_rent.sql 新建的 car_info 已是 InnoDB，旧库可能仍为 MyISAM；
+-- 下方 ngram 全文索引同样需要 InnoDB）
+ALTER TABLE `car_info` ENGINE = InnoDB;
+
+-- /search_cars?backend=fulltext 使用的 ngram 全文索引（需要 MySQL 5.7.6+ / InnoDB）
+ALTER TABLE `car_info`
+  ADD FULLTEXT INDEX `ft_car_info_search`(`brand`, `model`, `color`) WITH PARSER `ngram`;
+ALTER TABLE `car_type_info`
+  ADD FULLTEXT INDEX `ft_car_type_name`(`type_name`) WITH PARSER `ngram`;
+
+-- 下单时核销优惠券（user_coupon）与写入订单（order_info）在同一事务中，
+-- 订单写入同时在该事务中写入 event_outbox 事件（rental_stats.delta 等）；
+-- MyISAM 不支持事务，回滚时核销和订单都不会撤销，两表需改为 InnoDB
+ALTER TABLE `order_info` ENGINE = InnoDB, ROW_FORMAT = Dynamic;
+ALTER TABLE `user_coupon` ENGINE = InnoDB, ROW_FORMAT = Dynamic;
+
+-- 订单ID由数据库分配（create_order 不再使用 max(order_id)+1）
+ALTER TABLE `order_info`
+  MODIFY `order_id` int(11) NOT NULL AUTO_INCREMENT;
+
+-- /api/user_orders 按 (create_time, order_id) 倒序分页
+ALTER TABLE `order_info`
+  ADD INDEX `idx_order_user_create`(`user_id`, `create_time`) USING BTREE;
+
+-- 写操作副作用的事务性发件箱（与业务数据同一事务写入，后台线程分发）
+CREATE TABLE IF NOT EXISTS `event_outbox`  (
+  `id` bigint(20) NOT NULL AUTO_INCREMENT,
+  `event_type` varchar(50) CHARACTER SET utf8 COLLATE utf8_general_ci NOT NULL,
+  `aggregate_id` varchar(50) CHARACTER SET utf8 COLLATE utf8_general_ci NULL DEFAULT NULL,
+  `payload` text CHARACTER SET utf8 COLLATE utf8_general_ci NOT NULL,
+  `attempts` int(11) NOT NULL DEFAULT 0,
+  `last_error` varchar(500) CHARACTER SET utf8 COLLATE utf8_general_ci NULL DEFAULT NULL,
+  `created_at` datetime NOT NULL,
+  `next_attempt_at` datetime NOT NULL,
+  `processed_at` datetime NULL DEFAULT NULL,
+  PRIMARY KEY (`id`) USING BTREE,
+  INDEX `idx_outbox_pending`(`processed_at`, `next_attempt_at`) USING BTREE
+) ENGINE = InnoDB CHARACTER SET = utf8 COLLATE = utf8_general_ci ROW_FORMAT = Dynamic;
+
+-- 注册标识唯一索引（check_user / register_user 合并为一次 OR 查询，并发注册由唯一索引兜底）
+-- 执行前请先清理重复数据
+ALTER TABLE `user_info`
+  ADD UNIQUE INDEX `uk_user_username`(`username`) USING BTREE,
+  ADD UNIQUE INDEX `uk_user_phone`(`phone`) USING BTREE,
+  ADD UNIQUE INDEX `uk_user_email`(`email`) USING BTREE,
+  ADD UNIQUE INDEX `uk_user_id_number`(`id_number`) USING BTREE;
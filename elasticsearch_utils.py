@@ -22,6 +22,23 @@ if ELASTICSEARCH_AVAILABLE:
 else:
     es = None
 
+# cars 索引的字段映射
+CARS_INDEX_MAPPINGS = {
+    "properties": {
+        "name": {"type": "text"},
+        "brand": {"type": "keyword"},
+        "model": {"type": "text"},
+        "seats": {"type": "integer"},
+        "fuel_type": {"type": "keyword"},
+        "transmission": {"type": "keyword"},
+        "price_per_day": {"type": "float"},
+        "image_url": {"type": "keyword", "index": False},
+        "description": {"type": "text"},
+        "id": {"type": "integer"},
+        "availability": {"type": "boolean"}
+    }
+}
+
 def create_index_if_not_exists(index_name='cars'):
     """如果索引不存在，则创建它。"""
     if not ELASTICSEARCH_AVAILABLE or es is None:
@@ -29,23 +46,9 @@ def create_index_if_not_exists(index_name='cars'):
         return False
     
     try:
+        # 别名同样视为已存在，此时实际写入的是别名指向的版本化索引
         if not es.indices.exists(index=index_name):
-            mappings = {
-                "mappings": {
-                    "properties": {
-                        "name": {"type": "text"},
-                        "brand": {"type": "keyword"},
-                        "model": {"type": "text"},
-                        "seats": {"type": "integer"},
-                        "fuel_type": {"type": "keyword"},
-                        "transmission": {"type": "keyword"},
-                        "price_per_day": {"type": "float"},
-                        "image_url": {"type": "keyword", "index": False},
-                        "description": {"type": "text"}
-                    }
-                }
-            }
-            es.indices.create(index=index_name, body=mappings)
+            es.indices.create(index=index_name, body={"mappings": CARS_INDEX_MAPPINGS})
             print(f"Index '{index_name}' created.")
         else:
             print(f"Index '{index_name}' already exists.")
@@ -54,6 +57,119 @@ def create_index_if_not_exists(index_name='cars'):
         print(f"Error creating Elasticsearch index: {e}")
         return False
 
+def _versioned_indices(alias):
+    """返回别名对应的所有版本化索引名称（{alias}_v{n}），按版本号升序排列"""
+    prefix = f"{alias}_v"
+    names = es.indices.get(index=f"{prefix}*", ignore_unavailable=True, allow_no_indices=True)
+    versioned = [
+        (int(name[len(prefix):]), name) for name in names if name[len(prefix):].isdigit()
+    ]
+    return [name for _, name in sorted(versioned)]
+
+def _current_replicas(alias):
+    """别名（或同名实体索引）当前的副本数，不存在时返回 None"""
+    try:
+        if es.indices.exists_alias(name=alias):
+            index_name = sorted(es.indices.get_alias(name=alias).keys())[-1]
+        elif es.indices.exists(index=alias):
+            index_name = alias
+        else:
+            return None
+        settings = es.indices.get_settings(index=index_name, name='index.number_of_replicas')
+        return int(settings[index_name]['settings']['index']['number_of_replicas'])
+    except Exception as e:
+        print(f"Error reading replica count of '{alias}': {e}")
+        return None
+
+def reindex_cars_with_alias(cars_iter, alias='cars', chunk_size=500, keep_previous=1, replicas=None):
+    """流式全量重建索引，完成后原子切换别名，搜索始终看到完整的数据。
+
+    数据写入新的版本化索引 {alias}_v{n}，期间 refresh 关闭、副本数为 0 以加快写入；
+    写入完成后通过一次 update_aliases 请求把别名从旧索引切到新索引。
+    如果 {alias} 本身是旧的实体索引，会在同一请求中删除并由别名替代。
+
+    Args:
+        cars_iter (iterable): 车辆文档的迭代器（应为生成器，保证内存占用恒定）
+        alias (str): 对外提供搜索的别名
+        chunk_size (int): 每个 bulk 请求的文档数
+        keep_previous (int): 切换后保留的旧版本索引数量，便于回滚
+        replicas (int): 新索引写入完成后的副本数；未指定时依次使用环境变量
+            ES_NUMBER_OF_REPLICAS、旧索引的副本数，都没有时为 ES 默认的 1
+
+    Returns:
+        dict: {'index', 'docs', 'errors', 'seconds', 'docs_per_sec'}，ES 不可用时返回 None
+    """
+    if not ELASTICSEARCH_AVAILABLE or es is None:
+        print("Elasticsearch not available, skipping reindex")
+        return None
+
+    import time
+    from elasticsearch.helpers import streaming_bulk
+
+    existing = _versioned_indices(alias)
+    next_version = int(existing[-1].rsplit('_v', 1)[1]) + 1 if existing else 1
+    new_index = f"{alias}_v{next_version}"
+    if replicas is None and os.environ.get('ES_NUMBER_OF_REPLICAS'):
+        replicas = int(os.environ['ES_NUMBER_OF_REPLICAS'])
+    if replicas is None:
+        # 沿用旧索引的副本数（单节点集群通常为 0，设置为 1 会一直是 yellow 状态）
+        replicas = _current_replicas(alias)
+    if replicas is None:
+        replicas = 1
+    es.indices.create(index=new_index, body={
+        "settings": {"refresh_interval": "-1", "number_of_replicas": 0},
+        "mappings": CARS_INDEX_MAPPINGS
+    })
+    print(f"Reindexing into '{new_index}'...")
+
+    actions = (
+        {"_index": new_index, "_id": car.get('id'), "_source": car}
+        for car in cars_iter
+    )
+    docs = errors = 0
+    started = time.perf_counter()
+    for ok, item in streaming_bulk(es, actions, chunk_size=chunk_size, raise_on_error=False):
+        if ok:
+            docs += 1
+        else:
+            errors += 1
+            print(f"Error indexing document: {item}")
+    elapsed = time.perf_counter() - started
+
+    if errors:
+        # 新索引不完整时不切换别名，保留旧索引继续提供服务
+        es.indices.delete(index=new_index, ignore_unavailable=True)
+        raise RuntimeError(f"Reindex into '{new_index}' failed with {errors} errors, alias not swapped")
+
+    es.indices.put_settings(index=new_index, body={"index": {"refresh_interval": "1s", "number_of_replicas": replicas}})
+    es.indices.refresh(index=new_index)
+
+    # 原子切换别名
+    alias_actions = [{"add": {"index": new_index, "alias": alias}}]
+    if es.indices.exists_alias(name=alias):
+        old_indices = es.indices.get_alias(name=alias).keys()
+        alias_actions[:0] = [{"remove": {"index": name, "alias": alias}} for name in old_indices]
+    elif es.indices.exists(index=alias):
+        alias_actions.insert(0, {"remove_index": {"index": alias}})
+    es.indices.update_aliases(body={"actions": alias_actions})
+    print(f"Alias '{alias}' now points to '{new_index}'.")
+
+    # 清理更早的版本，只保留最近 keep_previous 个旧索引
+    stale = [name for name in _versioned_indices(alias) if name != new_index]
+    for name in stale[:max(0, len(stale) - keep_previous)]:
+        es.indices.delete(index=name, ignore_unavailable=True)
+        print(f"Deleted stale index '{name}'.")
+
+    docs_per_sec = docs / elapsed if elapsed > 0 else float(docs)
+    print(f"Reindexed {docs} cars in {elapsed:.2f}s ({docs_per_sec:.1f} docs/sec).")
+    return {
+        'index': new_index,
+        'docs': docs,
+        'errors': errors,
+        'seconds': round(elapsed, 3),
+        'docs_per_sec': round(docs_per_sec, 1)
+    }
+
 def search_cars(*args, **kwargs):
     """搜索车辆"""
     if not ELASTICSEARCH_AVAILABLE or es is None:
@@ -113,36 +229,210 @@ def bulk_index_cars(index_name='cars', cars_data=None):
     except Exception as e:
         print(f"Error during bulk indexing: {e}")
 
-def search_cars(query_string, index_name='cars'):
-    """根据查询字符串搜索车辆。"""
-    # 如果查询字符串为空或为通配符，返回所有车辆
-    if not query_string or query_string.strip() == '*':
-        query_body = {
-            "query": {
-                "match_all": {}
-            }
+def bulk_update_cars(index_name='cars', cars_data=None, deleted_ids=None):
+    """以 update 动作增量同步部分车辆，不存在的文档自动 upsert。
+
+    Args:
+        index_name (str): 索引名称
+        cars_data (list): 需要更新的车辆文档，必须包含 id
+        deleted_ids (list): 数据库中已删除、需要从索引移除的车辆ID
+
+    Returns:
+        tuple: (成功条数, 错误列表)
+    """
+    if not ELASTICSEARCH_AVAILABLE or es is None:
+        return 0, []
+
+    from elasticsearch.helpers import bulk
+    actions = [
+        {
+            "_op_type": "update",
+            "_index": index_name,
+            "_id": car.get('id'),
+            "doc": car,
+            "doc_as_upsert": True
         }
+        for car in (cars_data or [])
+    ]
+    actions.extend(
+        {"_op_type": "delete", "_index": index_name, "_id": car_id}
+        for car_id in (deleted_ids or [])
+    )
+    if not actions:
+        return 0, []
+
+    successes, errors = bulk(es, actions, raise_on_error=False)
+    # 删除不存在的文档返回 404，不视为错误
+    errors = [
+        err for err in errors
+        if not (err.get('delete') and err['delete'].get('status') == 404)
+    ]
+    if errors:
+        print(f"Errors occurred during incremental update: {errors}")
+    return successes, errors
+
+def count_documents(index_name='cars'):
+    """返回索引中的文档数量，Elasticsearch 不可用时返回 None。"""
+    if not ELASTICSEARCH_AVAILABLE or es is None:
+        return None
+    try:
+        return es.count(index=index_name)['count']
+    except Exception as e:
+        print(f"Error counting documents in '{index_name}': {e}")
+        return None
+
+# --- 结构化搜索相关配置 ---
+
+# 可选排序方式，最后统一追加 id 作为 search_after 的唯一排序键
+SEARCH_SORT_OPTIONS = {
+    'relevance': [{"_score": "desc"}],
+    'price_asc': [{"price_per_day": "asc"}],
+    'price_desc': [{"price_per_day": "desc"}],
+    'seats_asc': [{"seats": "asc"}],
+    'seats_desc': [{"seats": "desc"}],
+    'mileage_asc': [{"mileage": "asc"}],
+    'id_asc': [],  # 仅按 id 排序，用于按 car_id 的 keyset 分页
+}
+
+# 允许做分面统计的字段（均为 keyword/integer 类型）
+SEARCH_FACET_FIELDS = ('brand', 'fuel_type', 'transmission', 'seats')
+
+# 单页最大返回条数，防止一次拉取整个车队
+SEARCH_MAX_PAGE_SIZE = 100
+SEARCH_DEFAULT_PAGE_SIZE = 20
+
+
+def build_search_query(query_string=None, filters=None):
+    """根据关键字和结构化筛选条件构造 bool 查询。
+
+    关键字放在 must 中参与打分，筛选条件全部放在 filter 上下文中，
+    不参与打分，可被 Elasticsearch 的 filter cache 缓存。
+
+    Args:
+        query_string (str): 关键字，为空或 '*' 时匹配全部
+        filters (dict): 筛选条件，支持 brand/fuel_type/transmission（字符串或列表）、
+            seats、min_price、max_price、availability，以及 exclude_ids（要排除的车辆ID）
+
+    Returns:
+        dict: Elasticsearch query 子句
+    """
+    filters = filters or {}
+
+    if not query_string or query_string.strip() == '*':
+        must = [{"match_all": {}}]
     else:
-        # 基础的多字段匹配查询
-        query_body = {
-            "query": {
-                "multi_match": {
-                    "query": query_string,
-                    "fields": ["name", "brand", "model", "description"], # 搜索这些字段
-                    "fuzziness": "AUTO" # 允许一定的拼写错误
-                }
+        must = [{
+            "multi_match": {
+                "query": query_string,
+                "fields": ["name", "brand", "model", "description"],  # 搜索这些字段
+                "fuzziness": "AUTO"  # 允许一定的拼写错误
             }
+        }]
+
+    filter_clauses = []
+    for field in ('brand', 'fuel_type', 'transmission', 'seats'):
+        value = filters.get(field)
+        if value is None or value == '' or value == []:
+            continue
+        if isinstance(value, (list, tuple, set)):
+            filter_clauses.append({"terms": {field: list(value)}})
+        else:
+            filter_clauses.append({"term": {field: value}})
+
+    price_range = {}
+    if filters.get('min_price') is not None:
+        price_range['gte'] = filters['min_price']
+    if filters.get('max_price') is not None:
+        price_range['lte'] = filters['max_price']
+    if price_range:
+        filter_clauses.append({"range": {"price_per_day": price_range}})
+
+    if filters.get('availability') is not None:
+        filter_clauses.append({"term": {"availability": bool(filters['availability'])}})
+
+    query = {"bool": {"must": must, "filter": filter_clauses}}
+    if filters.get('exclude_ids'):
+        query["bool"]["must_not"] = [{"terms": {"id": list(filters['exclude_ids'])}}]
+    return query
+
+
+def search_cars_page(query_string=None, index_name='cars', filters=None, from_=0, size=None,
+                     search_after=None, source_fields=None, sort=None, facets=False):
+    """结构化、分页的车辆搜索。
+
+    Args:
+        query_string (str): 关键字
+        index_name (str): 索引名称
+        filters (dict): 筛选条件，见 build_search_query
+        from_ (int): 偏移量分页起点，与 search_after 二选一
+        size (int): 每页条数，最大 SEARCH_MAX_PAGE_SIZE
+        search_after (list): 上一页最后一条记录的 sort 值，用于深分页
+        source_fields (list): 需要返回的 _source 字段，None 表示全部
+        sort (str): 排序方式，取值见 SEARCH_SORT_OPTIONS
+        facets (bool): 是否返回 brand/fuel_type/transmission/seats 的分面统计
+
+    Returns:
+        dict: {'hits': [...], 'total': int, 'search_after': list|None, 'facets': dict}
+    """
+    result = {'hits': [], 'total': 0, 'search_after': None, 'facets': {}}
+    if not ELASTICSEARCH_AVAILABLE or es is None:
+        return result
+
+    if size is None:
+        size = SEARCH_DEFAULT_PAGE_SIZE
+    size = max(0, min(int(size), SEARCH_MAX_PAGE_SIZE))
+
+    sort_clause = list(SEARCH_SORT_OPTIONS.get(sort or 'relevance', SEARCH_SORT_OPTIONS['relevance']))
+    sort_clause.append({"id": "asc"})
+
+    query_body = {
+        "query": build_search_query(query_string, filters),
+        "size": size,
+        "sort": sort_clause,
+    }
+    if search_after:
+        query_body["search_after"] = list(search_after)
+    else:
+        query_body["from"] = max(0, int(from_ or 0))
+
+    if source_fields:
+        # 始终带上 id，方便前端定位车辆
+        query_body["_source"] = sorted(set(source_fields) | {'id'})
+
+    if facets:
+        query_body["aggs"] = {
+            field: {"terms": {"field": field, "size": 50}}
+            for field in SEARCH_FACET_FIELDS
         }
-    
-    print(f"Elasticsearch query body: {query_body}") # 打印查询体
+
     try:
         response = es.search(index=index_name, body=query_body)
-        print(f"Elasticsearch response: {response}") # 打印原始响应
-        hits = [hit['_source'] for hit in response['hits']['hits']]
-        return hits
     except Exception as e:
         print(f"Error searching cars: {e}")
-        return []
+        return result
+
+    hits = response['hits']['hits']
+    result['hits'] = [hit.get('_source', {}) for hit in hits]
+    total = response['hits'].get('total', 0)
+    result['total'] = total.get('value', 0) if isinstance(total, dict) else total
+    if hits and len(hits) == size:
+        result['search_after'] = hits[-1].get('sort')
+
+    for field, agg in response.get('aggregations', {}).items():
+        result['facets'][field] = {
+            str(bucket['key']): bucket['doc_count'] for bucket in agg.get('buckets', [])
+        }
+    return result
+
+
+def search_cars(query_string, index_name='cars', **kwargs):
+    """根据查询字符串搜索车辆，仅返回命中的 _source 列表。
+
+    额外的关键字参数（filters/from_/size/sort 等）会透传给 search_cars_page。
+    """
+    # 兼容旧调用：未指定 size 时保持 Elasticsearch 默认的 10 条
+    kwargs.setdefault('size', 10)
+    return search_cars_page(query_string, index_name=index_name, **kwargs)['hits']
 
 # --- 数据库同步相关函数 ---
 # 以下函数用于将前端的车辆数据同步到数据库，并随后索引到Elasticsearch
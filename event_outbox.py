@@ -0,0 +1,150 @@
+# event_outbox.py
+"""事务性发件箱（transactional outbox）
+
+写操作的副作用（ES 同步、Redis 统计、WebSocket 通知、MinIO 清理等）不再
+在请求中直接执行，而是作为一行事件写入 event_outbox 表，与业务数据在同
+一个数据库事务中提交。后台分发线程批量取出未处理的事件，按类型交给处理
+函数，成功后标记为已处理，失败则按指数退避重试，保证至少一次投递。
+请求延迟因此只包含 MySQL 提交本身。
+
+多个进程可以同时运行分发线程：取事件时使用 FOR UPDATE SKIP LOCKED，
+同一事件同一时刻只会被一个进程处理。处理函数需要是幂等的：一批事件处理
+成功后、标记提交前失败（或进程退出）时整批会重新投递，非幂等的副作用
+（如计数增量）应按事件 id 去重。
+"""
+import json
+import threading
+from datetime import datetime, timedelta
+
+# 超过该次数仍失败的事件不再重试，保留在表中供排查
+MAX_ATTEMPTS = 10
+# 重试退避上限（秒）
+MAX_BACKOFF_SECONDS = 600
+# 已处理事件的保留时间
+PROCESSED_RETENTION = timedelta(days=1)
+
+
+def outbox_values(event_type, aggregate_id, payload):
+    """生成一行发件箱事件的列值"""
+    now = datetime.utcnow()
+    return {
+        'event_type': event_type,
+        'aggregate_id': None if aggregate_id is None else str(aggregate_id),
+        'payload': json.dumps(payload, ensure_ascii=False, default=str),
+        'attempts': 0,
+        'created_at': now,
+        'next_attempt_at': now
+    }
+
+
+def retry_delay(attempts):
+    """第 attempts 次失败后的重试间隔"""
+    return timedelta(seconds=min(2 ** attempts, MAX_BACKOFF_SECONDS))
+
+
+class OutboxDispatcher:
+    """发件箱后台分发线程"""
+
+    def __init__(self, app, db, model, handlers, interval=1.0, batch_size=200):
+        """
+        Args:
+            app: Flask 应用（分发线程中需要应用上下文）
+            db: Flask-SQLAlchemy 实例
+            model: 发件箱模型，包含 id / event_type / payload / attempts /
+                   next_attempt_at / processed_at / last_error 列
+            handlers (dict): event_type -> 处理函数，接收同类事件 (id, payload) 的列表
+            interval (float): 空闲时的轮询间隔（秒）
+            batch_size (int): 单次最多取出的事件数
+        """
+        self.app = app
+        self.db = db
+        self.model = model
+        self.handlers = handlers
+        self.interval = interval
+        self.batch_size = batch_size
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def notify(self):
+        """有新事件提交，立即唤醒分发线程"""
+        self._wakeup.set()
+
+    def drain_once(self):
+        """取出一批到期事件并分发，返回本批事件数"""
+        model = self.model
+        with self.app.app_context():
+            session = self.db.session
+            now = datetime.utcnow()
+            events = session.query(model).filter(
+                model.processed_at.is_(None),
+                model.attempts < MAX_ATTEMPTS,
+                model.next_attempt_at <= now
+            ).order_by(model.id).limit(self.batch_size).with_for_update(skip_locked=True).all()
+            if not events:
+                session.rollback()
+                return 0
+
+            by_type = {}
+            for event in events:
+                by_type.setdefault(event.event_type, []).append(event)
+
+            for event_type, typed_events in by_type.items():
+                try:
+                    handler = self.handlers.get(event_type)
+                    if handler is None:
+                        raise LookupError(f"no handler for event type '{event_type}'")
+                    handler([(event.id, json.loads(event.payload)) for event in typed_events])
+                except Exception as e:
+                    print(f"Outbox dispatch of {len(typed_events)} '{event_type}' events failed: {e}")
+                    for event in typed_events:
+                        event.attempts += 1
+                        event.last_error = str(e)[:500]
+                        event.next_attempt_at = now + retry_delay(event.attempts)
+                else:
+                    for event in typed_events:
+                        event.processed_at = now
+            session.commit()
+            return len(events)
+
+    def purge_processed(self, retention=PROCESSED_RETENTION):
+        """删除已处理且超过保留时间的事件"""
+        model = self.model
+        with self.app.app_context():
+            deleted = self.model.query.filter(
+                model.processed_at.isnot(None),
+                model.processed_at < datetime.utcnow() - retention
+            ).delete(synchronize_session=False)
+            self.db.session.commit()
+            return deleted
+
+    def _run(self):
+        last_purge = datetime.utcnow()
+        while not self._stopped.is_set():
+            try:
+                drained = self.drain_once()
+                if datetime.utcnow() - last_purge > timedelta(hours=1):
+                    self.purge_processed()
+                    last_purge = datetime.utcnow()
+            except Exception as e:
+                print(f"Outbox dispatcher error: {e}")
+                drained = 0
+            # 本批已满时继续取下一批，否则等待新事件或下一次轮询
+            if drained < self.batch_size:
+                self._wakeup.wait(self.interval)
+                self._wakeup.clear()
+
+    def start(self):
+        """启动后台分发线程"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, name='outbox-dispatcher', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=5):
+        """停止后台线程"""
+        self._stopped.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
@@ -0,0 +1,150 @@
+# idempotency.py
+"""Idempotency-Key 支持
+
+客户端在超时后重试写请求（下单、注册）时带上相同的 Idempotency-Key
+请求头。第一次请求的响应（状态码、Content-Type、响应体字节）存入 Redis，
+之后相同 key 的请求直接返回保存的响应，不再访问 MySQL。处理期间用一个
+短期锁标记"处理中"，并发到达的同 key 请求会等待第一次请求完成后返回
+同样的响应。加锁成功后会再检查一次保存的响应，避免在前一个请求保存响应
+与释放锁之间到达的重试被再次执行。
+
+同一个 key 只能用于同一个请求：请求体的哈希与 key 一起保存，key 被
+用于不同请求体时返回 422。5xx 响应不保存，客户端可以用同一 key 重试。
+Redis 不可用时按普通请求处理。
+"""
+import hashlib
+import time
+import uuid
+from functools import wraps
+
+from flask import jsonify, make_response, request
+
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+REPLAYED_HEADER = 'Idempotent-Replayed'
+MAX_KEY_LENGTH = 128
+
+# 仅当锁仍归自己所有时才删除
+RELEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+class IdempotencyStore:
+    """基于 Redis 的幂等响应存储"""
+
+    def __init__(self, redis_client, prefix='idempotency', ttl=24 * 3600, lock_ttl=30, wait_timeout=10.0):
+        """
+        Args:
+            redis_client: 不解码响应的 Redis 客户端（decode_responses=False）
+            prefix (str): 键前缀
+            ttl (int): 保存响应的有效期（秒）
+            lock_ttl (int): 处理中锁的有效期（秒），应大于接口的最长处理时间
+            wait_timeout (float): 并发请求等待第一次请求完成的最长时间（秒）
+        """
+        self.redis_client = redis_client
+        self.prefix = prefix
+        self.ttl = ttl
+        self.lock_ttl = lock_ttl
+        self.wait_timeout = wait_timeout
+        self._release = redis_client.register_script(RELEASE_SCRIPT)
+
+    def _keys(self, scope, key):
+        base = f"{self.prefix}:{scope}:{key}"
+        return f"{base}:response", f"{base}:lock"
+
+    def _load(self, response_key):
+        stored = self.redis_client.hgetall(response_key)
+        return stored or None
+
+    @staticmethod
+    def _replay(stored):
+        response = make_response(stored[b'body'], int(stored[b'status']))
+        response.headers['Content-Type'] = stored[b'content_type'].decode('utf-8')
+        response.headers[REPLAYED_HEADER] = 'true'
+        return response
+
+    def _wait_for_response(self, response_key, lock_key):
+        """等待持有锁的请求完成，返回保存的响应；锁释放但没有保存响应时返回 None"""
+        deadline = time.monotonic() + self.wait_timeout
+        delay = 0.05
+        while time.monotonic() < deadline:
+            stored = self._load(response_key)
+            if stored is not None:
+                return stored
+            if not self.redis_client.exists(lock_key):
+                return None
+            time.sleep(delay)
+            delay = min(delay * 2, 0.5)
+        return None
+
+    def idempotent(self, scope, user_scoped=False):
+        """视图装饰器，放在 jwt_required 之后（user_scoped=True 时按当前用户隔离 key）"""
+        def decorator(f):
+            @wraps(f)
+            def decorated_function(*args, **kwargs):
+                key = request.headers.get(IDEMPOTENCY_HEADER, '').strip()
+                if not key:
+                    return f(*args, **kwargs)
+                if len(key) > MAX_KEY_LENGTH:
+                    return jsonify({"status": "error", "message": f"{IDEMPOTENCY_HEADER} 过长"}), 400
+
+                key_scope = f"{scope}:{request.current_user_id}" if user_scoped else scope
+                response_key, lock_key = self._keys(key_scope, key)
+                fingerprint = hashlib.sha256(request.get_data()).hexdigest().encode('ascii')
+
+                try:
+                    stored = self._load(response_key)
+                    token = None
+                    if stored is None:
+                        token = uuid.uuid4().hex
+                        if not self.redis_client.set(lock_key, token, nx=True, ex=self.lock_ttl):
+                            # 同 key 的请求正在处理，等待其结果
+                            token = None
+                            stored = self._wait_for_response(response_key, lock_key)
+                            if stored is None:
+                                return jsonify({"status": "error", "message": "相同请求正在处理中，请稍后重试"}), 409
+                        else:
+                            # 第一次读取后、加锁前，持有锁的请求可能刚保存响应并释放锁：
+                            # 加锁成功后再读一次，已有响应时直接重放，不再重复执行
+                            stored = self._load(response_key)
+                            if stored is not None:
+                                self._release(keys=[lock_key], args=[token])
+                                token = None
+                except Exception as e:
+                    print(f"Idempotency store unavailable, processing without it: {e}")
+                    return f(*args, **kwargs)
+
+                if stored is not None:
+                    if stored.get(b'fingerprint') != fingerprint:
+                        return jsonify({
+                            "status": "error",
+                            "message": f"{IDEMPOTENCY_HEADER} 已用于不同的请求"
+                        }), 422
+                    return self._replay(stored)
+
+                try:
+                    response = make_response(f(*args, **kwargs))
+                    if response.status_code < 500 and not response.is_streamed:
+                        try:
+                            pipe = self.redis_client.pipeline()
+                            pipe.hset(response_key, mapping={
+                                'status': response.status_code,
+                                'content_type': response.headers.get('Content-Type', ''),
+                                'body': response.get_data(),
+                                'fingerprint': fingerprint
+                            })
+                            pipe.expire(response_key, self.ttl)
+                            pipe.execute()
+                        except Exception as e:
+                            print(f"Error saving idempotent response: {e}")
+                    return response
+                finally:
+                    try:
+                        self._release(keys=[lock_key], args=[token])
+                    except Exception as e:
+                        print(f"Error releasing idempotency lock: {e}")
+            return decorated_function
+        return decorator
@@ -0,0 +1,121 @@
+# jwt_cache.py
+"""已验证 JWT 的进程内缓存
+
+同一页面通常会用同一个 token 发起 5~10 个需要认证的请求。token 第一次
+通过签名和有效期校验后，解码出的 claims 按 token 的 SHA-256 摘要缓存在
+有界 LRU 中，直到 token 的 exp；之后的请求只做一次字典查找，不再重复
+解析和 HMAC 校验。
+
+注销时调用 revoke() 把 token 摘要写入 Redis 拒绝列表（有效期到 token 过期
+为止），每次使用 token（包括缓存命中）都会检查该列表，因此注销在所有进
+程中立即生效。Redis 不可用时跳过拒绝列表检查。
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+import jwt
+
+# 没有 exp 的 token 最多缓存的时间（秒）
+DEFAULT_MAX_AGE = 300
+
+
+class VerifiedTokenCache:
+    """带撤销列表的 JWT 校验缓存"""
+
+    def __init__(self, secret, algorithms=('HS256',), max_size=4096, redis_client=None,
+                 deny_prefix='jwt:deny', max_age=DEFAULT_MAX_AGE):
+        """
+        Args:
+            secret (str): 签名密钥
+            algorithms (tuple): 允许的签名算法
+            max_size (int): 最多缓存的 token 数
+            redis_client: Redis 客户端，用于拒绝列表；None 表示不支持撤销
+            deny_prefix (str): 拒绝列表键前缀
+            max_age (float): 没有 exp 的 token 的缓存时间（秒）
+        """
+        self.secret = secret
+        self.algorithms = list(algorithms)
+        self.max_size = max_size
+        self.redis_client = redis_client
+        self.deny_prefix = deny_prefix
+        self.max_age = max_age
+        self._entries = OrderedDict()  # 摘要 -> (claims, 缓存截止时间戳)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _digest(token):
+        return hashlib.sha256(token.encode('utf-8')).hexdigest()
+
+    def _is_revoked(self, digest):
+        if self.redis_client is None:
+            return False
+        try:
+            return bool(self.redis_client.exists(f"{self.deny_prefix}:{digest}"))
+        except Exception as e:
+            print(f"JWT deny-list unavailable: {e}")
+            return False
+
+    def decode(self, token):
+        """校验并返回 token 的 claims，失败时抛出与 jwt.decode 相同的异常"""
+        digest = self._digest(token)
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(digest)
+            if entry is not None:
+                if entry[1] > now:
+                    self._entries.move_to_end(digest)
+                    self.hits += 1
+                else:
+                    del self._entries[digest]
+                    entry = None
+            if entry is None:
+                self.misses += 1
+
+        if entry is None:
+            # 未命中或已过期：完整校验（过期的 token 在这里抛出 ExpiredSignatureError）
+            claims = jwt.decode(token, self.secret, algorithms=self.algorithms)
+            exp = claims.get('exp')
+            valid_until = float(exp) if exp is not None else now + self.max_age
+            with self._lock:
+                self._entries[digest] = (claims, valid_until)
+                self._entries.move_to_end(digest)
+                while len(self._entries) > self.max_size:
+                    self._entries.popitem(last=False)
+        else:
+            claims = entry[0]
+
+        if self._is_revoked(digest):
+            raise jwt.InvalidTokenError('token has been revoked')
+        return claims
+
+    def revoke(self, token):
+        """撤销 token：写入 Redis 拒绝列表直到其过期，并移出本进程缓存；签名无效的 token 忽略"""
+        # 只接受本服务签发的 token（可以已过期），伪造的 token 不写入拒绝列表，
+        # 避免任意请求用自定义 exp 在 Redis 中制造长期存在的键
+        try:
+            claims = jwt.decode(token, self.secret, algorithms=self.algorithms, options={'verify_exp': False})
+        except jwt.InvalidTokenError:
+            return
+        digest = self._digest(token)
+        with self._lock:
+            self._entries.pop(digest, None)
+        if self.redis_client is None:
+            return
+        exp = claims.get('exp')
+        ttl = int(exp - time.time()) + 1 if exp is not None else self.max_age
+        if ttl > 0:
+            self.redis_client.set(f"{self.deny_prefix}:{digest}", 1, ex=ttl)
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': round(self.hits / total, 4) if total else 0.0
+            }
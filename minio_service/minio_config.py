@@ -21,6 +21,10 @@ UPLOAD_CONFIG = {
 URL_CONFIG = {
     'presigned_url_expiry_hours': 1,
     'public_url_enabled': True,
+    # 预签名URL缓存：进程内LRU容量，以及距离过期多久之前重新签名
+    'url_cache_size': 2048,
+    'url_cache_refresh_margin_seconds': 300,
+    'redis_url': os.environ.get('REDIS_URL', 'redis://localhost:6379/0'),
 }
 
 # 开发环境配置
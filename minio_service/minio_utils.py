@@ -1,10 +1,19 @@
 from minio import Minio
 from minio.error import S3Error
 import os
+import threading
+import time
+from collections import OrderedDict
 from datetime import timedelta
 import uuid
 import json
 
+try:
+    import redis
+    REDIS_AVAILABLE = True
+except ImportError:
+    REDIS_AVAILABLE = False
+
 # 导入配置
 from .minio_config import MINIO_CONFIG, UPLOAD_CONFIG, URL_CONFIG
 
@@ -129,9 +138,121 @@ def upload_file_data_to_minio(file_data, file_name, bucket_name=BUCKET_NAME):
         print(f"Error uploading file data: {e}")
         return None
 
+class PresignedUrlCache:
+    """预签名URL缓存：进程内LRU + Redis 两级
+
+    预签名URL在有效期内可以重复使用，缓存到过期前 refresh_margin 秒，
+    避免每次请求都做一次HMAC签名。Redis 不可用时只使用进程内缓存。
+    """
+
+    def __init__(self, max_size, refresh_margin, redis_url=None):
+        self.max_size = max_size
+        self.refresh_margin = refresh_margin
+        self._local = OrderedDict()  # (bucket, object_name) -> (url, 过期时间戳)
+        self._lock = threading.Lock()
+        self._redis = None
+        if REDIS_AVAILABLE and redis_url:
+            self._redis = redis.Redis.from_url(redis_url, decode_responses=True)
+
+    @staticmethod
+    def _redis_key(bucket_name, object_name):
+        return f"minio:presigned:{bucket_name}:{object_name}"
+
+    def _get_local(self, key, now):
+        with self._lock:
+            entry = self._local.get(key)
+            if entry is None:
+                return None
+            if entry[1] <= now:
+                del self._local[key]
+                return None
+            self._local.move_to_end(key)
+            return entry[0]
+
+    def _put_local(self, key, url, valid_until):
+        with self._lock:
+            self._local[key] = (url, valid_until)
+            self._local.move_to_end(key)
+            while len(self._local) > self.max_size:
+                self._local.popitem(last=False)
+
+    def get_many(self, object_names, bucket_name, expires):
+        """批量获取预签名URL，返回 {对象名称: URL}"""
+        now = time.time()
+        ttl = max(1, int(expires.total_seconds() - self.refresh_margin))
+        urls = {}
+        missing = []
+        for object_name in dict.fromkeys(object_names):
+            url = self._get_local((bucket_name, object_name), now)
+            if url is not None:
+                urls[object_name] = url
+            else:
+                missing.append(object_name)
+
+        # 第二级：Redis，一次 MGET 取回所有本地未命中的URL
+        if missing and self._redis is not None:
+            try:
+                keys = [self._redis_key(bucket_name, name) for name in missing]
+                pipe = self._redis.pipeline(transaction=False)
+                pipe.mget(keys)
+                for key in keys:
+                    pipe.ttl(key)
+                cached, *ttls = pipe.execute()
+                still_missing = []
+                for object_name, url, remaining in zip(missing, cached, ttls):
+                    if url is not None and remaining and remaining > 0:
+                        urls[object_name] = url
+                        self._put_local((bucket_name, object_name), url, now + remaining)
+                    else:
+                        still_missing.append(object_name)
+                missing = still_missing
+            except Exception as e:
+                print(f"Presigned URL cache (Redis) unavailable: {e}")
+
+        # 剩余的才需要真正签名，并写回两级缓存
+        signed = {}
+        for object_name in missing:
+            try:
+                url = minio_client.presigned_get_object(bucket_name, object_name, expires=expires)
+            except S3Error as e:
+                print(f"Error generating presigned URL: {e}")
+                continue
+            urls[object_name] = url
+            signed[object_name] = url
+            self._put_local((bucket_name, object_name), url, now + ttl)
+
+        if signed and self._redis is not None:
+            try:
+                pipe = self._redis.pipeline(transaction=False)
+                for object_name, url in signed.items():
+                    pipe.set(self._redis_key(bucket_name, object_name), url, ex=ttl)
+                pipe.execute()
+            except Exception as e:
+                print(f"Error caching presigned URLs: {e}")
+        return urls
+
+    def invalidate(self, object_name, bucket_name=BUCKET_NAME):
+        """对象被删除或覆盖时移除缓存"""
+        with self._lock:
+            self._local.pop((bucket_name, object_name), None)
+        if self._redis is not None:
+            try:
+                self._redis.delete(self._redis_key(bucket_name, object_name))
+            except Exception as e:
+                print(f"Error invalidating presigned URL: {e}")
+
+
+presigned_url_cache = PresignedUrlCache(
+    URL_CONFIG['url_cache_size'],
+    URL_CONFIG['url_cache_refresh_margin_seconds'],
+    URL_CONFIG.get('redis_url')
+)
+
 def get_file_url(object_name, bucket_name=BUCKET_NAME, expires=None):
     """获取文件的预签名URL
     
+    使用默认有效期时从缓存获取，有效期内不会重复签名。
+    
     Args:
         object_name (str): MinIO中的对象名称
         bucket_name (str): 存储桶名称
@@ -140,15 +261,36 @@ def get_file_url(object_name, bucket_name=BUCKET_NAME, expires=None):
     Returns:
         str: 预签名URL，失败时返回None
     """
+    if expires is None:
+        expires = timedelta(hours=URL_CONFIG['presigned_url_expiry_hours'])
+        return presigned_url_cache.get_many([object_name], bucket_name, expires).get(object_name)
     try:
-        if expires is None:
-            expires = timedelta(hours=URL_CONFIG['presigned_url_expiry_hours'])
         url = minio_client.presigned_get_object(bucket_name, object_name, expires=expires)
         return url
     except S3Error as e:
         print(f"Error generating presigned URL: {e}")
         return None
 
+def get_file_urls(object_names, bucket_name=BUCKET_NAME, public=None):
+    """批量获取文件的访问URL
+    
+    Args:
+        object_names (iterable): MinIO中的对象名称列表（可重复）
+        bucket_name (str): 存储桶名称
+        public (bool): True 返回公共URL，False 返回缓存的预签名URL，
+            None 时按 URL_CONFIG['public_url_enabled'] 决定
+    
+    Returns:
+        dict: 对象名称到URL的映射，签名失败的对象不在结果中
+    """
+    object_names = [name for name in object_names if name]
+    if public is None:
+        public = URL_CONFIG['public_url_enabled']
+    if public:
+        return {name: get_public_file_url(name, bucket_name) for name in object_names}
+    expires = timedelta(hours=URL_CONFIG['presigned_url_expiry_hours'])
+    return presigned_url_cache.get_many(object_names, bucket_name, expires)
+
 def get_public_file_url(object_name, bucket_name=BUCKET_NAME):
     """获取文件的公共访问URL（需要MinIO配置为公共访问）
     
@@ -174,6 +316,7 @@ def delete_file_from_minio(object_name, bucket_name=BUCKET_NAME):
     """
     try:
         minio_client.remove_object(bucket_name, object_name)
+        presigned_url_cache.invalidate(object_name, bucket_name)
         print(f"File '{object_name}' deleted from bucket '{bucket_name}'.")
         return True
     except S3Error as e:
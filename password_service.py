@@ -0,0 +1,171 @@
+# password_service.py
+"""bcrypt 密码服务
+
+bcrypt 每次哈希/校验需要 100~250ms 的 CPU 时间。计算放在有界线程池中执行
+（bcrypt 计算期间释放 GIL），请求线程只等待结果；同时排队的任务数有上限，
+登录洪峰时超出部分立即失败（返回 503），而不是让所有请求一起变慢。
+
+bcrypt 只使用密码的前 72 字节（bcrypt>=5 对更长的输入直接抛出 ValueError），
+这里与 Node 端 bcryptjs 一样按 UTF-8 编码后截断到 72 字节，两端对同一密码
+得到相同的结果。
+
+校验时兼容历史数据：明文密码和低于当前成本因子的哈希在登录成功后返回
+needs_rehash，由调用方用当前成本重新哈希后保存。哈希格式与 Node 端
+（bcryptjs/bcrypt 的 $2a$/$2b$）通用。
+
+stats() 返回排队等待和计算耗时的统计，用于评估线程池大小和成本因子。
+"""
+import hmac
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+
+import bcrypt
+
+BCRYPT_PREFIXES = ('$2a$', '$2b$', '$2y$')
+# bcrypt 参与计算的最大密码字节数
+BCRYPT_MAX_BYTES = 72
+# 耗时统计保留的最近样本数
+LATENCY_SAMPLES = 1000
+
+
+class PasswordServiceBusy(Exception):
+    """排队的密码计算任务已达上限，或等待计算结果超时"""
+
+
+def _password_bytes(password):
+    """密码的 UTF-8 字节，截断到 bcrypt 的 72 字节上限（与 bcryptjs 一致）"""
+    if not isinstance(password, str):
+        raise ValueError('password must be a string')
+    return password.encode('utf-8')[:BCRYPT_MAX_BYTES]
+
+
+def _percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * fraction))]
+
+
+class PasswordService:
+    """在有界线程池中执行 bcrypt 哈希与校验"""
+
+    def __init__(self, rounds=12, max_workers=None, max_pending=64, timeout=10.0):
+        """
+        Args:
+            rounds (int): bcrypt 成本因子（新哈希使用，低于此值的旧哈希会在登录时升级）
+            max_workers (int): 线程池大小，默认 CPU 核数
+            max_pending (int): 同时排队和执行的任务上限
+            timeout (float): 等待单个任务完成的最长时间（秒）
+        """
+        self.rounds = rounds
+        self.max_workers = max_workers or os.cpu_count() or 2
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='password')
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._rejected = 0
+        self._timeouts = 0
+        self._samples = {op: deque(maxlen=LATENCY_SAMPLES) for op in ('hash', 'verify')}
+        self._counts = {'hash': 0, 'verify': 0}
+
+    def _run(self, op, func, *args):
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self._rejected += 1
+            raise PasswordServiceBusy(f"password service saturated ({self.max_pending} pending)")
+        submitted = time.perf_counter()
+
+        def task():
+            started = time.perf_counter()
+            result = func(*args)
+            return result, started - submitted, time.perf_counter() - started
+
+        with self._lock:
+            self._in_flight += 1
+        try:
+            future = self._executor.submit(task)
+            try:
+                result, waited, computed = future.result(self.timeout)
+            except FutureTimeoutError:
+                future.cancel()
+                with self._lock:
+                    self._timeouts += 1
+                raise PasswordServiceBusy(f"password {op} timed out after {self.timeout}s")
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+            self._slots.release()
+        with self._lock:
+            self._counts[op] += 1
+            self._samples[op].append((waited * 1000, computed * 1000))
+        return result
+
+    def hash(self, password):
+        """用当前成本因子哈希密码，返回可直接存库的字符串"""
+        hashed = self._run('hash', bcrypt.hashpw, _password_bytes(password), bcrypt.gensalt(self.rounds))
+        return hashed.decode('ascii')
+
+    @staticmethod
+    def _cost(stored):
+        try:
+            return int(stored.split('$')[2])
+        except (IndexError, ValueError):
+            return 0
+
+    def verify(self, password, stored):
+        """校验密码
+
+        Returns:
+            tuple: (是否匹配, 是否需要用当前成本因子重新哈希)
+
+        Raises:
+            ValueError: password 不是字符串
+        """
+        if not stored or password is None:
+            return False, False
+        if not stored.startswith(BCRYPT_PREFIXES):
+            # 历史明文密码：常量时间比较，匹配后需要升级为哈希
+            if not isinstance(password, str):
+                raise ValueError('password must be a string')
+            matched = hmac.compare_digest(password.encode('utf-8'), stored.encode('utf-8'))
+            return matched, matched
+        try:
+            matched = self._run('verify', bcrypt.checkpw, _password_bytes(password), stored.encode('utf-8'))
+        except ValueError as e:
+            if not isinstance(password, str):
+                raise
+            # 库中的哈希格式损坏
+            print(f"Invalid bcrypt hash in storage: {e}")
+            return False, False
+        return matched, matched and self._cost(stored) < self.rounds
+
+    def stats(self):
+        """本进程的线程池状态与耗时统计（毫秒）"""
+        with self._lock:
+            samples = {op: list(values) for op, values in self._samples.items()}
+            counts = dict(self._counts)
+            in_flight, rejected, timeouts = self._in_flight, self._rejected, self._timeouts
+        result = {
+            'rounds': self.rounds,
+            'max_workers': self.max_workers,
+            'max_pending': self.max_pending,
+            'in_flight': in_flight,
+            'rejected': rejected,
+            'timeouts': timeouts,
+        }
+        for op, values in samples.items():
+            waits = sorted(v[0] for v in values)
+            computes = sorted(v[1] for v in values)
+            result[op] = {
+                'count': counts[op],
+                'wait_ms_p50': round(_percentile(waits, 0.5), 2),
+                'wait_ms_p95': round(_percentile(waits, 0.95), 2),
+                'compute_ms_p50': round(_percentile(computes, 0.5), 2),
+                'compute_ms_p95': round(_percentile(computes, 0.95), 2),
+                'compute_ms_max': round(computes[-1], 2) if computes else 0.0,
+            }
+        return result
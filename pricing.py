@@ -0,0 +1,164 @@
+# pricing.py
+"""服务端批量报价
+
+车型日租金、押金加载为按 car_id 排序的 NumPy 数组，一次报价请求中的
+所有 (车辆, 取车时间, 还车时间, 取车门店, 还车门店) 组合用数组运算
+同时计算，不再逐行循环。费用项与 order_fee 表对应：
+    basic_rental_fee  基础租金 = 日租金 × 租赁天数
+    service_fee       服务费 = 基础租金 × 费率
+    preparation_fee   整备费（每单固定）
+    insurance_fee     保险费（按方案，每单固定）
+    delivery_fee      异店还车费
+total 为应付总额（各费用项 + 押金，未扣减优惠）。
+"""
+import threading
+import time
+
+import numpy as np
+
+# 默认计价规则，与前端下单页的展示保持一致
+DEFAULT_PRICING_RULES = {
+    'default_daily_rent': 0.0,      # 车型未配置日租金时使用
+    'default_deposit': 150.0,       # 车型未配置押金时使用
+    'grace_hours': 0.0,             # 超出整天的宽限小时数，超过即多计一天
+    'service_fee_rate': 0.0,
+    'preparation_fee': 0.0,
+    'cross_store_fee': 0.0,
+    'insurance_prices': {'basic': 150.0, 'full': 300.0},
+}
+
+FEE_COMPONENTS = ('basic_rental_fee', 'service_fee', 'preparation_fee', 'insurance_fee', 'delivery_fee')
+
+_SECONDS_PER_DAY = 86400
+
+
+class QuoteEngine:
+    """基于 NumPy 的批量报价引擎
+
+    loader() 返回 (car_id, daily_rent, deposit) 的可迭代对象，金额可为 None。
+    """
+
+    def __init__(self, loader, rules=None, max_age=300):
+        """
+        Args:
+            loader (callable): 车辆价格加载函数
+            rules (dict): 覆盖 DEFAULT_PRICING_RULES 中的部分规则
+            max_age (float): 价格数据的最长缓存时间（秒）
+        """
+        self.loader = loader
+        self.rules = dict(DEFAULT_PRICING_RULES, **(rules or {}))
+        self.max_age = max_age
+        self._prices = None
+        self._loaded_at = None
+        self._lock = threading.Lock()
+
+    def load(self):
+        """重新加载车辆价格"""
+        rows = sorted(self.loader(), key=lambda row: row[0])
+        car_ids = np.array([row[0] for row in rows], dtype=np.int64)
+        daily_rent = np.array(
+            [self.rules['default_daily_rent'] if row[1] is None else float(row[1]) for row in rows],
+            dtype=np.float64
+        )
+        deposit = np.array(
+            [self.rules['default_deposit'] if row[2] is None else float(row[2]) for row in rows],
+            dtype=np.float64
+        )
+        with self._lock:
+            self._prices = (car_ids, daily_rent, deposit)
+            self._loaded_at = time.monotonic()
+        return self._prices
+
+    def invalidate(self):
+        """价格数据过期，下次报价时重新加载"""
+        with self._lock:
+            self._prices = None
+
+    def _current(self):
+        with self._lock:
+            prices = self._prices
+            fresh = prices is not None and time.monotonic() - self._loaded_at < self.max_age
+        return prices if fresh else self.load()
+
+    def quote(self, car_ids, start_times, end_times, pickup_store_ids, return_store_ids, insurance_types=None):
+        """批量报价，各参数为等长序列，时间为 naive UTC datetime
+
+        Returns:
+            dict: 与输入等长的 NumPy 数组，包含 found、rental_days、daily_rent、
+            各费用项、deposit 和 total；found 为 False 的车辆其余字段为 0
+        """
+        prices_car_ids, prices_daily_rent, prices_deposit = self._current()
+        car_ids = np.asarray(car_ids, dtype=np.int64)
+        count = len(car_ids)
+
+        # 按 car_id 二分查找价格
+        if len(prices_car_ids):
+            index = np.clip(np.searchsorted(prices_car_ids, car_ids), 0, len(prices_car_ids) - 1)
+            found = prices_car_ids[index] == car_ids
+            daily_rent = np.where(found, prices_daily_rent[index], 0.0)
+            deposit = np.where(found, prices_deposit[index], 0.0)
+        else:
+            found = np.zeros(count, dtype=bool)
+            daily_rent = deposit = np.zeros(count)
+
+        # 租赁天数：不足一天按一天计，超出整天部分超过宽限时间再多计一天
+        seconds = (
+            np.asarray(end_times, dtype='datetime64[s]') - np.asarray(start_times, dtype='datetime64[s]')
+        ).astype(np.int64)
+        billable = np.maximum(seconds - self.rules['grace_hours'] * 3600, 0)
+        rental_days = np.maximum(np.ceil(billable / _SECONDS_PER_DAY), 1).astype(np.int64)
+
+        basic_rental_fee = daily_rent * rental_days
+        service_fee = basic_rental_fee * self.rules['service_fee_rate']
+        preparation_fee = np.full(count, self.rules['preparation_fee'])
+        insurance_prices = self.rules['insurance_prices']
+        insurance_fee = np.array(
+            [insurance_prices.get(t, 0.0) for t in insurance_types] if insurance_types is not None else np.zeros(count),
+            dtype=np.float64
+        )
+        cross_store = np.asarray(pickup_store_ids) != np.asarray(return_store_ids)
+        delivery_fee = np.where(cross_store, self.rules['cross_store_fee'], 0.0)
+
+        fees = {
+            'basic_rental_fee': basic_rental_fee,
+            'service_fee': service_fee,
+            'preparation_fee': preparation_fee,
+            'insurance_fee': insurance_fee,
+            'delivery_fee': delivery_fee,
+        }
+        for name in FEE_COMPONENTS:
+            fees[name] = np.where(found, np.round(fees[name], 2), 0.0)
+        total = np.round(sum(fees.values()) + deposit, 2)
+
+        return dict(
+            fees,
+            found=found,
+            rental_days=rental_days,
+            daily_rent=daily_rent,
+            deposit=deposit,
+            total=np.where(found, total, 0.0)
+        )
+
+    def quote_rows(self, items):
+        """对字典列表报价，返回可直接 JSON 序列化的结果列表
+
+        每项包含 car_id、start_time、end_time、pickup_store_id、return_store_id，
+        可选 insurance_type。
+        """
+        if not items:
+            return []
+        result = self.quote(
+            [item['car_id'] for item in items],
+            [item['start_time'] for item in items],
+            [item['end_time'] for item in items],
+            [item['pickup_store_id'] for item in items],
+            [item['return_store_id'] for item in items],
+            [item.get('insurance_type') for item in items]
+        )
+        columns = ('rental_days', 'daily_rent') + FEE_COMPONENTS + ('deposit', 'total')
+        values = {name: result[name].tolist() for name in columns}
+        found = result['found'].tolist()
+        return [
+            dict({'car_id': item['car_id'], 'found': found[i]}, **{name: values[name][i] for name in columns})
+            for i, item in enumerate(items)
+        ]
@@ -0,0 +1,188 @@
+# profile_cache.py
+"""用户资料缓存：进程内LRU + Redis 两级
+
+前端几乎每次切换路由都会调用 /api/get_user_info。资料序列化为 UTF-8 JSON
+字节后缓存：先查进程内 LRU，再查 Redis，都未命中才读取 MySQL 并回填两级
+缓存。资料更新或注册时由写入方刷新/失效。进程内条目的有效期很短，其他
+进程写入后最多在该时间内读到旧资料。Redis 不可用时只使用进程内缓存。
+
+读取未命中时的回填可能与写入并发：回填先读到旧资料，写入方随后刷新或
+失效，回填再写回就会让旧资料在 Redis 中保留到过期。每个用户有一个代数
+计数器，refresh()/invalidate() 都会递增它；回填在读取数据库前记下代数，
+写回时由 Lua 脚本确认代数未变且键不存在（SET NX）才写入，否则放弃写回。
+"""
+import json
+import threading
+import time
+from collections import OrderedDict
+
+TIERS = ('local', 'redis', 'db')
+
+# 回填：代数未变（期间没有 refresh/invalidate）且键不存在时才写入
+FILL_SCRIPT = """
+local generation = redis.call('GET', KEYS[2]) or ''
+if generation ~= ARGV[2] then
+    return 0
+end
+if redis.call('SET', KEYS[1], ARGV[1], 'NX', 'EX', ARGV[3]) then
+    return 1
+end
+return 0
+"""
+
+
+class UserProfileCache:
+    """按 user_id 缓存序列化后的用户资料"""
+
+    def __init__(self, redis_client, loader, prefix='user_profile', ttl=3600, max_size=2048, local_ttl=10):
+        """
+        Args:
+            redis_client: 不解码响应的 Redis 客户端（decode_responses=False）
+            loader (callable): loader(user_id) 返回资料 dict，用户不存在时返回 None
+            prefix (str): Redis 键前缀
+            ttl (int): Redis 中资料的有效期（秒）
+            max_size (int): 进程内最多缓存的用户数
+            local_ttl (float): 进程内条目的有效期（秒）
+        """
+        self.redis_client = redis_client
+        self.loader = loader
+        self.prefix = prefix
+        self.ttl = ttl
+        self.max_size = max_size
+        self.local_ttl = local_ttl
+        self._local = OrderedDict()  # user_id -> (payload, 过期时间)
+        self._lock = threading.Lock()
+        self._counts = dict.fromkeys(TIERS, 0)
+        self._fill_once = redis_client.register_script(FILL_SCRIPT)
+
+    def _key(self, user_id):
+        return f"{self.prefix}:{user_id}"
+
+    def _generation_key(self, user_id):
+        return f"{self.prefix}:{user_id}:gen"
+
+    def _get_local(self, user_id):
+        with self._lock:
+            entry = self._local.get(user_id)
+            if entry is None:
+                return None
+            if entry[1] <= time.monotonic():
+                del self._local[user_id]
+                return None
+            self._local.move_to_end(user_id)
+            return entry[0]
+
+    def _put_local(self, user_id, payload):
+        with self._lock:
+            self._local[user_id] = (payload, time.monotonic() + self.local_ttl)
+            self._local.move_to_end(user_id)
+            while len(self._local) > self.max_size:
+                self._local.popitem(last=False)
+
+    def _count(self, tier):
+        with self._lock:
+            self._counts[tier] += 1
+
+    def get(self, user_id):
+        """返回资料的 JSON 字节串，用户不存在时返回 None"""
+        payload = self._get_local(user_id)
+        if payload is not None:
+            self._count('local')
+            return payload
+
+        try:
+            payload = self.redis_client.get(self._key(user_id))
+        except Exception as e:
+            print(f"User profile cache Redis unavailable: {e}")
+            payload = None
+        if payload is not None:
+            self._count('redis')
+            self._put_local(user_id, payload)
+            return payload
+
+        self._count('db')
+        return self._fill(user_id)
+
+    def _fill(self, user_id):
+        """读取未命中时从数据库加载并回填；期间有写入方刷新或失效时不写回旧资料"""
+        try:
+            generation = self.redis_client.get(self._generation_key(user_id)) or b''
+        except Exception as e:
+            print(f"User profile cache Redis unavailable: {e}")
+            generation = None
+        profile = self.loader(user_id)
+        if profile is None:
+            return None
+        payload = json.dumps(profile, ensure_ascii=False).encode('utf-8')
+        if generation is None:
+            self._put_local(user_id, payload)
+            return payload
+
+        try:
+            filled = self._fill_once(
+                keys=[self._key(user_id), self._generation_key(user_id)],
+                args=[payload, generation, self.ttl]
+            )
+            if not filled:
+                # 写入方已刷新（或已有其他回填），以 Redis 中的资料为准；
+                # 已失效时返回本次读到的资料但不缓存
+                current = self.redis_client.get(self._key(user_id))
+                if current is None:
+                    return payload
+                payload = current
+        except Exception as e:
+            print(f"Error caching user profile {user_id}: {e}")
+        self._put_local(user_id, payload)
+        return payload
+
+    def refresh(self, user_id):
+        """从数据库重新加载资料并无条件写入两级缓存（写入后调用即为 write-through）"""
+        profile = self.loader(user_id)
+        if profile is None:
+            self.invalidate(user_id)
+            return None
+        payload = json.dumps(profile, ensure_ascii=False).encode('utf-8')
+        self._put_local(user_id, payload)
+        try:
+            pipe = self.redis_client.pipeline()
+            pipe.incr(self._generation_key(user_id))
+            pipe.expire(self._generation_key(user_id), self.ttl)
+            pipe.set(self._key(user_id), payload, ex=self.ttl)
+            pipe.execute()
+        except Exception as e:
+            print(f"Error caching user profile {user_id}: {e}")
+        return payload
+
+    def invalidate(self, *user_ids):
+        """删除指定用户的缓存资料，并使进行中的回填放弃写回"""
+        with self._lock:
+            for user_id in user_ids:
+                self._local.pop(user_id, None)
+        try:
+            pipe = self.redis_client.pipeline()
+            for user_id in user_ids:
+                pipe.incr(self._generation_key(user_id))
+                pipe.expire(self._generation_key(user_id), self.ttl)
+            pipe.delete(*[self._key(user_id) for user_id in user_ids])
+            pipe.execute()
+        except Exception as e:
+            print(f"Error invalidating user profiles: {e}")
+
+    def stats(self):
+        """本进程各级缓存的命中次数与命中率"""
+        with self._lock:
+            counts = dict(self._counts)
+            local_size = len(self._local)
+        total = sum(counts.values())
+        redis_lookups = counts['redis'] + counts['db']
+        return {
+            'requests': total,
+            'local_hits': counts['local'],
+            'redis_hits': counts['redis'],
+            'db_loads': counts['db'],
+            'local_hit_ratio': round(counts['local'] / total, 4) if total else 0.0,
+            # Redis 命中率只统计进程内未命中、实际查询了 Redis 的请求
+            'redis_hit_ratio': round(counts['redis'] / redis_lookups, 4) if redis_lookups else 0.0,
+            'overall_hit_ratio': round((counts['local'] + counts['redis']) / total, 4) if total else 0.0,
+            'local_size': local_size
+        }
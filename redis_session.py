@@ -0,0 +1,176 @@
+# redis_session.py
+"""服务端 Redis session
+
+Flask 默认把整个 session 签名后放在 Cookie 里，每个响应都重新签名并下发，
+服务端也无法让某个 session 失效。这里 Cookie 中只保存随机 session ID，
+数据以 Flask 默认 session 相同的序列化格式存放在 Redis 中：
+
+- 惰性加载：视图第一次读写 session 时才访问 Redis，不使用 session 的请求
+  （绝大多数使用 JWT 的接口）不产生任何 Redis 操作，也不下发 Cookie；
+- 只在内容变化时写入，未变化时只刷新过期时间；
+- 过期时间滑动：每次使用 session 都把 TTL 重置为空闲超时，空闲超过该时间
+  的 session 由 Redis 自动删除；
+- Cookie 只在创建新 session 或更换 ID 时下发，不设置 Expires（有效期以
+  Redis 为准）；session 被清空时删除 Redis 数据和 Cookie。
+
+删除 Redis 中的键即可在所有进程中立即注销对应 session。Redis 不可用时
+session 视为空且本次请求不保存。
+"""
+import secrets
+
+from flask.json.tag import TaggedJSONSerializer
+from flask.sessions import SessionInterface, SessionMixin
+
+_serializer = TaggedJSONSerializer()
+
+
+class RedisSession(SessionMixin):
+    """首次访问时才从 Redis 加载数据的 session"""
+
+    def __init__(self, loader, sid=None):
+        self.sid = sid
+        self._loader = loader
+        self._data = None
+        self._raw = None  # 加载时的序列化数据，用于判断内容是否变化
+        self.loaded = False
+        self.accessed = False
+        self.modified = False
+        self.unavailable = False  # 加载时 Redis 不可用，本次请求不保存
+        self.previous_sid = None
+
+    def _load(self):
+        if not self.loaded:
+            self.loaded = True
+            loaded = self._loader(self.sid)
+            if loaded is None:
+                self.unavailable = True
+                loaded = ({}, None)
+            self._data, self._raw = loaded
+        self.accessed = True
+        return self._data
+
+    def __getitem__(self, key):
+        return self._load()[key]
+
+    def __setitem__(self, key, value):
+        self._load()[key] = value
+        self.modified = True
+
+    def __delitem__(self, key):
+        del self._load()[key]
+        self.modified = True
+
+    def __iter__(self):
+        return iter(self._load())
+
+    def __len__(self):
+        return len(self._load())
+
+    def __repr__(self):
+        return f"<{type(self).__name__} {self.sid!r} {self._data if self.loaded else '(not loaded)'}>"
+
+    def regenerate(self):
+        """保留数据但更换 session ID（登录时调用，防止 session 固定攻击）"""
+        self._load()
+        if self.sid is not None and self.previous_sid is None:
+            self.previous_sid = self.sid
+        self.sid = None
+        self.modified = True
+
+
+class RedisSessionInterface(SessionInterface):
+    """把 session 数据保存在 Redis 中的 SessionInterface"""
+
+    def __init__(self, redis_client, prefix='session', idle_timeout=7200):
+        """
+        Args:
+            redis_client: 不解码响应的 Redis 客户端（decode_responses=False）
+            prefix (str): 键前缀
+            idle_timeout (int): 空闲超时（秒），每次使用 session 时重新计时
+        """
+        self.redis_client = redis_client
+        self.prefix = prefix
+        self.idle_timeout = idle_timeout
+
+    def _key(self, sid):
+        return f"{self.prefix}:{sid}"
+
+    def _load(self, sid):
+        """返回 (数据, 序列化数据)并刷新过期时间；Redis 不可用时返回 None"""
+        if not sid:
+            return {}, None
+        try:
+            pipe = self.redis_client.pipeline(transaction=False)
+            pipe.get(self._key(sid))
+            pipe.expire(self._key(sid), self.idle_timeout)
+            raw, _ = pipe.execute()
+        except Exception as e:
+            print(f"Session store unavailable: {e}")
+            return None
+        if raw is None:
+            return {}, None
+        try:
+            return _serializer.loads(raw.decode('utf-8')), raw
+        except Exception as e:
+            print(f"Error decoding session {sid}: {e}")
+            return {}, None
+
+    def delete(self, sid):
+        """删除指定 session（所有进程立即生效）"""
+        self.redis_client.delete(self._key(sid))
+
+    def open_session(self, app, request):
+        sid = request.cookies.get(self.get_cookie_name(app)) or None
+        return RedisSession(self._load, sid)
+
+    def save_session(self, app, session, response):
+        if not session.loaded or session.unavailable:
+            # 本次请求没有使用 session，或加载时 Redis 不可用
+            return
+        response.vary.add('Cookie')
+
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+        had_cookie = session.sid is not None or session.previous_sid is not None
+
+        try:
+            if session.previous_sid is not None:
+                self.delete(session.previous_sid)
+                session.previous_sid = None
+
+            if not session:
+                # session 被清空：删除服务端数据和 Cookie
+                if session.sid is not None:
+                    self.delete(session.sid)
+                if had_cookie:
+                    response.delete_cookie(
+                        name, domain=domain, path=path,
+                        secure=self.get_cookie_secure(app),
+                        httponly=self.get_cookie_httponly(app),
+                        samesite=self.get_cookie_samesite(app)
+                    )
+                return
+
+            raw = _serializer.dumps(dict(session)).encode('utf-8')
+            if session.sid is not None and raw == session._raw:
+                # 内容未变化：加载时已刷新过期时间
+                return
+
+            # Redis 中没有对应数据的 ID（已过期或由客户端伪造）不再沿用
+            is_new = session.sid is None or session._raw is None
+            if is_new:
+                session.sid = secrets.token_urlsafe(32)
+            self.redis_client.set(self._key(session.sid), raw, ex=self.idle_timeout)
+            session._raw = raw
+        except Exception as e:
+            print(f"Error saving session: {e}")
+            return
+
+        if is_new:
+            response.set_cookie(
+                name, session.sid, domain=domain, path=path,
+                secure=self.get_cookie_secure(app),
+                httponly=self.get_cookie_httponly(app),
+                samesite=self.get_cookie_samesite(app)
+            )
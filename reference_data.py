@@ -0,0 +1,110 @@
+# reference_data.py
+"""省/市/区县/门店参考数据
+
+四张表一次性加载到内存，按上级ID分组，并为每个上级ID预先编码好
+UTF-8 JSON 响应体。级联下拉框的接口因此只需一次字典查找，不访问
+数据库，也不再重复序列化。数据在 TTL 到期或调用 invalidate() 后
+于下次访问时重新加载。
+"""
+import json
+import threading
+import time
+
+
+def _encode(payload):
+    return json.dumps(payload, ensure_ascii=False).encode('utf-8')
+
+
+class ReferenceData:
+    """预编码的参考数据
+
+    loader() 返回 dict，包含 provinces / cities / countries / stores 四个行列表，
+    每行为带属性访问的对象（如 SQLAlchemy Row）。
+    """
+
+    def __init__(self, loader, ttl=3600):
+        """
+        Args:
+            loader (callable): 从数据库读取四张表的函数
+            ttl (float): 数据有效期（秒），None 表示不过期
+        """
+        self.loader = loader
+        self.ttl = ttl
+        self._state = None
+        self._loaded_at = None
+        self._lock = threading.Lock()
+
+    def _build(self):
+        rows = self.loader()
+
+        provinces = _encode({"provinces": [
+            {"label": p.name, "value": p.province_id} for p in rows['provinces']
+        ]})
+
+        cities = {}
+        for city in rows['cities']:
+            cities.setdefault(city.province_id, []).append({"label": city.name, "value": city.city_id})
+
+        countries = {}
+        for country in rows['countries']:
+            countries.setdefault(country.city_id, []).append({"label": country.name, "value": country.country_id})
+
+        stores = {}
+        for store in rows['stores']:
+            stores.setdefault(store.country_id, []).append({
+                "store_id": store.store_id,
+                "store_name": store.store_name,
+                "address": store.address,
+                "business_hours": store.business_hours,
+                "phone": store.phone
+            })
+
+        return {
+            'provinces': provinces,
+            'cities': {key: _encode({"cities": value}) for key, value in cities.items()},
+            'countries': {key: _encode({"countries": value}) for key, value in countries.items()},
+            'stores': {key: _encode({"stores": value}) for key, value in stores.items()},
+            'empty': {
+                'cities': _encode({"cities": []}),
+                'countries': _encode({"countries": []}),
+                'stores': _encode({"stores": []}),
+            }
+        }
+
+    def _fresh_state(self):
+        state = self._state
+        if state is not None and (self.ttl is None or time.monotonic() - self._loaded_at < self.ttl):
+            return state
+        return None
+
+    def _current(self):
+        state = self._fresh_state()
+        if state is not None:
+            return state
+        with self._lock:
+            # 双重检查，避免并发请求重复加载
+            state = self._fresh_state()
+            if state is None:
+                state = self._state = self._build()
+                self._loaded_at = time.monotonic()
+            return state
+
+    def reload(self):
+        """立即重新加载"""
+        with self._lock:
+            self._state = self._build()
+            self._loaded_at = time.monotonic()
+
+    def invalidate(self):
+        """标记数据过期，下次访问时重新加载"""
+        with self._lock:
+            self._state = None
+
+    def provinces(self):
+        """返回所有省份的响应体"""
+        return self._current()['provinces']
+
+    def children(self, kind, parent_id):
+        """返回某个上级ID下的 cities / countries / stores 响应体"""
+        state = self._current()
+        return state[kind].get(parent_id, state['empty'][kind])
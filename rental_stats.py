@@ -0,0 +1,131 @@
+# rental_stats.py
+"""首页看板的租赁统计（Redis 哈希）
+
+    vehicle_rentals  车型（品牌+型号） -> 成交次数
+    city_rentals     城市（取车门店所在城市） -> 成交次数
+    city_branches    城市 -> 网点个数
+
+订单写入提交后按状态变化增量 HINCRBY（由发件箱投递，流水线一次提交），
+读取为 O(1) 的 HGETALL。发件箱至少一次投递，每个增量带事件 id，由 Lua
+脚本在同一原子操作中 SET NX 去重标记并累加，重复投递的事件不会重复计数。
+
+rebuild() 用于首次初始化或纠正偏差：调用方以服务端游标流式传入订单，
+统计结果先写入临时键再 RENAME，读取方不会看到半成品。
+rebuild() 完成后写入 ready 标记；只有标记存在才认为统计已初始化（旧版本
+接口写入的占位哈希不算）。
+"""
+from collections import Counter
+
+VEHICLE_RENTALS_KEY = 'vehicle_rentals'
+CITY_RENTALS_KEY = 'city_rentals'
+CITY_BRANCHES_KEY = 'city_branches'
+# rebuild() 完成的标记
+READY_KEY = 'rental_stats:ready'
+
+# 计为一次成交的订单状态：1-已支付 / 2-已取车 / 3-已还车
+RENTED_ORDER_STATUSES = (1, 2, 3)
+
+UNKNOWN_LABEL = '未知'
+
+# 去重标记的保留时间（秒），需长于发件箱的最长重试时间
+APPLIED_MARKER_TTL = 2 * 24 * 3600
+
+# 事件首次出现时才累加：KEYS = 去重标记, 车型哈希, 城市哈希；ARGV = 标记TTL, 车型, 城市, 增量
+APPLY_ONCE_SCRIPT = """
+if not redis.call('SET', KEYS[1], 1, 'NX', 'EX', ARGV[1]) then
+    return 0
+end
+redis.call('HINCRBY', KEYS[2], ARGV[2], ARGV[4])
+redis.call('HINCRBY', KEYS[3], ARGV[3], ARGV[4])
+return 1
+"""
+
+
+def vehicle_label(brand, model):
+    """车型统计名称，如 '本田雅阁'"""
+    return f"{brand or ''}{model or ''}" or UNKNOWN_LABEL
+
+
+class RentalStats:
+    """Redis 中增量维护的租赁统计"""
+
+    def __init__(self, redis_client, applied_prefix='rental_stats:applied'):
+        """
+        Args:
+            redis_client: Redis 客户端（decode_responses=True）
+            applied_prefix (str): 已应用事件去重标记的键前缀
+        """
+        self.redis_client = redis_client
+        self.applied_prefix = applied_prefix
+        self._apply_once = redis_client.register_script(APPLY_ONCE_SCRIPT)
+
+    def apply(self, deltas):
+        """应用一批 (事件id, 车型, 城市, 增量) 变化，已应用过的事件id跳过
+
+        Returns:
+            int: 本次实际应用的事件数
+        """
+        pipe = self.redis_client.pipeline(transaction=False)
+        count = 0
+        for event_id, vehicle, city, delta in deltas:
+            if not delta:
+                continue
+            self._apply_once(
+                keys=[f"{self.applied_prefix}:{event_id}", VEHICLE_RENTALS_KEY, CITY_RENTALS_KEY],
+                args=[APPLIED_MARKER_TTL, vehicle or UNKNOWN_LABEL, city or UNKNOWN_LABEL, delta],
+                client=pipe
+            )
+            count += 1
+        if not count:
+            return 0
+        return sum(pipe.execute())
+
+    def _replace(self, key, counter):
+        tmp_key = f"{key}:rebuild"
+        pipe = self.redis_client.pipeline()
+        pipe.delete(tmp_key)
+        if counter:
+            pipe.hset(tmp_key, mapping=dict(counter))
+            pipe.rename(tmp_key, key)
+        else:
+            pipe.delete(key)
+        pipe.execute()
+
+    def rebuild(self, order_rows, branch_rows):
+        """从头重新计算统计
+
+        Args:
+            order_rows: 可迭代的 (车型, 城市) 元组，每个成交订单一行
+            branch_rows: 可迭代的 (城市, 网点个数) 元组
+
+        Returns:
+            dict: 统计的订单数与各哈希的字段数
+        """
+        vehicles, cities = Counter(), Counter()
+        orders = 0
+        for vehicle, city in order_rows:
+            vehicles[vehicle or UNKNOWN_LABEL] += 1
+            cities[city or UNKNOWN_LABEL] += 1
+            orders += 1
+        branches = Counter()
+        for city, count in branch_rows:
+            branches[city or UNKNOWN_LABEL] += count
+
+        self._replace(VEHICLE_RENTALS_KEY, vehicles)
+        self._replace(CITY_RENTALS_KEY, cities)
+        self._replace(CITY_BRANCHES_KEY, branches)
+        self.redis_client.set(READY_KEY, 1)
+        return {
+            'orders': orders,
+            'vehicles': len(vehicles),
+            'cities': len(cities),
+            'branch_cities': len(branches)
+        }
+
+    def read(self, key):
+        """读取某个统计哈希，返回 {名称: 次数}"""
+        return {name: int(count) for name, count in self.redis_client.hgetall(key).items()}
+
+    def is_initialized(self):
+        """是否已由 rebuild() 从订单表生成过统计"""
+        return bool(self.redis_client.exists(READY_KEY))
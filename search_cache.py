@@ -0,0 +1,118 @@
+# search_cache.py
+"""车辆搜索结果缓存
+
+缓存键由规范化后的查询参数和全局“车队版本号”组成。任何 CarInfo /
+CarTypeInfo 写操作都会递增版本号，旧版本的键不再被访问，随 TTL 自然
+过期，因此失效是 O(1) 的，不需要 SCAN 删除。缓存值是已经序列化好的
+JSON 字节串，命中时直接作为响应体返回，跳过 jsonify。
+"""
+import hashlib
+from functools import wraps
+
+from flask import Response, request
+
+from webservice_middleware.webservice_middleware import wants_ndjson_stream
+
+# 车队版本号键名
+FLEET_VERSION_KEY = 'fleet:version'
+# 命中统计哈希键名
+STATS_KEY = 'search_cache:stats'
+
+
+class SearchResultCache:
+    """基于 Redis 的搜索结果缓存"""
+
+    def __init__(self, redis_client, prefix='search_cache', ttl=300):
+        """
+        Args:
+            redis_client: 不解码响应的 Redis 客户端（decode_responses=False）
+            prefix (str): 缓存键前缀
+            ttl (int): 缓存有效期（秒）
+        """
+        self.redis_client = redis_client
+        self.prefix = prefix
+        self.ttl = ttl
+
+    def fleet_version(self):
+        """返回当前车队版本号"""
+        return int(self.redis_client.get(FLEET_VERSION_KEY) or 0)
+
+    def bump_version(self):
+        """递增车队版本号，使所有已缓存的搜索结果失效"""
+        try:
+            return self.redis_client.incr(FLEET_VERSION_KEY)
+        except Exception as e:
+            print(f"Error bumping fleet version: {e}")
+            return None
+
+    def make_key(self, endpoint, args):
+        """根据规范化后的查询参数生成缓存键
+
+        参数按名称排序、去掉空值，关键字 q 去除首尾空白并转为小写，
+        使 ?q=本田&size=20 与 ?size=20&q=本田%20 命中同一条缓存。
+        """
+        items = []
+        for name, value in sorted(args.items(multi=True)):
+            value = value.strip()
+            if not value:
+                continue
+            if name == 'q':
+                value = value.lower()
+            items.append(f"{name}={value}")
+        digest = hashlib.sha1('&'.join(items).encode('utf-8')).hexdigest()
+        return f"{self.prefix}:v{self.fleet_version()}:{endpoint}:{digest}"
+
+    def _record(self, field):
+        try:
+            self.redis_client.hincrby(STATS_KEY, field, 1)
+        except Exception:
+            pass
+
+    def stats(self):
+        """返回命中/未命中次数和命中率"""
+        raw = self.redis_client.hgetall(STATS_KEY)
+        hits = int(raw.get(b'hits', 0))
+        misses = int(raw.get(b'misses', 0))
+        total = hits + misses
+        return {
+            'hits': hits,
+            'misses': misses,
+            'hit_ratio': round(hits / total, 4) if total else 0.0,
+            'fleet_version': self.fleet_version()
+        }
+
+    def cached(self, endpoint, skip_params=()):
+        """视图装饰器：命中时直接返回缓存的 JSON 字节，未命中时缓存 200 响应
+
+        Args:
+            endpoint (str): 缓存键中的接口名称
+            skip_params (tuple): 请求中带有这些参数时不使用缓存
+                （结果依赖订单等不会递增车队版本号的数据）
+        """
+        def decorator(f):
+            @wraps(f)
+            def decorated_function(*args, **kwargs):
+                # 流式响应不经过缓存
+                if wants_ndjson_stream() or any(request.args.get(name) for name in skip_params):
+                    return f(*args, **kwargs)
+                try:
+                    key = self.make_key(endpoint, request.args)
+                    body = self.redis_client.get(key)
+                except Exception as e:
+                    print(f"Search cache unavailable: {e}")
+                    return f(*args, **kwargs)
+
+                if body is not None:
+                    self._record('hits')
+                    return Response(body, mimetype='application/json')
+
+                self._record('misses')
+                result = f(*args, **kwargs)
+                if isinstance(result, Response) and result.status_code == 200 and not result.is_streamed:
+                    try:
+                        self.redis_client.set(key, result.get_data(), ex=self.ttl)
+                    except Exception as e:
+                        print(f"Error caching search result: {e}")
+                return result
+            return decorated_function
+        return decorator
@@ -0,0 +1,89 @@
+# snapshot_cache.py
+"""按内容哈希版本化的响应快照
+
+适用于几乎不变、生成代价又高的只读数据（如城市树）。快照序列化为
+UTF-8 JSON 字节后以内容哈希作为 ETag，存入 Redis 供所有进程共享，
+同时在进程内保留一份；客户端携带 If-None-Match 时可直接返回 304。
+"""
+import hashlib
+import json
+import threading
+
+
+class VersionedSnapshot:
+    """Redis + 进程内两级缓存的 JSON 快照"""
+
+    def __init__(self, redis_client, name, builder, ttl=24 * 3600):
+        """
+        Args:
+            redis_client: 不解码响应的 Redis 客户端（decode_responses=False）
+            name (str): 快照名称，用作 Redis 键前缀
+            builder (callable): 生成快照数据（可 JSON 序列化）的函数
+            ttl (int): Redis 中快照的有效期（秒）
+        """
+        self.redis_client = redis_client
+        self.name = name
+        self.builder = builder
+        self.ttl = ttl
+        self._etag = None
+        self._body = None
+        self._lock = threading.Lock()
+
+    @property
+    def _current_key(self):
+        return f"{self.name}:current"
+
+    def _body_key(self, etag):
+        return f"{self.name}:body:{etag}"
+
+    def current_etag(self):
+        """返回共享的当前 ETag，Redis 不可用时返回进程内的 ETag"""
+        try:
+            etag = self.redis_client.get(self._current_key)
+            return etag.decode('ascii') if etag else None
+        except Exception as e:
+            print(f"Snapshot '{self.name}' Redis unavailable: {e}")
+            return self._etag
+
+    def rebuild(self):
+        """重新生成快照并发布，返回 (etag, body)"""
+        body = json.dumps(self.builder(), ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        etag = hashlib.sha1(body).hexdigest()
+        try:
+            pipe = self.redis_client.pipeline()
+            pipe.set(self._body_key(etag), body, ex=self.ttl)
+            pipe.set(self._current_key, etag, ex=self.ttl)
+            pipe.execute()
+        except Exception as e:
+            print(f"Error publishing snapshot '{self.name}': {e}")
+        with self._lock:
+            self._etag, self._body = etag, body
+        return etag, body
+
+    def get(self, etag=None):
+        """返回 (etag, body)；etag 为调用方已查询到的当前 ETag，可省去一次 Redis 访问"""
+        if etag is None:
+            etag = self.current_etag()
+        if etag is None:
+            return self.rebuild()
+        with self._lock:
+            if etag == self._etag:
+                return self._etag, self._body
+        try:
+            body = self.redis_client.get(self._body_key(etag))
+        except Exception:
+            body = None
+        if body is None:
+            return self.rebuild()
+        with self._lock:
+            self._etag, self._body = etag, body
+        return etag, body
+
+    def invalidate(self):
+        """删除共享快照，下次访问时重新生成"""
+        with self._lock:
+            self._etag = self._body = None
+        try:
+            self.redis_client.delete(self._current_key)
+        except Exception as e:
+            print(f"Error invalidating snapshot '{self.name}': {e}")
@@ -0,0 +1,122 @@
+# user_identifiers.py
+"""注册标识（用户名、手机号、邮箱、身份证号）占用预筛
+
+每个字段在 Redis 中维护一个已占用值的集合。集合完整（存在 ready 标记）时，
+值不在集合中即可判定为可用，注册表单的实时校验无需访问 MySQL；值在集
+合中只表示"可能已占用"（改名、删除后旧值仍留在集合中），由调用方再用
+数据库确认。集合由 rebuild() 从 user_info 全量生成，之后随用户写入提交
+增量 SADD；增量写入失败时删除 ready 标记，退回到每次查询数据库，直到
+下一次 rebuild。数据库唯一索引仍是最终保证。
+"""
+
+import unicodedata
+
+IDENTIFIER_FIELDS = ('username', 'phone', 'email', 'id_number')
+
+# normalize() 规则的版本，写入 ready 标记；规则变化后旧集合不再被使用，启动时重新生成
+NORMALIZE_VERSION = 2
+
+# utf8_general_ci 中 ß 与 s 相等（casefold 会把它展开为 ss）
+_GENERAL_CI_SPECIAL = str.maketrans({'ß': 's', 'ẞ': 's'})
+
+
+def normalize(value):
+    """按 utf8_general_ci 的相等规则折叠取值：忽略大小写、重音（é = e）和首尾空白
+
+    用于预筛集合和数据库结果的比较，两个值在该排序规则下相等时折叠结果
+    必须相同。折叠比排序规则更粗（如兼容分解 Ｆ = F、忽略首部空白）只会
+    让更多值被判为"可能已占用"并交给数据库确认，不会误报可用。
+    """
+    decomposed = unicodedata.normalize('NFKD', str(value).translate(_GENERAL_CI_SPECIAL))
+    folded = ''.join(char for char in decomposed if not unicodedata.combining(char))
+    return folded.strip().casefold()
+
+
+class TakenIdentifierFilter:
+    """基于 Redis 集合的已占用标识预筛"""
+
+    def __init__(self, redis_client, prefix='user_taken', batch_size=1000):
+        """
+        Args:
+            redis_client: Redis 客户端（decode_responses=True）
+            prefix (str): 键前缀
+            batch_size (int): rebuild 时每次 SADD 的值数量
+        """
+        self.redis_client = redis_client
+        self.prefix = prefix
+        self.batch_size = batch_size
+        self.ready_key = f"{prefix}:ready:v{NORMALIZE_VERSION}"
+
+    def _key(self, field):
+        return f"{self.prefix}:{field}"
+
+    def possibly_taken(self, values):
+        """返回 values（字段 -> 值）中可能已被占用、需要查询数据库确认的字段集合"""
+        fields = [field for field in IDENTIFIER_FIELDS if values.get(field)]
+        if not fields:
+            return set()
+        try:
+            pipe = self.redis_client.pipeline(transaction=False)
+            pipe.exists(self.ready_key)
+            for field in fields:
+                pipe.sismember(self._key(field), normalize(values[field]))
+            ready, *members = pipe.execute()
+        except Exception as e:
+            print(f"Identifier prefilter unavailable: {e}")
+            return set(fields)
+        if not ready:
+            return set(fields)
+        return {field for field, member in zip(fields, members) if member}
+
+    def add(self, pairs):
+        """登记新占用的 (字段, 值)"""
+        pairs = [(field, value) for field, value in pairs if field in IDENTIFIER_FIELDS and value]
+        if not pairs:
+            return
+        try:
+            pipe = self.redis_client.pipeline(transaction=False)
+            for field, value in pairs:
+                pipe.sadd(self._key(field), normalize(value))
+            pipe.execute()
+        except Exception as e:
+            print(f"Error updating identifier prefilter, disabling it until rebuild: {e}")
+            try:
+                self.redis_client.delete(self.ready_key)
+            except Exception:
+                pass
+
+    def rebuild(self, rows):
+        """从用户行 (username, phone, email, id_number) 重新生成集合，返回处理的用户数"""
+        tmp_keys = {field: f"{self._key(field)}:rebuild" for field in IDENTIFIER_FIELDS}
+        self.redis_client.delete(*tmp_keys.values())
+        pending = {field: [] for field in IDENTIFIER_FIELDS}
+        count = 0
+
+        def flush():
+            pipe = self.redis_client.pipeline(transaction=False)
+            for field, values in pending.items():
+                if values:
+                    pipe.sadd(tmp_keys[field], *values)
+                    values.clear()
+            pipe.execute()
+
+        for row in rows:
+            for field, value in zip(IDENTIFIER_FIELDS, row):
+                if value:
+                    pending[field].append(normalize(value))
+            count += 1
+            if count % self.batch_size == 0:
+                flush()
+        flush()
+
+        # 一次事务切换到新集合；没有任何值的字段不会产生临时键，直接删除旧集合
+        existing = [self.redis_client.exists(tmp_key) for tmp_key in tmp_keys.values()]
+        pipe = self.redis_client.pipeline()
+        for (field, tmp_key), has_values in zip(tmp_keys.items(), existing):
+            if has_values:
+                pipe.rename(tmp_key, self._key(field))
+            else:
+                pipe.delete(self._key(field))
+        pipe.set(self.ready_key, 1)
+        pipe.execute()
+        return count
@@ -0,0 +1,195 @@
+# utilization.py
+"""车队利用率分析
+
+按天统计每个门店、每个车型以及全车队的占用车辆天数和利用率。订单
+区间一次性读入后，在 NumPy 中做扫描线：每个分组的 +1（开始）/ -1（结束）
+事件与每天的零点边界一起排序，累加得到任意时刻的在租车辆数，相邻
+事件之间的时长 × 在租数即为占用秒数，最后按 (分组, 天) 用 bincount
+汇总。任意日期范围只需一次扫描。
+
+已经结束的日期结果会缓存在进程内，之后的查询只重新计算当天（以及
+尚未缓存的日期）；订单变更提交后按其区间使相应日期失效。
+"""
+import threading
+from datetime import datetime, timedelta, time as dt_time
+
+import numpy as np
+
+SECONDS_PER_DAY = 86400
+GROUP_KINDS = ('all', 'store', 'type')
+
+
+class UtilizationAnalytics:
+    """按天的车队利用率
+
+    order_loader(start, end) 返回与 [start, end) 重叠的未取消订单，每行为
+    (car_id, start_time, end_time, pickup_store_id)，时间为 naive UTC。
+    fleet_loader() 返回当前车队，每行为 (car_id, type_id, store_id)。
+    """
+
+    def __init__(self, order_loader, fleet_loader, utc_offset_hours=8):
+        """
+        Args:
+            order_loader (callable): 订单区间加载函数
+            fleet_loader (callable): 车队加载函数
+            utc_offset_hours (int): 按哪个时区划分自然日（默认北京时间）
+        """
+        self.order_loader = order_loader
+        self.fleet_loader = fleet_loader
+        self.utc_offset = timedelta(hours=utc_offset_hours)
+        self._closed = {}  # date -> {(kind, key): 占用秒数}，只保存已结束的日期
+        self._lock = threading.Lock()
+
+    def today(self):
+        return (datetime.utcnow() + self.utc_offset).date()
+
+    def _day_start_utc(self, day):
+        return datetime.combine(day, dt_time.min) - self.utc_offset
+
+    def _compute(self, first_day, last_day, car_types):
+        """一次扫描计算 [first_day, last_day] 中每天、每个分组的占用秒数"""
+        n_days = (last_day - first_day).days + 1
+        range_start = self._day_start_utc(first_day)
+        range_end = range_start + timedelta(days=n_days)
+        span = n_days * SECONDS_PER_DAY
+
+        starts, ends, stores, types = [], [], [], []
+        for car_id, start_time, end_time, store_id in self.order_loader(range_start, range_end):
+            if start_time is None or end_time is None:
+                continue
+            starts.append((start_time - range_start).total_seconds())
+            ends.append((end_time - range_start).total_seconds())
+            stores.append(store_id)
+            types.append(car_types.get(car_id))
+
+        result = [dict() for _ in range(n_days)]
+        if not starts:
+            return result
+
+        starts = np.clip(np.array(starts), 0, span)
+        ends = np.clip(np.array(ends), 0, span)
+        valid = ends > starts
+        starts, ends = starts[valid], ends[valid]
+        stores = [s for s, ok in zip(stores, valid.tolist()) if ok]
+        types = [t for t, ok in zip(types, valid.tolist()) if ok]
+        if not len(starts):
+            return result
+
+        # 分组编号：0 为全车队，其后依次为门店、车型
+        group_keys = [('all', None)]
+        group_index = {('all', None): 0}
+
+        def index_of(kind, values):
+            indexes = np.empty(len(values), dtype=np.int64)
+            for i, value in enumerate(values):
+                key = (kind, value)
+                if key not in group_index:
+                    group_index[key] = len(group_keys)
+                    group_keys.append(key)
+                indexes[i] = group_index[key]
+            return indexes
+
+        count = len(starts)
+        order_groups = np.concatenate([
+            np.zeros(count, dtype=np.int64), index_of('store', stores), index_of('type', types)
+        ])
+        order_starts = np.tile(starts, 3)
+        order_ends = np.tile(ends, 3)
+        n_groups = len(group_keys)
+
+        # 扫描线事件：订单开始 +1、结束 -1，外加每个分组每天零点的边界（0），
+        # 保证任何一段都不会跨天
+        groups_present = np.unique(order_groups)
+        boundaries = np.arange(n_days + 1, dtype=np.float64) * SECONDS_PER_DAY
+        event_groups = np.concatenate([order_groups, order_groups, np.repeat(groups_present, n_days + 1)])
+        event_times = np.concatenate([order_starts, order_ends, np.tile(boundaries, len(groups_present))])
+        event_deltas = np.concatenate([
+            np.ones(len(order_groups)), -np.ones(len(order_groups)), np.zeros(len(groups_present) * (n_days + 1))
+        ])
+        order = np.lexsort((event_times, event_groups))
+        event_groups, event_times, event_deltas = event_groups[order], event_times[order], event_deltas[order]
+
+        # 每个分组的增量之和为 0，因此全局累加在分组之间自然归零
+        active = np.cumsum(event_deltas)[:-1]
+        same_group = event_groups[1:] == event_groups[:-1]
+        weights = np.where(same_group, np.diff(event_times) * active, 0.0)
+        days = np.minimum((event_times[:-1] // SECONDS_PER_DAY).astype(np.int64), n_days - 1)
+        occupied = np.bincount(
+            event_groups[:-1] * n_days + days, weights=weights, minlength=n_groups * n_days
+        ).reshape(n_groups, n_days)
+
+        for g, key in enumerate(group_keys):
+            for d, seconds in enumerate(occupied[g].tolist()):
+                if seconds > 0:
+                    result[d][key] = seconds
+        return result
+
+    def daily_occupancy(self, first_day, last_day, car_types):
+        """返回 [first_day, last_day] 每天的 {(kind, key): 占用秒数}，已结束的日期使用缓存"""
+        today = self.today()
+        days = [first_day + timedelta(days=i) for i in range((last_day - first_day).days + 1)]
+        with self._lock:
+            cached = {day: self._closed[day] for day in days if day < today and day in self._closed}
+        missing = [day for day in days if day not in cached]
+        if missing:
+            computed = self._compute(missing[0], missing[-1], car_types)
+            fresh = {missing[0] + timedelta(days=i): value for i, value in enumerate(computed)}
+            with self._lock:
+                for day, value in fresh.items():
+                    if day < today:
+                        self._closed[day] = value
+            cached.update(fresh)
+        return [cached[day] for day in days]
+
+    def series(self, first_day, last_day, group_by='all'):
+        """按天的利用率时间序列
+
+        Args:
+            first_day, last_day (date): 日期范围（含两端）
+            group_by (str): all | store | type
+
+        Returns:
+            dict: {'dates': [...], 'series': [{'key', 'fleet_size', 'occupied_car_days', 'utilization'}]}
+        """
+        if group_by not in GROUP_KINDS:
+            raise ValueError(f"group_by 必须为 {' | '.join(GROUP_KINDS)}")
+
+        fleet = list(self.fleet_loader())
+        car_types = {car_id: type_id for car_id, type_id, _ in fleet}
+        fleet_sizes = {}
+        for car_id, type_id, store_id in fleet:
+            fleet_sizes[('all', None)] = fleet_sizes.get(('all', None), 0) + 1
+            fleet_sizes[('type', type_id)] = fleet_sizes.get(('type', type_id), 0) + 1
+            if store_id is not None:
+                fleet_sizes[('store', store_id)] = fleet_sizes.get(('store', store_id), 0) + 1
+
+        daily = self.daily_occupancy(first_day, last_day, car_types)
+        keys = {key for key in fleet_sizes if key[0] == group_by}
+        for day in daily:
+            keys.update(key for key in day if key[0] == group_by)
+
+        series = []
+        for key in sorted(keys, key=lambda k: (k[1] is None, k[1] if k[1] is not None else 0)):
+            fleet_size = fleet_sizes.get(key, 0)
+            occupied = np.array([day.get(key, 0.0) for day in daily]) / SECONDS_PER_DAY
+            series.append({
+                'key': key[1],
+                'fleet_size': fleet_size,
+                'occupied_car_days': np.round(occupied, 3).tolist(),
+                'utilization': np.round(occupied / fleet_size, 4).tolist() if fleet_size else [None] * len(daily)
+            })
+        return {
+            'dates': [(first_day + timedelta(days=i)).isoformat() for i in range(len(daily))],
+            'series': series
+        }
+
+    def invalidate(self, start_time=None, end_time=None):
+        """使与 [start_time, end_time) 重叠的已缓存日期失效，不传参数时全部失效"""
+        with self._lock:
+            if start_time is None or end_time is None:
+                self._closed.clear()
+                return
+            first_day = (start_time + self.utc_offset).date()
+            last_day = (end_time + self.utc_offset).date()
+            for day in [day for day in self._closed if first_day <= day <= last_day]:
+                del self._closed[day]
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+jwt_required 装饰器开销基准：对比每次 jwt.decode 与使用 VerifiedTokenCache 的耗时
+
+在同一个请求上下文中反复调用被装饰的空视图，只测量装饰器本身的开销。
+不指定 --redis-url 时缓存不检查拒绝列表（只测进程内部分）；指定后每次命中
+都会多一次 Redis EXISTS，可以看到撤销检查的实际代价。
+用法：python utils/jwt_cache_benchmark.py --iterations 50000 [--redis-url redis://localhost:6379/0]
+"""
+
+import argparse
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+from functools import wraps
+
+import jwt
+from flask import Flask, jsonify, request
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from jwt_cache import VerifiedTokenCache  # noqa: E402
+
+JWT_SECRET = os.environ.get('JWT_SECRET', 'your_very_strong_and_random_jwt_secret_key_here')
+
+
+def make_token(user_id):
+    """生成与 Node.js 后端格式一致的测试 token"""
+    payload = {'userId': user_id, 'exp': datetime.utcnow() + timedelta(hours=1)}
+    return jwt.encode(payload, JWT_SECRET, algorithm='HS256')
+
+
+def make_decorator(decode):
+    """与 app.py 中 jwt_required 相同的逻辑，只替换 token 解码函数"""
+    def jwt_required(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            auth_header = request.headers.get('Authorization')
+            token = None
+            if auth_header:
+                try:
+                    token = auth_header.split(' ')[1]
+                except IndexError:
+                    return jsonify({'message': '无效的认证头格式', 'status': 'error'}), 401
+            if not token:
+                return jsonify({'message': '缺少认证 token', 'status': 'error'}), 401
+            try:
+                request.current_user_id = decode(token)['userId']
+            except jwt.ExpiredSignatureError:
+                return jsonify({'message': 'Token 已过期', 'status': 'error'}), 401
+            except jwt.InvalidTokenError:
+                return jsonify({'message': '无效的 token', 'status': 'error'}), 401
+            return f(*args, **kwargs)
+        return decorated_function
+    return jwt_required
+
+
+def view():
+    return request.current_user_id
+
+
+def measure(app, decorated, token, iterations):
+    """返回每次调用的平均耗时（微秒）"""
+    with app.test_request_context('/', headers={'Authorization': f'Bearer {token}'}):
+        for _ in range(min(1000, iterations)):
+            decorated()
+        started = time.perf_counter()
+        for _ in range(iterations):
+            decorated()
+        elapsed = time.perf_counter() - started
+    return elapsed / iterations * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description='jwt_required 装饰器开销基准')
+    parser.add_argument('--iterations', type=int, default=50000, help='每种方式的调用次数')
+    parser.add_argument('--redis-url', default=None, help='启用拒绝列表检查时使用的 Redis')
+    args = parser.parse_args()
+
+    redis_client = None
+    if args.redis_url:
+        import redis
+        redis_client = redis.Redis.from_url(args.redis_url, decode_responses=True)
+        redis_client.ping()
+
+    app = Flask(__name__)
+    token = make_token(8)
+    cache = VerifiedTokenCache(JWT_SECRET, redis_client=redis_client)
+
+    baseline = make_decorator(lambda t: jwt.decode(t, JWT_SECRET, algorithms=['HS256']))(view)
+    cached = make_decorator(cache.decode)(view)
+
+    baseline_us = measure(app, baseline, token, args.iterations)
+    cached_us = measure(app, cached, token, args.iterations)
+
+    print(f"迭代次数: {args.iterations}  拒绝列表: {'Redis' if redis_client else '关闭'}")
+    print(f"jwt.decode          : {baseline_us:8.2f} us/次")
+    print(f"VerifiedTokenCache  : {cached_us:8.2f} us/次")
+    print(f"加速比              : {baseline_us / cached_us:8.2f}x")
+    print(f"缓存统计            : {cache.stats()}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+并发下单检查：同时发起大量 /api/create_order 请求，验证订单ID不重复、没有主键冲突
+
+每个请求使用同一辆车的不同（互不重叠）租期，因此所有请求都应成功。
+用法：python utils/order_concurrency_check.py --base-url http://localhost:5000 --user-id 8 --car-id 1
+注意：会在数据库中真实创建订单，请在测试环境中运行。
+"""
+
+import argparse
+import json
+import os
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+import jwt
+
+JWT_SECRET = os.environ.get('JWT_SECRET', 'your_very_strong_and_random_jwt_secret_key_here')
+
+
+def make_token(user_id):
+    """生成与 Node.js 后端格式一致的测试 token"""
+    payload = {'userId': user_id, 'exp': datetime.utcnow() + timedelta(hours=1)}
+    return jwt.encode(payload, JWT_SECRET, algorithm='HS256')
+
+
+def create_order(base_url, token, car_id, index, base_time):
+    """发起一次下单请求，返回 (HTTP状态码, 响应数据)"""
+    start = base_time + timedelta(days=index * 2)
+    body = json.dumps({
+        'car_id': car_id,
+        'start_time': start.isoformat() + 'Z',
+        'end_time': (start + timedelta(days=1)).isoformat() + 'Z'
+    }).encode('utf-8')  # 金额由服务端报价计算
+    req = urllib.request.Request(
+        f"{base_url}/api/create_order",
+        data=body,
+        headers={'Content-Type': 'application/json', 'Authorization': f'Bearer {token}'},
+        method='POST'
+    )
+    try:
+        with urllib.request.urlopen(req, timeout=30) as resp:
+            return resp.status, json.loads(resp.read().decode('utf-8'))
+    except urllib.error.HTTPError as e:
+        return e.code, json.loads(e.read().decode('utf-8') or '{}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='并发下单检查')
+    parser.add_argument('--base-url', default='http://localhost:5000')
+    parser.add_argument('--user-id', type=int, default=8)
+    parser.add_argument('--car-id', type=int, default=1)
+    parser.add_argument('--requests', type=int, default=200, help='请求总数')
+    parser.add_argument('--workers', type=int, default=50, help='并发线程数')
+    args = parser.parse_args()
+
+    token = make_token(args.user_id)
+    # 使用远期且随机偏移的时间窗口，避免与已有订单冲突
+    base_time = datetime(2100, 1, 1) + timedelta(days=int(time.time()) % 1000 * args.requests * 2)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.workers) as executor:
+        results = list(executor.map(
+            lambda i: create_order(args.base_url, token, args.car_id, i, base_time),
+            range(args.requests)
+        ))
+    elapsed = time.perf_counter() - started
+
+    order_ids = [data.get('order_id') for status, data in results if status == 200]
+    failures = [(status, data.get('message')) for status, data in results if status != 200]
+
+    print(f"请求数: {args.requests}, 并发: {args.workers}, 耗时: {elapsed:.2f}s")
+    print(f"成功: {len(order_ids)}, 失败: {len(failures)}")
+    for status, message in failures[:10]:
+        print(f"  HTTP {status}: {message}")
+
+    duplicates = len(order_ids) - len(set(order_ids))
+    if failures or duplicates:
+        print(f"❌ 检查未通过（重复订单ID: {duplicates}）")
+        raise SystemExit(1)
+    print("✅ 所有订单创建成功，订单ID无重复")
+
+
+if __name__ == '__main__':
+    main()
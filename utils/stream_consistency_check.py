@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+流式响应一致性检查：同一查询的 NDJSON 流式结果必须与 JSON 结果逐条一致
+
+流式模式按批读取并补充关联数据（图片URL、报价），结果条数超过一批
+（STREAM_BATCH_SIZE=200）时最容易出现截断，检查前请确认数据量足够：
+车辆数超过 200 时检查 /search_cars，--user-id 指定的用户订单数超过 200 时
+检查 /api/user_orders（含 expand=car,store）。
+用法：python utils/stream_consistency_check.py --base-url http://localhost:5000 --user-id 8
+"""
+
+import argparse
+import json
+import os
+import urllib.parse
+import urllib.request
+from datetime import datetime, timedelta
+
+import jwt
+
+JWT_SECRET = os.environ.get('JWT_SECRET', 'your_very_strong_and_random_jwt_secret_key_here')
+STREAM_BATCH_SIZE = 200
+
+
+def make_token(user_id):
+    """生成与 Node.js 后端格式一致的测试 token"""
+    payload = {'userId': user_id, 'exp': datetime.utcnow() + timedelta(hours=1)}
+    return jwt.encode(payload, JWT_SECRET, algorithm='HS256')
+
+
+def fetch(url, headers=None, ndjson=False):
+    """请求 url，ndjson=True 时按行解析流式响应"""
+    headers = dict(headers or {})
+    if ndjson:
+        headers['Accept'] = 'application/x-ndjson'
+    req = urllib.request.Request(url, headers=headers)
+    with urllib.request.urlopen(req, timeout=120) as resp:
+        body = resp.read().decode('utf-8')
+    if ndjson:
+        return [json.loads(line) for line in body.splitlines() if line.strip()]
+    return json.loads(body)
+
+
+def compare(name, json_rows, stream_rows, key):
+    """比较两种模式的结果，返回是否一致"""
+    print(f"{name}: JSON {len(json_rows)} 条, NDJSON {len(stream_rows)} 条")
+    if len(json_rows) <= STREAM_BATCH_SIZE:
+        print(f"  ⚠️ 结果不足 {STREAM_BATCH_SIZE + 1} 条，未覆盖跨批读取")
+    if [row[key] for row in json_rows] != [row[key] for row in stream_rows]:
+        print(f"  ❌ {key} 序列不一致")
+        return False
+    if json_rows != stream_rows:
+        print("  ❌ 字段内容不一致")
+        return False
+    print("  ✅ 一致")
+    return True
+
+
+def check_search(base_url, window):
+    params = {'backend': 'ngram'}
+    if window:
+        params.update(start_time=window[0], end_time=window[1])
+    url = f"{base_url}/search_cars?{urllib.parse.urlencode(params)}"
+    json_rows = fetch(url)['data']
+    stream_rows = fetch(url, ndjson=True)
+    return compare('/search_cars', json_rows, stream_rows, 'car_id')
+
+
+def check_orders(base_url, user_id):
+    headers = {'Authorization': f'Bearer {make_token(user_id)}'}
+    url = f"{base_url}/api/user_orders?expand=car,store"
+    json_rows = fetch(url, headers)['orders']
+    stream_rows = fetch(url, headers, ndjson=True)
+    return compare('/api/user_orders', json_rows, stream_rows, 'order_id')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='流式响应一致性检查')
+    parser.add_argument('--base-url', default='http://localhost:5000')
+    parser.add_argument('--start-time', default='2100-01-01T10:00:00Z', help='搜索租期开始（用于检查报价字段）')
+    parser.add_argument('--end-time', default='2100-01-03T10:00:00Z', help='搜索租期结束')
+    parser.add_argument('--user-id', type=int, default=None, help='检查该用户的订单流（不指定则跳过）')
+    args = parser.parse_args()
+
+    ok = check_search(args.base_url, (args.start_time, args.end_time))
+    if args.user_id is not None:
+        ok = check_orders(args.base_url, args.user_id) and ok
+    if not ok:
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
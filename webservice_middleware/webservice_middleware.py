@@ -1,7 +1,9 @@
 import json
 import xml.etree.ElementTree as ET
 from functools import wraps
-from flask import request, Response
+from flask import request, Response, stream_with_context
+
+NDJSON_MIMETYPE = 'application/x-ndjson'
 
 def webservice_support(f):
     """
@@ -79,6 +81,29 @@ def webservice_support(f):
     
     return decorated_function
 
+def wants_ndjson_stream():
+    """
+    判断客户端是否请求NDJSON流式响应
+    通过 Accept: application/x-ndjson 或查询参数 ?stream=1 开启
+    """
+    if NDJSON_MIMETYPE in request.headers.get('Accept', ''):
+        return True
+    return request.args.get('stream', '').lower() in ('1', 'true', 'yes')
+
+def ndjson_response(rows, serialize=lambda row: row):
+    """
+    将可迭代对象逐行序列化为NDJSON并以分块方式返回
+    rows 应为惰性迭代器（如 query.yield_per(n)），首字节延迟与结果规模无关
+    """
+    def generate():
+        for row in rows:
+            yield json.dumps(serialize(row), ensure_ascii=False, default=str) + '\n'
+
+    return Response(stream_with_context(generate()),
+                    mimetype=NDJSON_MIMETYPE,
+                    headers={'Content-Type': f'{NDJSON_MIMETYPE}; charset=utf-8',
+                             'X-Accel-Buffering': 'no'})
+
 def parse_xml_to_dict(xml_string):
     """
     将XML字符串解析为Python字典